@@ -14,6 +14,159 @@ HEDERA_ACCOUNT_ID = os.getenv("HEDERA_ACCOUNT_ID")
 HEDERA_PRIVATE_KEY = os.getenv("HEDERA_PRIVATE_KEY")
 RUNE_COIN_TOKEN_ID = "0.0.6913517" # Your Rune Coin Token ID
 
+# --- LLM CONFIGURATION ---
+# Maximum number of Gemini calls that may run at once on this worker. Calls beyond
+# this limit wait in the LLM executor's queue instead of blocking the event loop.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+# Static prompt instructions are always sent as the model's system instruction. With
+# GEMINI_CONTEXT_CACHE enabled, instructions of at least GEMINI_CACHE_MIN_TOKENS are
+# also uploaded once as Gemini cached content and reused until the TTL runs out. Only then
+# do Interaction instructions carry the villager's full profile, which is otherwise left
+# out rather than resent in full on every turn.
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+GEMINI_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CACHE_MIN_TOKENS", "1024"))
+GEMINI_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CACHE_TTL_SECONDS", "3600"))
+
+# --- LLM ROUTING ---
+# Backends calls may be routed to, in order of preference until their latency is known:
+# "gemini" and "0g" (the 0G Compute bridge of the decentralized server).
+LLM_BACKENDS = [name.strip() for name in os.getenv("LLM_BACKENDS", "gemini").split(",") if name.strip()]
+OG_BRIDGE_URL = os.getenv("OG_BRIDGE_URL", "http://localhost:3001/generate-narrative")
+# Prompt types whose calls get a duplicate request once they run past the backend's p95 latency.
+LLM_HEDGE_PROMPT_TYPES = [name.strip() for name in os.getenv("LLM_HEDGE_PROMPT_TYPES", "Interaction").split(",") if name.strip()]
+# Calls per backend and prompt type the latency percentiles are taken over, and the
+# number needed before a backend is ranked by latency or marked unhealthy.
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "100"))
+LLM_ROUTER_MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "10"))
+LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+
+# --- LLM OUTPUT VALIDATION ---
+# StoryGenerator, WorldBuilder and Interaction responses are repaired and validated. Missing
+# fields are re-requested on their own, up to this many retries, each after an exponential
+# backoff starting at LLM_OUTPUT_RETRY_BACKOFF_SECONDS.
+LLM_OUTPUT_MAX_RETRIES = int(os.getenv("LLM_OUTPUT_MAX_RETRIES", "2"))
+LLM_OUTPUT_RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_OUTPUT_RETRY_BACKOFF_SECONDS", "0.25"))
+
+# --- LLM RECORD / REPLAY ---
+# With LLM_RECORD on, every response from a live backend is appended to the cassette.
+# Listing "replay" in LLM_BACKENDS serves the recorded responses instead of a live model,
+# after a synthetic delay, e.g. "Interaction=lognormal:-0.7,0.4;*=uniform:0.05,0.2" (seconds).
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "llm_cassette.jsonl")
+LLM_RECORD = os.getenv("LLM_RECORD", "false").lower() == "true"
+LLM_REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "")
+LLM_REPLAY_SEED = int(os.getenv("LLM_REPLAY_SEED", "0"))
+
+# --- WORLD POOL CONFIGURATION ---
+# Ready-made worlds kept per "difficulty:num_inaccessible_locations" key so that
+# /game/new can skip the StoryGenerator and WorldBuilder calls. Every pooled world costs about
+# 19 LLM calls, paid at startup before any player arrives, so the pool is off (size 0) unless set.
+# Only these keys are pooled (difficulty ignores case); other settings get their world generated live.
+WORLD_POOL_SIZE = int(os.getenv("WORLD_POOL_SIZE", "0"))
+WORLD_POOL_KEYS = os.getenv("WORLD_POOL_KEYS", "easy:5,medium:5,hard:5")
+WORLD_POOL_PATH = os.getenv("WORLD_POOL_PATH", "world_pool.json")
+# Number of worlds the pool may generate at the same time, across all keys.
+WORLD_POOL_MAX_BUILDS = int(os.getenv("WORLD_POOL_MAX_BUILDS", "2"))
+# Build quest networks from a skeleton plus concurrent per-villager shards instead
+# of a single WorldBuilder call. Falls back to the single call if the skeleton fails.
+SHARDED_WORLD_BUILDER = os.getenv("SHARDED_WORLD_BUILDER", "true").lower() == "true"
+
+# --- CONVERSATION MEMORY ---
+# Number of recent player/NPC exchanges per villager sent verbatim in Interaction prompts.
+# Older exchanges are folded into a rolling per-villager summary in the background.
+CHAT_RECENT_TURNS = int(os.getenv("CHAT_RECENT_TURNS", "6"))
+# Upper bound on the estimated size of a whole Interaction prompt; history is trimmed to fit.
+INTERACTION_PROMPT_TOKEN_BUDGET = int(os.getenv("INTERACTION_PROMPT_TOKEN_BUDGET", "4000"))
+CHAT_SUMMARY_MAX_WORDS = int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "120"))
+
+# --- FAST-PATH RESPONSES ---
+# Farewell (PERMANENTLY_EXHAUSTED) and refusal (HAS_LOCKED_CLUES) turns can be answered
+# from per-world template banks instead of an LLM call. "off" disables this, "scripted"
+# only answers opening lines and clicked suggestions locally, "all" also free-form input to
+# exhausted villagers. Local turns never change familiarity; only LLM turns do.
+FAST_PATH_MODE = os.getenv("FAST_PATH_MODE", "scripted").lower()
+# Lines generated per villager, status and familiarity band when a world is created.
+FAST_PATH_LINES_PER_CASE = int(os.getenv("FAST_PATH_LINES_PER_CASE", "3"))
+# Generate every villager's opening turn when a world is created, so each player's first
+# conversation with a villager is served without an LLM call. Off by default: it adds one
+# LLM call per villager to every /game/new, whether or not the player visits them.
+PREWARM_OPENINGS = os.getenv("PREWARM_OPENINGS", "false").lower() == "true"
+
+# --- RESPONSE CACHE ---
+# Interaction responses reused for near-identical inputs to the same villager in the same
+# clue state. A size of 0 disables the cache. Similarity is the minimum estimated Jaccard
+# similarity (0-1) between the shingles of two normalized inputs.
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "4096"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.5"))
+
+# --- SPECULATIVE PREFETCH ---
+# When enabled, the next turn is generated in the background for each suggestion returned
+# to the player, and committed instantly if they pick it. Costs extra LLM tokens.
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "false").lower() == "true"
+# Speculative LLM calls allowed at once across all players; further suggestions are not speculated.
+SPECULATION_MAX_CONCURRENCY = int(os.getenv("SPECULATION_MAX_CONCURRENCY", "4"))
+SPECULATION_TTL_SECONDS = float(os.getenv("SPECULATION_TTL_SECONDS", "60"))
+
+# --- ACTIVE GAME STORE ---
+# Games and multiplayer rooms kept in memory, least recently used first out. An entry idle for
+# GAME_IDLE_TTL_SECONDS, or pushed out by the count/size bounds, is written to GAME_SPILL_DIR and
+# loaded back on its next request. Spilled entries untouched for GAME_SPILL_TTL_SECONDS are deleted.
+# GAME_STORE_MAX_BYTES counts games by their in-memory size (GameState.memory_usage).
+GAME_STORE_MAX_GAMES = int(os.getenv("GAME_STORE_MAX_GAMES", "500"))
+GAME_STORE_MAX_BYTES = int(os.getenv("GAME_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+GAME_IDLE_TTL_SECONDS = float(os.getenv("GAME_IDLE_TTL_SECONDS", "1800"))
+GAME_SPILL_DIR = os.getenv("GAME_SPILL_DIR", "game_spill")
+GAME_SPILL_TTL_SECONDS = float(os.getenv("GAME_SPILL_TTL_SECONDS", str(7 * 24 * 3600)))
+# How often idle entries are looked for and resident sizes re-measured.
+GAME_STORE_SWEEP_SECONDS = float(os.getenv("GAME_STORE_SWEEP_SECONDS", "30"))
+
+# --- GAME PERSISTENCE ---
+# SQLite database (WAL mode) with a snapshot per game plus a log of the turns since, so games
+# survive restarts and deploys. An empty path disables persistence.
+GAME_DB_PATH = os.getenv("GAME_DB_PATH", "games.db")
+# Turns queued within this window are written in one transaction.
+GAME_DB_COMMIT_INTERVAL_SECONDS = float(os.getenv("GAME_DB_COMMIT_INTERVAL_SECONDS", "0.01"))
+# A game's log is compacted into a new snapshot after this many turns.
+GAME_DB_SNAPSHOT_EVERY_TURNS = int(os.getenv("GAME_DB_SNAPSHOT_EVERY_TURNS", "25"))
+GAME_DB_RETENTION_SECONDS = float(os.getenv("GAME_DB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# --- SHARED STATE & CLUSTER ---
+# Where games, rooms and login records live outside a process's memory: "file" (one file each under
+# STATE_BACKEND_URL, this process only), "memory" (nothing leaves the process), "sqlite" (a database
+# shared by every process on the machine) or "redis" (a redis:// URL shared by every node). With
+# sqlite or redis every turn is written through (off the event loop), so a node that restarts picks
+# its games up again and login records are shared; the GAME PERSISTENCE turn log is then not used.
+# Player locks and room sockets live in one process, and writes are last-writer-wins, so every game
+# must be served by one process. `uvicorn main:app --workers N` is NOT supported, since it spreads one
+# game's requests over processes that overwrite each other's turns. To use every core of a machine,
+# start one process per core on its own port instead, e.g. `uvicorn main:app --port 8001` ... 8004,
+# each with CLUSTER_SELF_URL set to its own URL and all of them listed in CLUSTER_NODES, behind any
+# load balancer; each game and room is then served by one of them and requests are forwarded there.
+STATE_BACKEND = os.getenv("STATE_BACKEND", "file").lower()
+STATE_BACKEND_URL = os.getenv("STATE_BACKEND_URL", {
+    "file": GAME_SPILL_DIR,
+    "sqlite": "shared_state.db",
+    "redis": "redis://localhost:6379/0",
+}.get(STATE_BACKEND, ""))
+# Base URLs of every node, e.g. "http://10.0.0.1:8000,http://10.0.0.2:8000", and this node's own.
+# Games and rooms are owned by one node each (consistent hashing); requests reaching any other node
+# are forwarded to the owner. Leave empty to serve everything locally.
+CLUSTER_NODES = [url.strip() for url in os.getenv("CLUSTER_NODES", "").split(",") if url.strip()]
+CLUSTER_SELF_URL = os.getenv("CLUSTER_SELF_URL", "")
+# Points per node on the hash ring; more spreads games more evenly.
+CLUSTER_VNODES = int(os.getenv("CLUSTER_VNODES", "64"))
+# Shared by every node and sent on the requests they forward to each other, so only those skip routing.
+# Defaults to ADMIN_TOKEN; set one of them whenever CLUSTER_NODES or drain is used.
+CLUSTER_SECRET = os.getenv("CLUSTER_SECRET", "") or os.getenv("ADMIN_TOKEN", "")
+
+# --- ADMIN & DRAIN ---
+# Shared secret for the /admin endpoints (sent as the X-Admin-Token header); leave empty to disable them.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Node that /admin/drain moves this node's games to (e.g. "http://10.0.0.2:8000"), and whether to drain
+# there on shutdown. The peer must have the same ADMIN_TOKEN. With CLUSTER_NODES set, also remove the
+# drained node from the other nodes' CLUSTER_NODES. Not needed with a shared STATE_BACKEND.
+DRAIN_PEER_URL = os.getenv("DRAIN_PEER_URL", "").rstrip("/")
+DRAIN_ON_SHUTDOWN = os.getenv("DRAIN_ON_SHUTDOWN", "false").lower() == "true"
+
 # --- GAME WORLD DATA ---
 # This file contains the static, base data for the game world.
 # It defines the characters that the LLM can use to build a mystery.
@@ -0,0 +1,5 @@
+# conftest.py
+# Runs the unit tests in tests/ with this directory on sys.path, as the server imports `config` and `game_logic`.
+
+# Interactive scripts that talk to a running server, not tests.
+collect_ignore = ["test_game.py", "test_import.py"]
@@ -0,0 +1,170 @@
+# game_logic/cassette.py
+# Records LLM responses to an on-disk cassette and replays them without a live model.
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from .llm_calls import GeminiAPI, LLM_MAX_CONCURRENCY
+
+# Replayed streams are cut into this many chunks.
+REPLAY_STREAM_CHUNKS = 4
+
+def prompt_key(system_instruction, prompt) -> str:
+    """Identifies a prompt by both of its parts, so equal prompts replay equal responses."""
+    digest = hashlib.sha1()
+    digest.update((system_instruction or "").encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+def _distribution(spec: str):
+    name, _, args = spec.strip().partition(":")
+    params = [float(arg) for arg in args.split(",") if arg.strip()]
+    distributions = {
+        "fixed": (1, lambda rng, value: value),
+        "uniform": (2, lambda rng, low, high: rng.uniform(low, high)),
+        "normal": (2, lambda rng, mean, stddev: rng.gauss(mean, stddev)),
+        "lognormal": (2, lambda rng, mu, sigma: rng.lognormvariate(mu, sigma)),
+        "exponential": (1, lambda rng, mean: rng.expovariate(1 / mean)),
+    }
+    if name not in distributions or len(params) != distributions[name][0]:
+        raise ValueError(
+            f"Invalid latency distribution '{spec}'. Use fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV, "
+            "lognormal:MU,SIGMA or exponential:MEAN (seconds)."
+        )
+    sample = distributions[name][1]
+    return lambda rng: max(0.0, sample(rng, *params))
+
+class SyntheticLatency:
+    """
+    Per-prompt-type latency distributions, e.g.
+    "Interaction=lognormal:-0.7,0.4;StoryGenerator=fixed:3;*=uniform:0.05,0.2".
+    A spec without "=" applies to every prompt type; an empty spec means no delay.
+    Each delay is drawn from a generator seeded by the prompt, so a replay run
+    sees the same delay for the same prompt every time.
+    """
+
+    def __init__(self, spec: str = "", seed: int = 0):
+        self.seed = seed
+        self._distributions = {}
+        for part in filter(None, (part.strip() for part in (spec or "").split(";"))):
+            prompt_type, _, distribution = part.rpartition("=")
+            self._distributions[prompt_type.strip() or "*"] = _distribution(distribution)
+
+    def delay(self, prompt_type: str, key: str) -> float:
+        distribution = self._distributions.get(prompt_type) or self._distributions.get("*")
+        if distribution is None:
+            return 0.0
+        return distribution(random.Random(int(key[:16], 16) ^ self.seed))
+
+class CassetteStore:
+    """
+    Recorded responses, keyed by prompt_key(), in an append-only JSON-lines file:
+    one {"key", "prompt_type", "response"} object per distinct prompt. Prompts
+    are stored only as their hash, so a cassette stays small.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._responses = {}
+        self._by_type = {}
+        self._lock = threading.Lock()
+        self.stats = {"recorded": 0}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._add(entry["key"], entry["prompt_type"], entry["response"])
+            print(f"✅ Loaded {len(self._responses)} recorded LLM responses from {path}.")
+
+    def __len__(self):
+        return len(self._responses)
+
+    def record(self, prompt_type, system_instruction, prompt, response: str):
+        if not response or response == "{}":
+            return
+        key = prompt_key(system_instruction, prompt)
+        with self._lock:
+            if key in self._responses:
+                return
+            self._add(key, prompt_type, response)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "prompt_type": prompt_type, "response": response}) + "\n")
+            self.stats["recorded"] += 1
+
+    def lookup(self, prompt_type, key: str):
+        """Returns (response, exact): the recording for this prompt, else one of the same type chosen by the key."""
+        response = self._responses.get(key)
+        if response is not None:
+            return response, True
+        candidates = self._by_type.get(prompt_type)
+        if not candidates:
+            return None, False
+        return candidates[int(key[:16], 16) % len(candidates)], False
+
+    def _add(self, key, prompt_type, response):
+        self._responses[key] = response
+        self._by_type.setdefault(prompt_type, []).append(response)
+
+class CassetteReplayAPI(GeminiAPI):
+    """
+    Serves recorded responses in place of a live model, for offline benchmarks.
+
+    Prompts are built exactly as for Gemini and looked up by hash. A prompt
+    that was never recorded (e.g. different player input) gets a recorded
+    response of the same prompt type instead, so a run never stalls on a miss.
+    Async calls wait out the synthetic latency with asyncio.sleep, not on the
+    LLM executor, so replay isn't capped by the thread pool.
+    """
+
+    backend_name = "Cassette"
+
+    def __init__(self, store: CassetteStore, latency: SyntheticLatency, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.store = store
+        self.latency = latency
+        self.model = True
+        self._setup_runtime(max_concurrency, "cassette")
+        self.replay_stats = {"exact": 0, "substituted": 0, "missing": 0}
+        print(f"✅ Replaying LLM responses from {store.path}.")
+
+    def health(self) -> dict:
+        return {"recordings": len(self.store), **self.replay_stats}
+
+    def _replay(self, prompt_type, context):
+        """Returns (response, delay) for a call."""
+        system_instruction, prompt = self._build_prompt(prompt_type, context)
+        if not prompt:
+            print(f"--- ERROR: No prompt found for type '{prompt_type}' ---")
+            return "{}", 0.0
+        self._record_prompt_size(prompt_type, system_instruction, prompt)
+        key = prompt_key(system_instruction, prompt)
+        response, exact = self.store.lookup(prompt_type, key)
+        if response is None:
+            self.replay_stats["missing"] += 1
+            print(f"--- WARNING: The cassette has no {prompt_type} responses to replay. ---")
+            return "{}", 0.0
+        self.replay_stats["exact" if exact else "substituted"] += 1
+        return response, self.latency.delay(prompt_type, key)
+
+    def generate_content(self, prompt_type, context):
+        response, delay = self._replay(prompt_type, context)
+        time.sleep(delay)
+        return response
+
+    async def generate_content_async(self, prompt_type, context):
+        response, delay = self._replay(prompt_type, context)
+        await asyncio.sleep(delay)
+        return response
+
+    async def stream_content(self, prompt_type, context):
+        response, delay = self._replay(prompt_type, context)
+        size = math.ceil(len(response) / REPLAY_STREAM_CHUNKS)
+        for start in range(0, len(response), size):
+            await asyncio.sleep(delay / REPLAY_STREAM_CHUNKS)
+            yield response[start:start + size]
@@ -0,0 +1,182 @@
+# game_logic/cluster.py
+# Consistent-hashing ownership of games and rooms across server nodes, and forwarding of requests to their owner.
+
+import asyncio
+import bisect
+import hashlib
+import hmac
+from typing import Optional
+
+# Set, to the cluster secret, on requests one node forwards to another, so they are never forwarded again.
+FORWARDED_HEADER = "x-towns-forwarded"
+
+# Headers that describe a single connection rather than the request or response itself.
+_HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+}
+
+def _point(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+class HashRing:
+    """
+    Maps keys to nodes with consistent hashing: each node owns `vnodes`
+    points on a ring and a key belongs to the first point after its hash, so
+    adding or removing a node only moves the keys of that node.
+    """
+
+    def __init__(self, nodes: list, vnodes: int):
+        self.nodes = list(nodes)
+        ring = sorted((_point(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        position = bisect.bisect(self._points, _point(key)) % len(self._points)
+        return self._owners[position]
+
+class ClusterRouter:
+    """
+    Decides which node serves a game or room. Every node is configured with
+    the same `nodes` (base URLs) and its own `self_url`; the owner of a key is
+    its node on the HashRing. Requests for a key owned elsewhere are
+    forwarded there, so a game's state and a room's sockets only ever live
+    on one node and its per-player locks keep working.
+
+    New ids are drawn until one is owned by this node (`local_id`), so a
+    game or room is served by the node that created it. With fewer than two
+    nodes, or if this node isn't one of them, routing is disabled and every
+    key is local.
+
+    Forwarded requests carry `secret` in FORWARDED_HEADER and are served
+    where they land (`is_forwarded`). The header is ignored on requests
+    without the secret, so a client can't use it to skip routing.
+    """
+
+    def __init__(self, nodes: list, self_url: str, vnodes: int, secret: str = "", timeout: float = 120.0):
+        self.nodes = [node.rstrip("/") for node in nodes if node.strip()]
+        self.self_url = self_url.rstrip("/")
+        self.enabled = len(self.nodes) > 1 and self.self_url in self.nodes
+        self.ring = HashRing(self.nodes, vnodes)
+        self.secret = secret
+        self.timeout = timeout
+        self._client = None
+        self.stats = {"forwarded": 0, "forward_failures": 0, "sockets_relayed": 0}
+        if self.enabled:
+            print(f"✅ Cluster routing enabled: this node is {self.self_url} of {len(self.nodes)}.")
+            if not secret:
+                print("--- WARNING: No CLUSTER_SECRET (or ADMIN_TOKEN) is set, so forwarded requests are routed again on arrival. ---")
+        elif len(self.nodes) > 1:
+            print(f"--- WARNING: CLUSTER_SELF_URL '{self_url}' is not one of CLUSTER_NODES; cluster routing is disabled. ---")
+
+    def owner(self, key: str) -> str:
+        return self.ring.owner(key) if self.enabled else self.self_url
+
+    def is_local(self, key: str) -> bool:
+        return not self.enabled or self.owner(key) == self.self_url
+
+    def is_forwarded(self, headers) -> bool:
+        """True for a request another node of this cluster forwarded here."""
+        value = headers.get(FORWARDED_HEADER)
+        return bool(self.secret) and value is not None and hmac.compare_digest(value.encode(), self.secret.encode())
+
+    def _forward_headers(self) -> dict:
+        return {FORWARDED_HEADER: self.secret} if self.secret else {}
+
+    def local_id(self, make_id, max_attempts: int = 1000) -> str:
+        """Calls make_id() until it returns an id this node owns (on average once per node)."""
+        new_id = make_id()
+        for _ in range(max_attempts):
+            if self.is_local(new_id):
+                break
+            new_id = make_id()
+        return new_id
+
+    def health(self) -> dict:
+        return {"enabled": self.enabled, "self": self.self_url, "nodes": self.nodes, **self.stats}
+
+    def _http_client(self):
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def forward(self, request, owner: str):
+        """Sends a Starlette request to `owner` and streams its response back, so SSE turns stay streaming."""
+        import httpx
+        from starlette.background import BackgroundTask
+        from starlette.responses import JSONResponse, StreamingResponse
+
+        url = owner + request.url.path + (f"?{request.url.query}" if request.url.query else "")
+        headers = {
+            k: v for k, v in request.headers.items()
+            if k.lower() not in _HOP_BY_HOP_HEADERS and k.lower() != FORWARDED_HEADER
+        }
+        headers.update(self._forward_headers())
+        client = self._http_client()
+        try:
+            upstream = await client.send(
+                client.build_request(request.method, url, headers=headers, content=await request.body()),
+                stream=True,
+            )
+        except httpx.HTTPError as e:
+            self.stats["forward_failures"] += 1
+            print(f"--- WARNING: Could not forward {request.method} {request.url.path} to {owner}. Error: {e} ---")
+            return JSONResponse({"detail": f"The node serving this game is unavailable: {owner}"}, status_code=502)
+        self.stats["forwarded"] += 1
+        response_headers = {k: v for k, v in upstream.headers.items() if k.lower() not in _HOP_BY_HOP_HEADERS}
+        return StreamingResponse(
+            upstream.aiter_raw(),
+            status_code=upstream.status_code,
+            headers=response_headers,
+            background=BackgroundTask(upstream.aclose),
+        )
+
+    async def relay_websocket(self, websocket, owner: str):
+        """Relays an accepted client WebSocket to the same path on `owner` until either side closes."""
+        import websockets
+        from starlette.websockets import WebSocketDisconnect
+
+        url = owner.replace("http", "ws", 1) + websocket.url.path
+        try:
+            # additional_headers needs websockets>=14 (see requirements.txt)
+            upstream = await websockets.connect(url, additional_headers=self._forward_headers())
+        except (OSError, websockets.WebSocketException) as e:
+            self.stats["forward_failures"] += 1
+            print(f"--- WARNING: Could not relay WebSocket {websocket.url.path} to {owner}. Error: {e} ---")
+            await websocket.close(code=1011)
+            return
+        self.stats["sockets_relayed"] += 1
+
+        async def client_to_owner():
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                await upstream.send(message.get("text") if message.get("text") is not None else message.get("bytes"))
+
+        async def owner_to_client():
+            async for message in upstream:
+                if isinstance(message, str):
+                    await websocket.send_text(message)
+                else:
+                    await websocket.send_bytes(message)
+
+        tasks = [asyncio.create_task(client_to_owner()), asyncio.create_task(owner_to_client())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await upstream.close()
+            try:
+                await websocket.close()
+            except (RuntimeError, WebSocketDisconnect):
+                pass  # Already closed by the client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
@@ -0,0 +1,124 @@
+# game_logic/dialogue_log.py
+# Compact storage for a player's conversation with one villager: a role id and a text per message.
+
+import json
+import sys
+import zlib
+
+# Recent messages kept as plain strings; prompts only ever read the newest CHAT_RECENT_TURNS exchanges
+# and whatever the rolling summary hasn't folded yet.
+HOT_MESSAGES = 16
+# Older messages are compressed together in blocks of this many.
+COLD_BLOCK = 16
+# Texts up to this long (suggestion clicks, stock replies) are interned, so every player repeating one shares it.
+INTERN_MAX_LENGTH = 160
+
+_ROLES = ["player", "npc"]
+_BUILTIN_ROLES = len(_ROLES)
+_ROLE_IDS = {role: role_id for role_id, role in enumerate(_ROLES)}
+
+def _role_id(role: str) -> int:
+    role_id = _ROLE_IDS.get(role)
+    if role_id is None:
+        role_id = _ROLE_IDS[role] = len(_ROLES)
+        _ROLES.append(sys.intern(role))
+    return role_id
+
+def intern_text(text):
+    return sys.intern(text) if isinstance(text, str) and len(text) <= INTERN_MAX_LENGTH else text
+
+class DialogueLog:
+    """
+    The messages of one conversation as a bytearray of role ids and a list of
+    texts, with all but the newest HOT_MESSAGES texts zlib-compressed in
+    blocks of COLD_BLOCK.
+
+    Reads like the list of {"role", "content"} dicts it replaces: indexing,
+    slicing and iteration build those dicts on demand (negative indices
+    included), `append`/`extend` take them, and `to_list()` is the
+    JSON-serializable form.
+    """
+
+    __slots__ = ("_roles", "_cold", "_texts")
+
+    def __init__(self, messages=()):
+        self._roles = bytearray()
+        self._cold = []   # zlib-compressed JSON lists of COLD_BLOCK texts, oldest first
+        self._texts = []  # texts of the messages after the cold blocks
+        self.extend(messages)
+
+    def __len__(self):
+        return len(self._roles)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self._roles))
+            blocks = {}
+            return [self._message(i, blocks) for i in range(start, stop, step)]
+        if index < 0:
+            index += len(self._roles)
+        if not 0 <= index < len(self._roles):
+            raise IndexError("DialogueLog index out of range")
+        return self._message(index, {})
+
+    def __eq__(self, other):
+        if isinstance(other, DialogueLog):
+            other = other.to_list()
+        return self.to_list() == other
+
+    def append(self, message: dict):
+        self._roles.append(_role_id(message.get("role")))
+        self._texts.append(intern_text(message.get("content")))
+        if len(self._texts) >= HOT_MESSAGES + COLD_BLOCK:
+            self._cold.append(zlib.compress(json.dumps(self._texts[:COLD_BLOCK]).encode("utf-8")))
+            del self._texts[:COLD_BLOCK]
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def to_list(self) -> list:
+        return self[:]
+
+    def parts(self) -> tuple:
+        """(role ids, compressed blocks, plain texts, block size): the log as stored, for binary snapshots."""
+        return bytes(self._roles), self._cold, self._texts, COLD_BLOCK
+
+    @classmethod
+    def from_parts(cls, roles: bytes, cold: list, texts: list, block_size: int) -> "DialogueLog":
+        # Only the built-in roles have the same id in every process.
+        if max(roles, default=0) >= _BUILTIN_ROLES:
+            raise ValueError("DialogueLog parts have an unknown role id.")
+        if block_size != COLD_BLOCK or len(roles) != len(cold) * block_size + len(texts):
+            # Written with another block size; rebuild it message by message.
+            all_texts = [text for block in cold for text in json.loads(zlib.decompress(block))] + list(texts)
+            if len(all_texts) != len(roles):
+                raise ValueError("DialogueLog parts don't match.")
+            return cls({"role": _ROLES[role_id], "content": text} for role_id, text in zip(roles, all_texts))
+        log = cls()
+        log._roles = bytearray(roles)
+        log._cold = list(cold)
+        log._texts = [intern_text(text) for text in texts]
+        return log
+
+    def nbytes(self) -> int:
+        """Approximate memory held by this log, text included."""
+        return (
+            sys.getsizeof(self) + sys.getsizeof(self._roles) + sys.getsizeof(self._cold) + sys.getsizeof(self._texts)
+            + sum(sys.getsizeof(block) for block in self._cold)
+            + sum(sys.getsizeof(text) for text in self._texts)
+        )
+
+    def _message(self, index: int, blocks: dict) -> dict:
+        cold_count = len(self._cold) * COLD_BLOCK
+        if index >= cold_count:
+            text = self._texts[index - cold_count]
+        else:
+            block = index // COLD_BLOCK
+            if block not in blocks:
+                blocks[block] = json.loads(zlib.decompress(self._cold[block]))
+            text = blocks[block][index % COLD_BLOCK]
+        return {"role": _ROLES[self._roles[index]], "content": text}
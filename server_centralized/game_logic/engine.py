@@ -1,25 +1,102 @@
 # game_logic/engine.py
 # The core GameEngine that manages the entire game lifecycle.
 
+import asyncio
+import copy
 import json
 import traceback
-from .state_manager import GameState
-from .llm_calls import GeminiAPI
-from config import VILLAGER_ROSTER, FAMILIARITY_LEVELS
+from .state_manager import GameState, PlayerSession, network_to_dict
+from .dialogue_log import intern_text
+from .llm_calls import GeminiAPI, ZeroGravityBridgeAPI
+from .llm_router import LLMRouter
+from .cassette import CassetteStore, CassetteReplayAPI, SyntheticLatency
+from .llm_outputs import StructuredOutputs
+from .stream_parser import JsonStringFieldStreamer
+from .world_builder import ShardedWorldBuilder
+from .memory_manager import ConversationMemory
+from .fast_path import (
+    FastPathResponder, parse_template_bank, template_bank_size,
+    normalize_choice, OPENING_PROMPT, OPENING_PROMPTS,
+)
+from .response_cache import ResponseCache
+from .speculation import SpeculativePrefetcher
+from .quest_index import quest_index
+from config import (
+    VILLAGER_ROSTER, FAMILIARITY_LEVELS, SHARDED_WORLD_BUILDER,
+    CHAT_RECENT_TURNS, INTERACTION_PROMPT_TOKEN_BUDGET, CHAT_SUMMARY_MAX_WORDS,
+    FAST_PATH_MODE, FAST_PATH_LINES_PER_CASE, PREWARM_OPENINGS,
+    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_SIMILARITY,
+    SPECULATIVE_PREFETCH, SPECULATION_MAX_CONCURRENCY, SPECULATION_TTL_SECONDS,
+    LLM_BACKENDS, LLM_HEDGE_PROMPT_TYPES, LLM_ROUTER_WINDOW, LLM_ROUTER_MIN_SAMPLES, LLM_ROUTER_MAX_ERROR_RATE,
+    LLM_CASSETTE_PATH, LLM_RECORD, LLM_REPLAY_LATENCY, LLM_REPLAY_SEED,
+    LLM_OUTPUT_MAX_RETRIES, LLM_OUTPUT_RETRY_BACKOFF_SECONDS,
+)
+
+# What the player knows when the pre-generated opening turns are written.
+OPENING_KNOWLEDGE_SUMMARY = "You've just woken up in a cozy cottage. A kind old man named Arthur tells you he found you unconscious by a car wreck on the edge of the woods. He says he searched the area but saw no sign of your friends. As he speaks, you remember a faint, desperate call in your mind: 'Help us... find us...' You've just thanked him and stepped outside into the village square to begin your search."
+
+def _llm_backends(api_key: str) -> dict:
+    cassette = CassetteStore(LLM_CASSETTE_PATH) if LLM_RECORD or "replay" in LLM_BACKENDS else None
+    factories = {
+        "gemini": lambda: GeminiAPI(api_key),
+        "0g": ZeroGravityBridgeAPI,
+        "replay": lambda: CassetteReplayAPI(cassette, SyntheticLatency(LLM_REPLAY_LATENCY, LLM_REPLAY_SEED)),
+    }
+    backends = {name: factories[name]() for name in LLM_BACKENDS if name in factories}
+    for name in LLM_BACKENDS:
+        if name not in factories:
+            print(f"--- WARNING: Unknown LLM backend '{name}' in LLM_BACKENDS, ignoring it. ---")
+    backends = backends or {"gemini": GeminiAPI(api_key)}
+    if LLM_RECORD:
+        for name, backend in backends.items():
+            if name != "replay":
+                backend.recorder = cassette
+    return backends
 
 class GameEngine:
     def __init__(self, api_key: str):
-        self.llm_api = GeminiAPI(api_key)
+        self.llm_api = LLMRouter(
+            _llm_backends(api_key),
+            hedge_prompt_types=LLM_HEDGE_PROMPT_TYPES,
+            window=LLM_ROUTER_WINDOW,
+            min_samples=LLM_ROUTER_MIN_SAMPLES,
+            max_error_rate=LLM_ROUTER_MAX_ERROR_RATE
+        )
+        self.outputs = StructuredOutputs(
+            self.llm_api,
+            max_retries=LLM_OUTPUT_MAX_RETRIES,
+            backoff=LLM_OUTPUT_RETRY_BACKOFF_SECONDS
+        )
+        self.world_builder = ShardedWorldBuilder(self.llm_api)
+        self.memory = ConversationMemory(
+            self.llm_api,
+            recent_turns=CHAT_RECENT_TURNS,
+            prompt_token_budget=INTERACTION_PROMPT_TOKEN_BUDGET,
+            summary_max_words=CHAT_SUMMARY_MAX_WORDS
+        )
+        self.fast_path = FastPathResponder(FAST_PATH_MODE)
+        self.response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_SIMILARITY)
+        self.speculator = SpeculativePrefetcher(
+            self,
+            enabled=SPECULATIVE_PREFETCH,
+            max_concurrency=SPECULATION_MAX_CONCURRENCY,
+            ttl=SPECULATION_TTL_SECONDS
+        )
+        self.opening_stats = {"generated": 0, "failed": 0, "served": 0}
+        # Set to a GamePersistence to log every applied turn.
+        self.turn_log = None
 
-    def start_new_game(self, game_id: str, num_inaccessible_locations: int, difficulty: str) -> GameState:
+    def close(self):
+        self.llm_api.close()
+
+    async def start_new_game(self, game_id: str, num_inaccessible_locations: int, difficulty: str) -> GameState:
         game_state = GameState(game_id, difficulty)
         
         # 1. Generate the core story idea
         try:
             print("Attempting to generate story idea...")
             story_context = {"num_inaccessible_locations": num_inaccessible_locations}
-            story_idea_json = self.llm_api.generate_content("StoryGenerator", story_context)
-            story_idea = json.loads(story_idea_json)
+            story_idea = await self.outputs.generate("StoryGenerator", story_context)
             print("Story idea generated successfully.")
         except (json.JSONDecodeError, ValueError, KeyError) as e:
             print(f"--- CRITICAL ERROR: Failed to generate or parse story idea. Error: {e} ---")
@@ -30,106 +107,238 @@ class GameEngine:
         game_state.inaccessible_locations = story_idea.get("inaccessible_locations", [])
         game_state.correct_location = story_idea.get("correct_location")
         
-        game_state.player_state["knowledge_summary"] = "You've just woken up in a cozy cottage. A kind old man named Arthur tells you he found you unconscious by a car wreck on the edge of the woods. He says he searched the area but saw no sign of your friends. As he speaks, you remember a faint, desperate call in your mind: 'Help us... find us...' You've just thanked him and stepped outside into the village square to begin your search."
-        
         game_state.villagers = VILLAGER_ROSTER
-        
-        # Initialize state for all villagers
-        for v in game_state.villagers:
-            game_state.full_npc_memory[v["name"]] = []
-            game_state.player_state["familiarity"][v["name"]] = 0
-            # BUG FIX: Re-added initialization for unproductive_turns
-            game_state.player_state["unproductive_turns"][v["name"]] = 0
-
-        # 2. Build the detailed Quest Network
+
+        # 2. Build the detailed Quest Network, with the fast-path line bank generated alongside it
+        world_context = {
+            "correctLocation": game_state.correct_location,
+            "villagers": game_state.villagers,
+            "difficulty": difficulty,
+            "story_theme": game_state.story_theme
+        }
+        templates_task = None
+        if self.fast_path.mode != "off":
+            templates_task = asyncio.create_task(self._generate_dialogue_templates(game_state))
+        quest_network = None
+        if SHARDED_WORLD_BUILDER:
+            try:
+                print("Attempting to generate sharded quest network...")
+                quest_network = await self.world_builder.build(world_context)
+            except (json.JSONDecodeError, ValueError, KeyError) as e:
+                print(f"--- WARNING: Sharded world building failed, falling back to a single WorldBuilder call. Error: {e} ---")
+
         try:
-            print("Attempting to generate quest network...")
-            world_context = {
-                "correctLocation": game_state.correct_location,
-                "villagers": game_state.villagers,
-                "difficulty": difficulty,
-                "story_theme": game_state.story_theme
-            }
-            quest_network_json = self.llm_api.generate_content("WorldBuilder", world_context)
-            game_state.quest_network = json.loads(quest_network_json)
+            if quest_network is None:
+                print("Attempting to generate quest network...")
+                quest_network = await self.outputs.generate("WorldBuilder", world_context)
+            game_state.quest_network = quest_network
             if not game_state.quest_network.get("nodes"):
                  raise ValueError("Generated quest network is missing the 'nodes' list.")
             print("Quest network generated successfully.")
             
             print("\n\n" + "="*20 + " GENERATED QUEST NETWORK (SPOILERS) " + "="*20)
-            print(json.dumps(game_state.quest_network, indent=2))
+            print(json.dumps(network_to_dict(game_state.quest_network), indent=2))
             print("="*70 + "\n\n")
 
         except (json.JSONDecodeError, ValueError, KeyError) as e:
             print(f"--- CRITICAL ERROR: Failed to generate or parse quest network. Error: {e} ---")
             traceback.print_exc()
+            if templates_task:
+                templates_task.cancel()
             raise Exception("Could not initialize game world.") from e
 
+        if templates_task:
+            game_state.dialogue_templates = await templates_task
+
+        # 3. Pre-generate every villager's opening turn against a fresh player session
+        if PREWARM_OPENINGS:
+            game_state.opening_turns = await self._generate_opening_turns(game_state)
+
         return game_state
-    
-    def get_villager_clue_status(self, game_state: GameState, npc_name: str):
-        undiscovered_nodes = [
-            node for node in game_state.quest_network.get("nodes", [])
-            if node["villager_name"] == npc_name and node["node_id"] not in game_state.player_state["discovered_nodes"]
-        ]
 
-        if not undiscovered_nodes:
-            return "PERMANENTLY_EXHAUSTED", None
+    async def _generate_dialogue_templates(self, game_state: GameState) -> dict:
+        """Generates the world's farewell/refusal line bank; an empty bank falls back to the built-in lines."""
+        try:
+            templates_json = await self.llm_api.generate_content_async("DialogueTemplates", {
+                "villagers": game_state.villagers,
+                "story_theme": game_state.story_theme,
+                "lines_per_case": FAST_PATH_LINES_PER_CASE,
+            })
+            bank = parse_template_bank(json.loads(templates_json), game_state.villagers)
+            print(f"Dialogue template bank generated: {template_bank_size(bank)} lines.")
+            return bank
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"--- WARNING: Failed to generate dialogue templates, using built-in lines. Error: {e} ---")
+            return {}
+    
+    async def _generate_opening_turns(self, game_state: GameState) -> dict:
+        """Generates all villagers' familiarity-0 opening turns in parallel; failed villagers are left to the live path."""
+        session = PlayerSession.new("opening", game_state.villagers, OPENING_KNOWLEDGE_SUMMARY)
 
-        sorted_nodes = sorted(undiscovered_nodes, key=lambda x: x.get('priority', 0), reverse=True)
+        async def generate(npc_name):
+            clue_status, context_node = self.get_villager_clue_status(game_state, session, npc_name)
+            context = self._build_interaction_context(game_state, session, npc_name, OPENING_PROMPT, {"friends": 0})
+            try:
+                dialogue_data = await self.outputs.generate("Interaction", context)
+            except ValueError as e:
+                print(f"--- WARNING: Failed to pre-generate the opening turn for {npc_name}. Error: {e} ---")
+                self.opening_stats["failed"] += 1
+                return npc_name, None
+            self.opening_stats["generated"] += 1
+            return npc_name, {
+                "clue_status": clue_status,
+                "node_id": context_node["node_id"] if context_node else None,
+                "turn": dialogue_data,
+            }
 
-        for node in sorted_nodes:
-            preconditions_met = all(p in game_state.player_state["discovered_nodes"] for p in node.get("preconditions", []))
-            current_familiarity = game_state.player_state["familiarity"].get(npc_name, 0)
-            required_familiarity = node.get("required_familiarity")
-            familiarity_met = required_familiarity is None or current_familiarity >= required_familiarity
+        results = await asyncio.gather(*[generate(v["name"]) for v in game_state.villagers])
+        opening_turns = {npc_name: opening for npc_name, opening in results if opening}
+        print(f"Pre-generated opening turns for {len(opening_turns)}/{len(game_state.villagers)} villagers.")
+        return opening_turns
 
-            if preconditions_met and familiarity_met:
-                return "CAN_REVEAL", node
+    def _opening_turn(self, game_state: GameState, session: PlayerSession, npc_name: str, player_input: str, clue_status: str, context_node):
+        """Returns a copy of the villager's pre-generated opening if this is the player's first, unchanged visit."""
+        opening = game_state.opening_turns.get(npc_name)
+        if not opening or normalize_choice(player_input) not in {normalize_choice(p) for p in OPENING_PROMPTS}:
+            return None
+        if session.memory.get(npc_name) or session.state["familiarity"].get(npc_name, 0) != 0:
+            return None
+        # The player may have discovered clues elsewhere that change what this villager can reveal.
+        if opening["clue_status"] != clue_status or opening["node_id"] != (context_node["node_id"] if context_node else None):
+            return None
+        self.opening_stats["served"] += 1
+        return copy.deepcopy(opening["turn"])
 
-        return "HAS_LOCKED_CLUES", sorted_nodes[0]
+    def get_villager_clue_status(self, game_state: GameState, session: PlayerSession, npc_name: str):
+        return quest_index(game_state).clue_status(session.state, npc_name)
 
-    def process_interaction_turn(self, game_state: GameState, npc_name: str, player_input: str, frustration: dict):
-        clue_status, context_node = self.get_villager_clue_status(game_state, npc_name)
+    def _build_interaction_context(self, game_state: GameState, session: PlayerSession, npc_name: str, player_input: str, frustration: dict) -> dict:
+        clue_status, context_node = self.get_villager_clue_status(game_state, session, npc_name)
 
         villager_profile = next((v for v in game_state.villagers if v["name"] == npc_name), None)
         
-        familiarity = game_state.player_state["familiarity"].get(npc_name, 0)
+        familiarity = session.state["familiarity"].get(npc_name, 0)
         
-        dialogue_turn = self.llm_api.generate_content("Interaction", {
+        context = {
             "villagerProfile": villager_profile,
-            "chatHistory": game_state.full_npc_memory.get(npc_name, []),
+            "chatSummary": "",
+            "chatHistory": [],
             "player_last_response": player_input,
             "conversational_status": clue_status,
-            "context_node": context_node,
+            "context_node": context_node.to_dict() if context_node else None,
             "frustration": frustration,
-            "player_knowledge_summary": game_state.player_state["knowledge_summary"],
+            "player_knowledge_summary": session.state["knowledge_summary"],
             "familiarity_level": familiarity,
             "familiarity_description": FAMILIARITY_LEVELS.get(familiarity, "Unknown"),
-        })
-        
-        dialogue_data = json.loads(dialogue_turn)
-        
-        game_state.full_npc_memory[npc_name].append({"role": "player", "content": player_input})
-        game_state.full_npc_memory[npc_name].append({"role": "npc", "content": dialogue_data.get("npc_dialogue")})
+        }
+        # Fill in as much chat history as the prompt's token budget allows.
+        context["chatSummary"], context["chatHistory"] = self.memory.build_history(
+            session.state,
+            session.memory.get(npc_name, []),
+            npc_name,
+            self.memory.history_budget("Interaction", context)
+        )
+        return context
+
+    def _apply_dialogue_turn(self, game_state: GameState, session: PlayerSession, npc_name: str, player_input: str, dialogue_data: dict):
+        session.memory[npc_name].append({"role": "player", "content": player_input})
+        session.memory[npc_name].append({"role": "npc", "content": dialogue_data.get("npc_dialogue")})
         
         # LOGIC FIX: Enforce the "+1" familiarity rule in the engine
         new_familiarity = dialogue_data.get("new_familiarity_level")
         if new_familiarity is not None:
-            old_familiarity = game_state.player_state["familiarity"].get(npc_name, 0)
+            old_familiarity = session.state["familiarity"].get(npc_name, 0)
             # Cap the increase at a maximum of 1
             if new_familiarity > old_familiarity + 1:
                 new_familiarity = old_familiarity + 1
-            game_state.player_state["familiarity"][npc_name] = new_familiarity
+            session.state["familiarity"][npc_name] = new_familiarity
 
         revealed_node_id = dialogue_data.get("node_revealed_id")
-        if revealed_node_id and revealed_node_id not in game_state.player_state["discovered_nodes"]:
-            game_state.player_state["discovered_nodes"].append(revealed_node_id)
-            all_discovered_content = [node['content'] for node in game_state.quest_network.get('nodes', []) if node['node_id'] in game_state.player_state['discovered_nodes']]
-            game_state.player_state["knowledge_summary"] = "Key points discovered so far: " + "; ".join(all_discovered_content)
+        index = quest_index(game_state)
+        newly_revealed = bool(revealed_node_id) and index.reveal(session.state, revealed_node_id)
+        if newly_revealed:
+            all_discovered_content = index.discovered_content(session.state)
+            session.state["knowledge_summary"] = "Key points discovered so far: " + "; ".join(all_discovered_content)
+
+        # Remembered so that clicking one of these next turn counts as a scripted (fast-path) turn.
+        session.state.setdefault("npc_suggestions", {})[npc_name] = [intern_text(s) for s in dialogue_data.get("player_responses") or []]
+        self.memory.schedule_fold(session.state, session.memory[npc_name], npc_name)
+        if self.turn_log:
+            self.turn_log.log_turn(
+                game_state, session, npc_name, player_input, dialogue_data,
+                revealed_node_id if newly_revealed else None
+            )
 
         print("\n\n" + "-"*20 + " CURRENT PLAYER STATE " + "-"*20)
-        print(json.dumps(game_state.player_state, indent=2, default=str))
+        print(json.dumps(session.state, indent=2, default=str))
         print("-"*60 + "\n\n")
 
-        return dialogue_data
\ No newline at end of file
+    async def _local_turn(self, game_state: GameState, session: PlayerSession, npc_name: str, player_input: str):
+        """
+        Answers the turn without a new LLM call when a pre-generated opening, the
+        fast path, a speculative turn or the response cache covers it. Returns (dialogue_data, cache_key);
+        dialogue_data is None when the LLM is needed, and its response should then
+        be stored under cache_key.
+        """
+        clue_status, context_node = self.get_villager_clue_status(game_state, session, npc_name)
+        dialogue_data = self._opening_turn(game_state, session, npc_name, player_input, clue_status, context_node)
+        source = "Pre-generated opening"
+        if dialogue_data is None:
+            dialogue_data = self.fast_path.respond(game_state, session, npc_name, player_input, clue_status)
+            source = "Fast-path"
+        if dialogue_data is None:
+            dialogue_data = await self.speculator.take(game_state, session, npc_name, player_input)
+            source = "Speculative"
+        cache_key = None
+        if dialogue_data is None and self.response_cache.enabled:
+            cache_key = self.response_cache.state_key(game_state, session, npc_name, clue_status, context_node)
+            dialogue_data = self.response_cache.get(cache_key, player_input)
+            source = "Cached"
+        if dialogue_data is None:
+            self.fast_path.record_llm_turn()
+            return None, cache_key
+
+        print(f"--- ⚡ {source} {clue_status} turn for {npc_name} ---")
+        self._apply_dialogue_turn(game_state, session, npc_name, player_input, dialogue_data)
+        return dialogue_data, cache_key
+
+    async def process_interaction_turn(self, game_state: GameState, session: PlayerSession, npc_name: str, player_input: str, frustration: dict):
+        dialogue_data, cache_key = await self._local_turn(game_state, session, npc_name, player_input)
+        if dialogue_data is None:
+            context = self._build_interaction_context(game_state, session, npc_name, player_input, frustration)
+            dialogue_data = await self.outputs.generate("Interaction", context)
+            self._apply_dialogue_turn(game_state, session, npc_name, player_input, dialogue_data)
+            if cache_key:
+                self.response_cache.put(cache_key, player_input, dialogue_data)
+
+        self.speculator.schedule(game_state, session, npc_name, dialogue_data.get("player_responses") or [], frustration)
+        return dialogue_data
+
+    async def stream_interaction_turn(self, game_state: GameState, session: PlayerSession, npc_name: str, player_input: str, frustration: dict):
+        """
+        Streaming variant of process_interaction_turn. Yields ("dialogue", text)
+        events as npc_dialogue is generated, then a single ("turn", dialogue_data)
+        event once the full response has been parsed and applied to the state.
+        Turns answered without a new LLM call arrive as a single dialogue event.
+        """
+        dialogue_data, cache_key = await self._local_turn(game_state, session, npc_name, player_input)
+        if dialogue_data is not None:
+            yield "dialogue", dialogue_data["npc_dialogue"]
+        else:
+            context = self._build_interaction_context(game_state, session, npc_name, player_input, frustration)
+            dialogue_streamer = JsonStringFieldStreamer("npc_dialogue")
+            chunks = []
+            async for chunk in self.llm_api.stream_content("Interaction", context):
+                chunks.append(chunk)
+                dialogue_delta = dialogue_streamer.feed(chunk)
+                if dialogue_delta:
+                    yield "dialogue", dialogue_delta
+
+            # A stream cut short is repaired, and only its missing fields re-requested.
+            dialogue_data = await self.outputs.complete("Interaction", context, "".join(chunks))
+            self._apply_dialogue_turn(game_state, session, npc_name, player_input, dialogue_data)
+            if cache_key:
+                self.response_cache.put(cache_key, player_input, dialogue_data)
+
+        self.speculator.schedule(game_state, session, npc_name, dialogue_data.get("player_responses") or [], frustration)
+        yield "turn", dialogue_data
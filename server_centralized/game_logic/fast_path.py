@@ -0,0 +1,179 @@
+# game_logic/fast_path.py
+# Answers farewell and refusal turns locally instead of making an Interaction LLM call.
+
+import re
+
+FAST_PATH_STATUSES = ("PERMANENTLY_EXHAUSTED", "HAS_LOCKED_CLUES")
+# "off": every turn goes to the LLM. "scripted": only turns where the player opens the
+# conversation or clicks one of the villager's own suggestions. "all": every turn with a
+# fast-path status, including free-form player input.
+FAST_PATH_MODES = ("off", "scripted", "all")
+# What clients send to open a conversation with a villager (the second is /interact's default).
+OPENING_PROMPT = "This is the starting prompt of the conversation."
+OPENING_PROMPTS = (OPENING_PROMPT, "I'd like to talk.")
+# Traits that decide the tone of the built-in lines, in tie-break order.
+TONE_TRAITS = ("fearfulness", "mystery", "sarcasm", "humor", "helpfulness")
+MAX_TEMPLATE_CHARS = 400
+
+# Built-in lines per status, dominant personality trait and familiarity band, used when
+# a world has no generated bank for a villager (e.g. the bank call failed).
+DEFAULT_TEMPLATES = {
+    "PERMANENTLY_EXHAUSTED": {
+        "fearfulness": {
+            "distant": [("I'm {name}, and I've told you all I dare. Please, leave me be before someone sees us talking.", "I'll leave you in peace.")],
+            "close": [("That's everything I know, I swear it. Be careful out there, and don't trust the quiet.", "Thank you. Stay safe.")],
+        },
+        "mystery": {
+            "distant": [("I'm {name}. The signs have nothing more to tell you through me.", "Farewell.")],
+            "close": [("The omens have spoken through me all they will. The rest of the path is yours to walk.", "Farewell, and thank you.")],
+        },
+        "sarcasm": {
+            "distant": [("I'm {name}, and no, I don't have some secret I forgot to mention. Off you go.", "Fine, goodbye.")],
+            "close": [("You've squeezed every last word out of me. I'd have nothing left to gossip about if I told you more.", "Thanks for everything.")],
+        },
+        "humor": {
+            "distant": [("Name's {name}, and I'm all out of stories, stranger. Even the good ones.", "Goodbye, then.")],
+            "close": [("I'd tell you more, but you've already heard my best material. Go find your friends.", "Thanks, I will.")],
+        },
+        "helpfulness": {
+            "distant": [("I'm {name}. I wish I could help more, but I've nothing else to tell you.", "Thank you anyway.")],
+            "close": [("I've told you everything I know, friend. Whatever you find next, I hope it brings them home.", "Thank you for your help.")],
+        },
+    },
+    "HAS_LOCKED_CLUES": {
+        "fearfulness": {
+            "distant": [("I'm {name}. There's more, but it isn't safe to say it to someone I barely know.", "I understand. Goodbye for now.")],
+            "close": [("Not yet. If the wrong ears hear me now, we'll both regret it. Come back when more is known.", "I'll come back later.")],
+        },
+        "mystery": {
+            "distant": [("I'm {name}. Some things cannot be spoken before their time has come.", "Then I'll return when it has.")],
+            "close": [("The signs aren't ready to be read. Learn what the others know, then return to me.", "I'll return later.")],
+        },
+        "sarcasm": {
+            "distant": [("I'm {name}, and I don't spill secrets to strangers who wander in from the woods.", "Fair enough. Goodbye.")],
+            "close": [("Nice try. Find out a bit more on your own first, then maybe I'll talk.", "Alright, I'll be back.")],
+        },
+        "humor": {
+            "distant": [("Name's {name}. Buy me a drink someday and maybe I'll tell you the rest.", "Maybe I will. Goodbye.")],
+            "close": [("Patience! The best part of the story is coming, just not today.", "I'll hold you to that.")],
+        },
+        "helpfulness": {
+            "distant": [("I'm {name}. I'd like to help, but I need to know I can trust you first.", "I understand. Goodbye for now.")],
+            "close": [("I want to tell you, truly, but it isn't the right time. Speak with the others and come back.", "I'll come back soon.")],
+        },
+    },
+}
+
+def familiarity_band(familiarity: int) -> str:
+    return "close" if familiarity >= 3 else "distant"
+
+def dominant_trait(villager_profile: dict) -> str:
+    traits = (villager_profile or {}).get("personality_traits", {})
+    return max(TONE_TRAITS, key=lambda trait: traits.get(trait, 0))
+
+def normalize_choice(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).strip()
+
+def parse_template_bank(raw: dict, villagers) -> dict:
+    """Validates a DialogueTemplates response into {villager: {status: {band: [[line, reply], ...]}}}."""
+    names = {v["name"] for v in villagers}
+    bank = {}
+    for template in raw.get("templates", []) if isinstance(raw, dict) else []:
+        if not isinstance(template, dict):
+            continue
+        name, status, band = template.get("villager_name"), template.get("status"), template.get("familiarity")
+        line, reply = template.get("npc_dialogue"), template.get("player_response")
+        if name not in names or status not in FAST_PATH_STATUSES or band not in ("distant", "close"):
+            continue
+        if not isinstance(line, str) or not isinstance(reply, str) or not line.strip() or not reply.strip():
+            continue
+        bank.setdefault(name, {}).setdefault(status, {}).setdefault(band, []).append(
+            [line.strip()[:MAX_TEMPLATE_CHARS], reply.strip()[:MAX_TEMPLATE_CHARS]]
+        )
+    return bank
+
+class FastPathResponder:
+    """
+    Answers PERMANENTLY_EXHAUSTED and HAS_LOCKED_CLUES turns from template banks.
+
+    Those turns only need a farewell or a polite refusal with one closing option
+    and no revealed node, so they are served from the world's generated bank
+    (GameState.dialogue_templates, keyed by villager, status and familiarity
+    band) or, failing that, from the built-in lines for the villager's dominant
+    personality trait. Local turns leave familiarity as it was. CAN_REVEAL
+    turns and free-form player input (except to an exhausted villager in "all"
+    mode) still go to the LLM.
+    """
+
+    def __init__(self, mode: str):
+        if mode not in FAST_PATH_MODES:
+            print(f"--- WARNING: Unknown FAST_PATH_MODE '{mode}', using 'scripted'. ---")
+            mode = "scripted"
+        self.mode = mode
+        self.stats = {"fast_path_turns": 0, "llm_turns": 0, "bank_lines": 0, "default_lines": 0}
+
+    def covers(self, player_state: dict, npc_name: str, player_input: str, clue_status: str) -> bool:
+        """Whether a turn with this input and status is answered locally."""
+        if self.mode == "off" or clue_status not in FAST_PATH_STATUSES:
+            return False
+        # Free-form input to a villager with locked clues always goes to the LLM, which decides
+        # whether it builds enough rapport to open them.
+        if self.mode == "all" and clue_status == "PERMANENTLY_EXHAUSTED":
+            return True
+        return self._is_scripted(player_state, npc_name, player_input)
+
+    def respond(self, game_state, session, npc_name: str, player_input: str, clue_status: str):
+        """Returns dialogue data for the turn, or None if it needs the LLM."""
+        if not self.covers(session.state, npc_name, player_input, clue_status):
+            return None
+
+        familiarity = session.state["familiarity"].get(npc_name, 0)
+        band = familiarity_band(familiarity)
+        lines = game_state.dialogue_templates.get(npc_name, {}).get(clue_status, {}).get(band)
+        if lines:
+            self.stats["bank_lines"] += 1
+        else:
+            villager_profile = next((v for v in game_state.villagers if v["name"] == npc_name), None)
+            lines = [
+                (line.format(name=npc_name), reply)
+                for line, reply in DEFAULT_TEMPLATES[clue_status][dominant_trait(villager_profile)][band]
+            ]
+            self.stats["default_lines"] += 1
+
+        # Rotate through the bank so repeated visits don't hear the same line twice in a row.
+        memory = session.memory.get(npc_name, [])
+        last_line = memory[-1]["content"] if memory else None
+        index = len(memory) // 2
+        line, reply = lines[index % len(lines)]
+        if line == last_line and len(lines) > 1:
+            line, reply = lines[(index + 1) % len(lines)]
+
+        self.stats["fast_path_turns"] += 1
+        # Rapport is judged by the LLM alone, so a stock reply never raises familiarity.
+        return {
+            "npc_dialogue": line,
+            "player_responses": [reply],
+            "node_revealed_id": None,
+            "new_familiarity_level": familiarity,
+        }
+
+    def record_llm_turn(self):
+        self.stats["llm_turns"] += 1
+
+    def health(self) -> dict:
+        turns = self.stats["fast_path_turns"] + self.stats["llm_turns"]
+        return {
+            "mode": self.mode,
+            "hit_rate": round(self.stats["fast_path_turns"] / turns, 3) if turns else None,
+            **self.stats,
+        }
+
+    def _is_scripted(self, player_state: dict, npc_name: str, player_input: str) -> bool:
+        normalized = normalize_choice(player_input)
+        if normalized in {normalize_choice(prompt) for prompt in OPENING_PROMPTS}:
+            return True
+        offered = player_state.get("npc_suggestions", {}).get(npc_name, [])
+        return normalized in {normalize_choice(suggestion) for suggestion in offered}
+
+def template_bank_size(bank: dict) -> int:
+    return sum(len(lines) for statuses in bank.values() for bands in statuses.values() for lines in bands.values())
@@ -1,18 +1,103 @@
 # game_logic/llm_calls.py
 # Contains the GeminiAPI class and all prompt engineering logic.
 
+import asyncio
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 import google.generativeai as genai
+import requests
+from config import LLM_MAX_CONCURRENCY, GEMINI_CONTEXT_CACHE, GEMINI_CACHE_MIN_TOKENS, GEMINI_CACHE_TTL_SECONDS, OG_BRIDGE_URL
+
+MODEL_NAME = 'gemini-2.5-flash-lite'
+# Cached contents are recreated this long before they expire, so no call races the expiry.
+CACHE_REFRESH_MARGIN = 300
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for prompt budgeting and reporting."""
+    return (len(text) + 3) // 4
+
+def world_difficulty_profile(difficulty):
+    """Size and tone parameters of a quest network for the given difficulty."""
+    if difficulty == 'Very Easy':
+        return {
+            "node_count": "8",
+            "max_nodes": 8,
+            "key_clue_count": 2,
+            "final_clue_instruction": "The final clue must be extremely direct and explicitly state where to go.",
+            "difficulty_instructions": "Clues must be direct and obvious. Avoid riddles or metaphors.",
+            "type_instruction": "Generate **exactly 2 nodes** of type 'TalkToVillager' to guide the player. The rest should be 'Information'.",
+        }
+    if difficulty == 'Easy':
+        return {
+            "node_count": "15-20",
+            "max_nodes": 20,
+            "key_clue_count": 3,
+            "final_clue_instruction": "The final clue should be a strong hint, making the answer clear.",
+            "difficulty_instructions": "Clues should be mostly straightforward.",
+            "type_instruction": "You may use a mix of 'Information' and 'TalkToVillager' nodes.",
+        }
+    if difficulty == 'Hard':
+        return {
+            "node_count": "35-40",
+            "max_nodes": 40,
+            "key_clue_count": 6,
+            "final_clue_instruction": "The final clue must be extremely cryptic, requiring significant deduction.",
+            "difficulty_instructions": "Clues must be cryptic and often misleading. Use riddles and metaphors.",
+            "type_instruction": "Create a complex web using many 'TalkToVillager' nodes to interconnect clues.",
+        }
+    # Medium
+    return {
+        "node_count": "25-30",
+        "max_nodes": 30,
+        "key_clue_count": 4,
+        "final_clue_instruction": "The final clue must be cryptic. Do not state the answer directly.",
+        "difficulty_instructions": "Clues should require some thought and interpretation.",
+        "type_instruction": "Create a web-like structure with a good mix of 'Information' and 'TalkToVillager' nodes.",
+    }
 
 class GeminiAPI:
-    def __init__(self, api_key):
+    backend_name = "Gemini"
+    # Whether static instructions are uploaded once as cached content; only then is it
+    # worth putting the full villager profile in them instead of paying for it every turn.
+    caches_instructions = GEMINI_CONTEXT_CACHE
+
+    def __init__(self, api_key, max_concurrency: int = LLM_MAX_CONCURRENCY):
         try:
             genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
+            self.model = genai.GenerativeModel(MODEL_NAME)
             print("✅ Gemini API configured successfully.")
         except Exception as e:
             print(f"❌ Error configuring Gemini API: {e}")
             self.model = None
+        self._setup_runtime(max_concurrency, "gemini")
+
+    def _setup_runtime(self, max_concurrency, thread_name_prefix):
+        # The SDK call is blocking, so it runs on a dedicated bounded pool.
+        # This keeps slow generations off the event loop without letting them
+        # exhaust the loop's default executor.
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=thread_name_prefix)
+        # Estimated prompt size per prompt type, reported by /health/llm.
+        self.prompt_stats = {}
+        # Static instruction text per (prompt type, villager/difficulty), and the model
+        # (plain system instruction or cached content) serving each instruction text.
+        self._static_prompts = {}
+        self._models = {}
+        self._models_lock = threading.Lock()
+        # Optional CassetteStore every successful response is recorded to.
+        self.recorder = None
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for model, expires_at, cache in self._models.values():
+            if cache is not None:
+                try:
+                    cache.delete()
+                except Exception as e:
+                    print(f"--- WARNING: Could not delete Gemini cached content: {e} ---")
+        self._models.clear()
 
     def _clean_json_response(self, text_response):
         text_response = text_response.strip()
@@ -22,28 +107,168 @@ class GeminiAPI:
             text_response = text_response[:-3]
         return text_response.strip()
 
-    def generate_content(self, prompt_type, context):
-        if not self.model: return "{}"
-        print(f"\n--- 🤖 Live Gemini API Call ({prompt_type}) ---")
-        
+    def _build_prompt(self, prompt_type, context):
+        """Returns (system_instruction, prompt) for a prompt type.
+
+        The system instruction is the static part of the prompt, shared by every call
+        for the same villager and difficulty; it is None for prompts without one.
+        """
         prompts = {
             "StoryGenerator": self._create_story_generator_prompt,
             "WorldBuilder": self._create_world_builder_prompt,
+            "WorldSkeleton": self._create_world_skeleton_prompt,
+            "VillagerShard": self._create_villager_shard_prompt,
             "Interaction": self._create_interaction_prompt,
+            "MemorySummary": self._create_memory_summary_prompt,
+            "DialogueTemplates": self._create_dialogue_templates_prompt,
+            "FieldCompletion": self._create_field_completion_prompt,
         }
         prompt = prompts.get(prompt_type, lambda _: "")(context)
+        if isinstance(prompt, tuple):
+            return prompt
+        return None, prompt
+
+    def _compiled(self, key, build):
+        """Returns the static prompt text for `key`, building it only the first time."""
+        text = self._static_prompts.get(key)
+        if text is None:
+            text = self._static_prompts[key] = build()
+        return text
+
+    def _model_for(self, system_instruction):
+        """Returns the model to call for a static instruction text.
+
+        Each distinct instruction gets its own model carrying it as system_instruction,
+        so Gemini sees an identical prefix on every call. With GEMINI_CONTEXT_CACHE on,
+        long instructions are uploaded once as cached content instead and only the
+        dynamic part of the prompt is sent per call.
+        """
+        if not system_instruction:
+            return self.model
+        with self._models_lock:
+            entry = self._models.get(system_instruction)
+            if entry and (entry[1] is None or entry[1] > time.time()):
+                return entry[0]
+
+            model, expires_at, cache = None, None, None
+            if GEMINI_CONTEXT_CACHE and estimate_tokens(system_instruction) >= GEMINI_CACHE_MIN_TOKENS:
+                try:
+                    cache = genai.caching.CachedContent.create(
+                        model=MODEL_NAME,
+                        system_instruction=system_instruction,
+                        ttl=timedelta(seconds=GEMINI_CACHE_TTL_SECONDS),
+                    )
+                    model = genai.GenerativeModel.from_cached_content(cache)
+                    expires_at = time.time() + GEMINI_CACHE_TTL_SECONDS - CACHE_REFRESH_MARGIN
+                except Exception as e:
+                    print(f"--- WARNING: Gemini context caching failed, sending the system instruction instead. Error: {e} ---")
+                    cache = None
+            if model is None:
+                model = genai.GenerativeModel(MODEL_NAME, system_instruction=system_instruction)
+            self._models[system_instruction] = (model, expires_at, cache)
+            return model
+
+    def estimate_prompt_tokens(self, prompt_type, context):
+        system_instruction, prompt = self._build_prompt(prompt_type, context)
+        return estimate_tokens(system_instruction or "") + estimate_tokens(prompt)
+
+    def _record_prompt_size(self, prompt_type, system_instruction, prompt):
+        static_tokens = estimate_tokens(system_instruction or "")
+        tokens = estimate_tokens(prompt)
+        stats = self.prompt_stats.setdefault(prompt_type, {
+            "calls": 0, "total_tokens": 0, "max_tokens": 0, "last_tokens": 0, "static_tokens": 0,
+        })
+        stats["calls"] += 1
+        stats["total_tokens"] += tokens
+        stats["max_tokens"] = max(stats["max_tokens"], tokens)
+        stats["last_tokens"] = tokens
+        stats["static_tokens"] = static_tokens
+        print(f"--- Prompt size ({prompt_type}): {len(prompt)} chars, ~{tokens} tokens (+ ~{static_tokens} static tokens) ---")
+
+    def generate_content(self, prompt_type, context):
+        if not self.model: return "{}"
+        print(f"\n--- 🤖 Live {self.backend_name} API Call ({prompt_type}) ---")
+        
+        system_instruction, prompt = self._build_prompt(prompt_type, context)
         if not prompt: 
             print(f"--- ERROR: No prompt found for type '{prompt_type}' ---")
             return "{}"
+        self._record_prompt_size(prompt_type, system_instruction, prompt)
 
-        print("--- Sending Prompt to Gemini... (This may take a moment) ---")
+        print(f"--- Sending Prompt to {self.backend_name}... (This may take a moment) ---")
         try:
-            response = self.model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-            return self._clean_json_response(response.text)
+            model = self._model_for(system_instruction)
+            response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
+            text = self._clean_json_response(response.text)
+            if self.recorder is not None:
+                self.recorder.record(prompt_type, system_instruction, prompt, text)
+            return text
         except Exception as e:
             print(f"❌ An error occurred during the API call: {e}")
             return "{}"
 
+    async def generate_content_async(self, prompt_type, context):
+        """Awaitable version of generate_content that runs on the LLM executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.generate_content, prompt_type, context)
+
+    async def stream_content(self, prompt_type, context):
+        """Yields the raw text of the response chunk by chunk as Gemini generates it.
+
+        The blocking stream is consumed on the LLM executor and handed to the event
+        loop through a queue. Closing the generator early stops the worker thread
+        at the next chunk. On error the stream simply ends, so callers should
+        validate the concatenated text.
+        """
+        if not self.model:
+            yield "{}"
+            return
+        print(f"\n--- 🤖 Live {self.backend_name} API Call ({prompt_type}, streaming) ---")
+
+        system_instruction, prompt = self._build_prompt(prompt_type, context)
+        if not prompt:
+            print(f"--- ERROR: No prompt found for type '{prompt_type}' ---")
+            yield "{}"
+            return
+        self._record_prompt_size(prompt_type, system_instruction, prompt)
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        finished = object()
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                model = self._model_for(system_instruction)
+                response = model.generate_content(
+                    prompt, generation_config={"response_mime_type": "application/json"}, stream=True
+                )
+                chunks = []
+                for chunk in response:
+                    if cancelled.is_set():
+                        return
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks without text parts (e.g. safety metadata only).
+                        continue
+                    chunks.append(text)
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+                if self.recorder is not None and chunks:
+                    self.recorder.record(prompt_type, system_instruction, prompt, self._clean_json_response("".join(chunks)))
+            except Exception as e:
+                print(f"❌ An error occurred during the streaming API call: {e}")
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+
+        producer = loop.run_in_executor(self._executor, produce)
+        try:
+            while (text := await queue.get()) is not finished:
+                yield text
+        finally:
+            cancelled.set()
+        await producer
+
     def _create_story_generator_prompt(self, context):
         return f"""
         You are a master storyteller and mystery writer for the game "Village of Echoes".
@@ -75,46 +300,22 @@ class GeminiAPI:
         Output ONLY the raw JSON object.
         """
 
-    def _create_world_builder_prompt(self, context):
-        difficulty = context.get('difficulty', 'Medium')
-        if difficulty == 'Very Easy':
-            node_count = "8"
-            key_clue_count = 2
-            final_clue_instruction = "The final clue must be extremely direct and explicitly state where to go."
-            difficulty_instructions = "Clues must be direct and obvious. Avoid riddles or metaphors."
-            type_instruction = "Generate **exactly 2 nodes** of type 'TalkToVillager' to guide the player. The rest should be 'Information'."
-        elif difficulty == 'Easy':
-            node_count = "15-20"
-            key_clue_count = 3
-            final_clue_instruction = "The final clue should be a strong hint, making the answer clear."
-            difficulty_instructions = "Clues should be mostly straightforward."
-            type_instruction = "You may use a mix of 'Information' and 'TalkToVillager' nodes."
-        elif difficulty == 'Hard':
-            node_count = "35-40"
-            key_clue_count = 6
-            final_clue_instruction = "The final clue must be extremely cryptic, requiring significant deduction."
-            difficulty_instructions = "Clues must be cryptic and often misleading. Use riddles and metaphors."
-            type_instruction = "Create a complex web using many 'TalkToVillager' nodes to interconnect clues."
-        else: # Medium
-            node_count = "25-30"
-            key_clue_count = 4
-            final_clue_instruction = "The final clue must be cryptic. Do not state the answer directly."
-            difficulty_instructions = "Clues should require some thought and interpretation."
-            type_instruction = "Create a web-like structure with a good mix of 'Information' and 'TalkToVillager' nodes."
+    # ================= WORLD ================= #
+    # Each world prompt is split into a static instruction block, compiled once per
+    # difficulty (and villager for shards) and sent as the system instruction, and
+    # a short dynamic part carrying this game's story.
 
+    def _world_builder_instructions(self, difficulty, villagers):
+        profile = world_difficulty_profile(difficulty)
         return f"""
         You are a world-class narrative designer generating a "Quest Network" for the game "Village of Echoes".
 
-        The correct location is: **{context['correctLocation']}**.
-        The difficulty is: **{difficulty.upper()}**.
-        The core secret of the village is: **{context['story_theme']}**
-
         **Guiding Principles:**
         - **Clarity of Content is Paramount:** The `content` field must be written to be as clear as possible for the player.
             - If `type` is `Information`, the `content` is a direct clue the player learns with complete brief of clue history, direction and reason.
             - If `type` is `TalkToVillager`, the `content` **MUST** explicitly name the villager to talk to and give a clear reason and also where they will be found/ are. **Bad example:** 'The river holds many secrets.' **Good example:** 'You should go speak with Old Mara by the river; she knows things about the recent disappearances.'
         - **Character-Driven:** Clues must originate from the villager's personality and their role in the secret.
-        - **Difficulty:** {difficulty_instructions}
+        - **Difficulty:** {profile['difficulty_instructions']}
 
         **Node Structure:**
         -   `node_id`: A simple, unique, sequential string, like "node1", "node2", "node3", etc.
@@ -127,46 +328,171 @@ class GeminiAPI:
         -   `required_familiarity`: An integer from 1-5, or `null`.
 
         **Generation Requirements ({difficulty.upper()}):**
-        -   Generate a network of **{node_count} nodes**.
-        -   Designate **exactly {key_clue_count} nodes** as `key_clue: true`.
-        -   {type_instruction}
-        -   **{final_clue_instruction}**
+        -   Generate a network of **{profile['node_count']} nodes**.
+        -   Designate **exactly {profile['key_clue_count']} nodes** as `key_clue: true`.
+        -   {profile['type_instruction']}
+        -   **{profile['final_clue_instruction']}**
 
         **Game Data for Context:**
-        -   Villagers: {json.dumps(context['villagers'], indent=2)}
+        -   Villagers: {json.dumps(villagers)}
 
         Output ONLY the raw JSON object containing the "nodes" list.
         """
 
-     # ================= INTERACTION ================= #
-    def _create_interaction_prompt(self, context):
-        conversational_status = context.get('conversational_status')
-        context_node = context.get('context_node')
-        turn_objective = ""
-        
-        json_task_instruction = "Generate a JSON object with: npc_dialogue (string), player_responses (list of 1–3 options), node_revealed_id (string or null), new_familiarity_level (0–5)."
+    def _create_world_builder_prompt(self, context):
+        difficulty = context.get('difficulty', 'Medium')
+        villagers = context['villagers']
+        instructions = self._compiled(
+            ("WorldBuilder", difficulty, json.dumps(villagers)),
+            lambda: self._world_builder_instructions(difficulty, villagers)
+        )
+        return instructions, f"""
+        The correct location is: **{context['correctLocation']}**.
+        The difficulty is: **{difficulty.upper()}**.
+        The core secret of the village is: **{context['story_theme']}**
 
-        if conversational_status == "PERMANENTLY_EXHAUSTED":
-            turn_objective = "You can no longer provide new clues. Deliver a final, reflective farewell."
-            json_task_instruction = "Generate a JSON object with: npc_dialogue (string), player_responses (EXACTLY ONE polite closing option), node_revealed_id (null), new_familiarity_level (0–5)."
-        elif conversational_status == "HAS_LOCKED_CLUES":
-            turn_objective = "You cannot yet reveal a clue. Hint gently why (trust, timing, secrecy) and end politely."
-            json_task_instruction = "Generate a JSON object with: npc_dialogue (string), player_responses (EXACTLY ONE polite closing option), node_revealed_id (null), new_familiarity_level (0–5)."
-        elif conversational_status == "CAN_REVEAL":
-            turn_objective = "MANDATORY: Reveal the current clue NOW. Integrate the content naturally into your dialogue, and set node_revealed_id. This is not optional."
+        Output ONLY the raw JSON object containing the "nodes" list.
+        """
+
+    def _world_skeleton_instructions(self, difficulty, villagers):
+        profile = world_difficulty_profile(difficulty)
+        villagers = [
+            {"name": v["name"], "location": v["location"], "backstory": v["backstory"]}
+            for v in villagers
+        ]
+        return f"""
+        You are a world-class narrative designer planning the skeleton of a "Quest Network" for the game "Village of Echoes".
+
+        **Your Task:**
+        Do NOT write the full network. Plan only its load-bearing clues ("anchors") and how many nodes each villager will own. Every villager's nodes are written separately afterwards from your plan, so the anchors must carry everything that ties the villagers together.
+
+        **Anchor Structure:**
+        -   `anchor_id`: A simple, unique, sequential string, like "A1", "A2", "A3", etc.
+        -   `villager_name`: Who provides this clue. Must be one of the villager names below.
+        -   `summary`: One sentence stating what the clue reveals. For 'TalkToVillager', name the villager to talk to, why, and where they are.
+        -   `type`: "Information" or "TalkToVillager".
+        -   `key_clue`: A boolean (true/false).
+        -   `requires`: List of `anchor_id` strings of OTHER villagers' anchors that must be discovered first. These are the only links between villagers.
+
+        **Planning Requirements ({difficulty.upper()}):**
+        -   Designate **exactly {profile['key_clue_count']} anchors** as `key_clue: true`, spread across different villagers.
+        -   Exactly one anchor is the final clue pointing towards the correct location. **{profile['final_clue_instruction']}**
+        -   Add 'TalkToVillager' anchors so the villagers form a connected web. {profile['type_instruction']}
+        -   `requires` must never form a cycle.
+        -   In `villager_plans`, give every villager a `node_count` (including their anchors) so that the total is **{profile['node_count']} nodes**, and a one-line `role` describing their part in the secret.
+
+        **Villagers:** {json.dumps(villagers)}
+
+        Output ONLY the raw JSON object with the keys "anchors" (list) and "villager_plans" (list of objects with `villager_name`, `role`, `node_count`).
+        """
+
+    def _create_world_skeleton_prompt(self, context):
+        difficulty = context.get('difficulty', 'Medium')
+        villagers = context['villagers']
+        instructions = self._compiled(
+            ("WorldSkeleton", difficulty, json.dumps(villagers)),
+            lambda: self._world_skeleton_instructions(difficulty, villagers)
+        )
+        return instructions, f"""
+        The correct location is: **{context['correctLocation']}**.
+        The difficulty is: **{difficulty.upper()}**.
+        The core secret of the village is: **{context['story_theme']}**
+
+        Output ONLY the raw JSON object with the keys "anchors" and "villager_plans".
+        """
+
+    def _villager_shard_instructions(self, difficulty, villager):
+        profile = world_difficulty_profile(difficulty)
+        return f"""
+        You are a world-class narrative designer writing one villager's part of the "Quest Network" for the game "Village of Echoes".
+
+        **Your Villager:** {json.dumps(villager)}
+
+        **Guiding Principles:**
+        - **Clarity of Content is Paramount:** The `content` field must be written to be as clear as possible for the player.
+            - If `type` is `Information`, the `content` is a direct clue the player learns with complete brief of clue history, direction and reason.
+            - If `type` is `TalkToVillager`, the `content` **MUST** explicitly name the villager to talk to and give a clear reason and also where they will be found/ are.
+        - **Character-Driven:** Clues must originate from {villager['name']}'s personality and their role in the secret.
+        - **Difficulty:** {profile['difficulty_instructions']}
+
+        **Anchors:** You will be given the anchors {villager['name']} MUST include. Write exactly one node per anchor, carrying its `anchor_id` and expanding its summary into full content. You will also be given other villagers' anchors; you may list their `anchor_id`s in `preconditions` where it makes story sense.
+
+        **Node Structure:**
+        -   `node_id`: A local id for this villager only, like "L1", "L2", "L3", etc.
+        -   `anchor_id`: The anchor this node realizes, or `null`.
+        -   `content`: The core information or clue, written according to the Clarity of Content principle.
+        -   `type`: "Information" or "TalkToVillager".
+        -   `priority`: Importance order (1=Minor, 5=Major).
+        -   `key_clue`: true only for nodes realizing an anchor marked `key_clue: true`.
+        -   `preconditions`: List of local `node_id`s or `anchor_id`s required first.
+        -   `required_familiarity`: An integer from 1-5, or `null`.
+
+        All nodes are provided by {villager['name']}. Output ONLY the raw JSON object containing the "nodes" list.
+        """
+
+    def _create_villager_shard_prompt(self, context):
+        difficulty = context.get('difficulty', 'Medium')
+        villager = context['villager']
+        instructions = self._compiled(
+            ("VillagerShard", difficulty, json.dumps(villager)),
+            lambda: self._villager_shard_instructions(difficulty, villager)
+        )
+        return instructions, f"""
+        The correct location is: **{context['correctLocation']}**.
+        The difficulty is: **{difficulty.upper()}**.
+        The core secret of the village is: **{context['story_theme']}**
+        **{villager['name']}'s role in the secret:** {context['role']}
+
+        **Anchors {villager['name']} MUST include:** {json.dumps(context['anchors'])}
 
+        **Other villagers' anchors:** {json.dumps(context['external_anchors'])}
+
+        Generate **exactly {context['node_count']} nodes**. Output ONLY the raw JSON object containing the "nodes" list.
+        """
+
+    def _create_dialogue_templates_prompt(self, context):
+        villagers = [
+            {"name": v["name"], "title": v["title"], "backstory": v["backstory"], "personality_traits": v["personality_traits"]}
+            for v in context['villagers']
+        ]
+        return f"""
+        You are writing stock dialogue lines for the villagers of the horror game "Village of Echoes".
+
+        The core secret of the village is: **{context['story_theme']}**
+
+        **Villagers:** {json.dumps(villagers)}
+
+        **Your Task:**
+        For EVERY villager, write {context['lines_per_case']} lines for each combination of:
+        -   `status`: "PERMANENTLY_EXHAUSTED" (they have told the player everything they know: a short, reflective farewell) or "HAS_LOCKED_CLUES" (they know more but won't say it yet: hint why, e.g. trust, danger or timing, and end politely).
+        -   `familiarity`: "distant" (they barely know the player: open with a one-line introduction of name and role) or "close" (they trust the player).
+
+        **Rules:**
+        - Speak in-character, 1–2 sentences, matching the villager's personality traits.
+        - Never reveal a clue, name a place to search, or mention the player's friends.
+        - `player_response` is the player's single polite closing reply to the line.
+
+        Output ONLY a raw JSON object with a "templates" list of objects with `villager_name`, `status`, `familiarity`, `npc_dialogue` and `player_response`.
+        """
+
+     # ================= INTERACTION ================= #
+    def _interaction_instructions(self, villager_profile):
+        profile = f"""
+        --- YOUR VILLAGER (villagerProfile) ---
+        {json.dumps(villager_profile)}
+""" if self.caches_instructions else ""
         return f"""
         You are both a **villager actor** and a **game director** in the horror game "Village of Echoes".  
         Your goal: deliver immersive dialogue that feels authentic *while progressing the game*.  
-
+{profile}
         --- DIRECTOR'S RULES (Unbreakable) ---
-        1. Roleplay naturally as {context['villagerProfile']['name']}.  
+        1. Roleplay naturally as {villager_profile['name']}.  
         2. Stay immersive: Do NOT break character or mention the "game system."  
         3. Never mention the player's "friends" unless the player explicitly brings them up.  
         4. Keep responses smooth and natural: ~2 sentences, with tone matching the villager.  
-        5. Adjust tone based on familiarity level: {context['familiarity_level']} ({context['familiarity_description']}).  
+        5. Adjust tone based on the familiarity level given for this turn.  
            - If "Unknown", introduce yourself naturally.  
-        6. Do not repeat information the player already knows: `{context['player_knowledge_summary']}`.  
+        6. Do not repeat information the player already knows (their knowledge summary is given for this turn).  
         7. If a clue is revealed, weave it in *naturally with flavor*, not as a raw fact dump.
 
         **NOTE: Whenver mentioned this is the staring prompt of the conversation, then just introduce yourself if familarity:Unknown or talk about the recent thing that you discoverd with that villager from the knowledges-summary**
@@ -217,13 +543,42 @@ class GeminiAPI:
            - Always include 1–3 realistic `player_responses` (e.g., "Ask Old Mara by the river.", "Search the Ossified Grove.", "Goodbye.").
            - Ensure any suggested action is actionable within the game (name a villager or a specific place/thing).
            - If you suggest a search, indicate *what to look for* (e.g., "check under the millstones for footprints").
-    
+
+        Respond ONLY with the raw JSON object.
+        """
+
+    def _create_interaction_prompt(self, context):
+        conversational_status = context.get('conversational_status')
+        context_node = context.get('context_node')
+        villager_profile = context['villagerProfile']
+        turn_objective = ""
+        
+        json_task_instruction = "Generate a JSON object with: npc_dialogue (string), player_responses (list of 1–3 options), node_revealed_id (string or null), new_familiarity_level (0–5)."
+
+        if conversational_status == "PERMANENTLY_EXHAUSTED":
+            turn_objective = "You can no longer provide new clues. Deliver a final, reflective farewell."
+            json_task_instruction = "Generate a JSON object with: npc_dialogue (string), player_responses (EXACTLY ONE polite closing option), node_revealed_id (null), new_familiarity_level (0–5)."
+        elif conversational_status == "HAS_LOCKED_CLUES":
+            turn_objective = "You cannot yet reveal a clue. Hint gently why (trust, timing, secrecy) and end politely."
+            json_task_instruction = "Generate a JSON object with: npc_dialogue (string), player_responses (EXACTLY ONE polite closing option), node_revealed_id (null), new_familiarity_level (0–5)."
+        elif conversational_status == "CAN_REVEAL":
+            turn_objective = "MANDATORY: Reveal the current clue NOW. Integrate the content naturally into your dialogue, and set node_revealed_id. This is not optional."
+
+        instructions = self._compiled(
+            ("Interaction", json.dumps(villager_profile) if self.caches_instructions else villager_profile['name']),
+            lambda: self._interaction_instructions(villager_profile)
+        )
+        return instructions, f"""
+        --- THE PLAYER ---
+        - Familiarity level: {context['familiarity_level']} ({context['familiarity_description']}).
+        - What the player already knows: `{context['player_knowledge_summary']}`
 
         --- BACKGROUND KNOWLEDGE ---
         Current clue node (if any): {json.dumps(context_node)}
 
         --- CONVERSATION HISTORY ---
-        {json.dumps(context['chatHistory'], indent=2)}
+        Summary of your earlier conversations with the player: {context.get('chatSummary') or "None."}
+        Most recent exchanges: {json.dumps(context['chatHistory'])}
 
         --- THIS TURN ---
         - Objective: {turn_objective}  
@@ -234,3 +589,71 @@ class GeminiAPI:
 
         Respond ONLY with the raw JSON object.
         """
+
+    # ================= MEMORY ================= #
+    def _create_memory_summary_prompt(self, context):
+        return f"""
+        You maintain the memory of {context['villager_name']}, a villager in the game "Village of Echoes", about their conversations with the player.
+
+        **Current memory summary:** {context.get('previous_summary') or "(none yet)"}
+
+        **New exchanges to fold into the summary:**
+        {json.dumps(context['messages'])}
+
+        **Your Task:**
+        Write an updated summary of at most {context['max_words']} words, written from {context['villager_name']}'s point of view.
+        - Keep what the player asked about, what {context['villager_name']} revealed or promised, the player's attitude, and any names or places mentioned.
+        - Drop greetings and small talk. Never invent events that are not in the exchanges.
+
+        Output ONLY a raw JSON object with a single key "summary".
+        """
+
+    def _create_field_completion_prompt(self, context):
+        """The original prompt again, asking only for the fields its response was missing."""
+        system_instruction, prompt = self._build_prompt(context['prompt_type'], context['context'])
+        return system_instruction, prompt + f"""
+
+        **Your previous response to this was cut off or incomplete. This is what was received:**
+        {json.dumps(context['partial'])}
+
+        Output ONLY a raw JSON object with exactly these keys, consistent with the response above: {json.dumps(context['missing'])}.
+        """
+
+class _BridgeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class _BridgeModel:
+    """Stands in for a Gemini model, sending the whole prompt to the 0G Compute bridge."""
+
+    def __init__(self, bridge_url, system_instruction):
+        self.bridge_url = bridge_url
+        self.system_instruction = system_instruction
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        if self.system_instruction:
+            prompt = f"{self.system_instruction}\n\n{prompt}"
+        response = requests.post(self.bridge_url, json={"prompt": prompt}, timeout=90)
+        response.raise_for_status()
+        result = _BridgeResponse(response.json().get("narrative", "{}"))
+        # The bridge doesn't stream; the whole response arrives as a single chunk.
+        return [result] if stream else result
+
+class ZeroGravityBridgeAPI(GeminiAPI):
+    """
+    The same prompts as GeminiAPI, served by the 0G Compute bridge of the
+    decentralized server (POST {"prompt"} -> {"narrative"}). The bridge has no
+    system instructions, so the static and dynamic parts are sent as one prompt.
+    """
+
+    backend_name = "0G Compute"
+    caches_instructions = False
+
+    def __init__(self, bridge_url=OG_BRIDGE_URL, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.bridge_url = bridge_url
+        self.model = _BridgeModel(bridge_url, None)
+        self._setup_runtime(max_concurrency, "og-bridge")
+        print(f"✅ 0G Compute bridge configured at {bridge_url}.")
+
+    def _model_for(self, system_instruction):
+        return _BridgeModel(self.bridge_url, system_instruction)
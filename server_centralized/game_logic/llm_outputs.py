@@ -0,0 +1,204 @@
+# game_logic/llm_outputs.py
+# Typed models for LLM outputs, lenient JSON repair, and re-requesting only the fields a response is missing.
+
+import asyncio
+import json
+import re
+from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+
+# --- OUTPUT MODELS ---
+
+class StoryIdea(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    story_theme: str
+    inaccessible_locations: List[str]
+    correct_location: str
+
+class QuestNode(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    node_id: str
+    villager_name: str
+    content: str
+    type: str = "Information"
+    priority: int = 0
+    key_clue: bool = False
+    preconditions: List[str] = []
+    required_familiarity: Optional[int] = None
+
+class QuestNetwork(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    nodes: List[QuestNode]
+
+    @field_validator("nodes", mode="before")
+    @classmethod
+    def _drop_broken_nodes(cls, nodes):
+        # A node cut off mid-way is dropped rather than failing the whole network.
+        if not isinstance(nodes, list):
+            return nodes
+        valid = []
+        for node in nodes:
+            try:
+                valid.append(QuestNode.model_validate(node))
+            except ValidationError:
+                continue
+        return valid
+
+class DialogueTurn(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    npc_dialogue: str
+    player_responses: List[str]
+    node_revealed_id: Optional[str] = None
+    new_familiarity_level: Optional[int] = None
+
+OUTPUT_MODELS = {
+    "StoryGenerator": StoryIdea,
+    "WorldBuilder": QuestNetwork,
+    "Interaction": DialogueTurn,
+}
+
+# --- JSON REPAIR ---
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_CLOSERS = {"{": "}", "[": "]"}
+# Complete-element boundaries tried, latest first, when a truncated response is closed.
+MAX_REPAIR_CUTS = 8
+
+def repair_json(text: str):
+    """
+    Parses a JSON object from an LLM response, repairing it where possible.
+    Returns (data, repaired), or (None, False) if nothing could be recovered.
+
+    Code fences, text around the object and trailing commas are removed. A
+    response cut off mid-way is cut back to its last complete element and
+    its open lists/objects are closed.
+    """
+    text = (text or "").strip()
+    try:
+        data = json.loads(text)
+        return (data, False) if isinstance(data, dict) else (None, False)
+    except json.JSONDecodeError:
+        pass
+
+    start = text.find("{")
+    if start < 0:
+        return None, False
+    text = _TRAILING_COMMA.sub(r"\1", text[start:])
+
+    stack, cuts, in_string, escaped, end = [], [], False, False, None
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(char)
+            cuts.append((index + 1, "".join(_CLOSERS[opener] for opener in reversed(stack))))
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                end = index + 1
+                break
+        elif char == ",":
+            cuts.append((index, "".join(_CLOSERS[opener] for opener in reversed(stack))))
+
+    if end is not None:
+        candidates = [text[:end]]
+    else:
+        # A string cut off mid-way is dropped, not closed, so no half sentence is kept.
+        candidates = [] if in_string else [text + "".join(_CLOSERS[opener] for opener in reversed(stack))]
+        candidates += [text[:cut] + closing for cut, closing in reversed(cuts[-MAX_REPAIR_CUTS:])]
+
+    for candidate in candidates:
+        try:
+            data = json.loads(_TRAILING_COMMA.sub(r"\1", candidate))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data, True
+    return None, False
+
+def validate_output(prompt_type: str, data: dict):
+    """
+    Returns (validated, missing): the output as a plain dict with defaults
+    filled in, or None plus the names of required fields that are absent or
+    unusable. Fields that failed validation are removed from `data`.
+    """
+    model = OUTPUT_MODELS[prompt_type]
+    try:
+        return model.model_validate(data).model_dump(), []
+    except ValidationError as e:
+        missing = sorted({str(error["loc"][0]) for error in e.errors() if error["loc"]})
+        for field in missing:
+            data.pop(field, None)
+        return None, missing
+
+# --- STRUCTURED GENERATION ---
+
+class StructuredOutputs:
+    """
+    Generates validated outputs for the prompt types in OUTPUT_MODELS.
+
+    A response is repaired and validated first. If required fields are still
+    missing, only those are re-requested with a "FieldCompletion" call that
+    shows the model its partial response; only a response with nothing usable
+    in it is regenerated in full. Both kinds of retry share a budget of
+    `max_retries`, each after an exponential backoff starting at `backoff`
+    seconds. If the budget runs out, ValueError is raised.
+    """
+
+    def __init__(self, llm_api, max_retries: int, backoff: float):
+        self.llm_api = llm_api
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.stats = {
+            "clean": 0, "repaired": 0, "field_completions": 0, "completed": 0,
+            "full_regenerations": 0, "failures": 0,
+        }
+
+    async def generate(self, prompt_type: str, context: dict) -> dict:
+        text = await self.llm_api.generate_content_async(prompt_type, context)
+        return await self.complete(prompt_type, context, text)
+
+    async def complete(self, prompt_type: str, context: dict, text: str) -> dict:
+        """Validates a raw response, re-requesting what it lacks."""
+        data, repaired = repair_json(text)
+        data = data or {}
+        validated, missing = validate_output(prompt_type, data)
+        if validated is not None:
+            self.stats["repaired" if repaired else "clean"] += 1
+            return validated
+
+        for attempt in range(self.max_retries):
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+            if not data:
+                print(f"--- WARNING: {prompt_type} response was unusable, regenerating it in full. ---")
+                self.stats["full_regenerations"] += 1
+                data, _ = repair_json(await self.llm_api.generate_content_async(prompt_type, context))
+                data = data or {}
+            else:
+                print(f"--- WARNING: {prompt_type} response is missing {missing}, re-requesting only those fields. ---")
+                self.stats["field_completions"] += 1
+                fields, _ = repair_json(await self.llm_api.generate_content_async("FieldCompletion", {
+                    "prompt_type": prompt_type,
+                    "context": context,
+                    "partial": data,
+                    "missing": missing,
+                }))
+                data.update({key: value for key, value in (fields or {}).items() if key in missing})
+            validated, missing = validate_output(prompt_type, data)
+            if validated is not None:
+                self.stats["completed"] += 1
+                return validated
+
+        self.stats["failures"] += 1
+        raise ValueError(f"{prompt_type} response is missing {missing} after {self.max_retries} retries.")
+
+    def health(self) -> dict:
+        return dict(self.stats)
@@ -0,0 +1,100 @@
+# game_logic/memory_manager.py
+# Keeps the per-villager chat history sent to the LLM bounded: recent turns verbatim, older turns summarized.
+
+import asyncio
+import json
+from .llm_calls import estimate_tokens
+
+class ConversationMemory:
+    """
+    Builds the chat history section of Interaction prompts.
+
+    The full dialogue stays in the player's npc memory; prompts only see a
+    rolling summary plus the exchanges it doesn't cover yet (normally the last
+    `recent_turns`), trimmed oldest-first to the prompt's token budget.
+    Summaries live in player_state["npc_summaries"][villager] as
+    {"summary": str, "folded": int}, where `folded` is how many memory entries
+    the summary already covers. Folding runs as a background LLM call after a
+    turn, so it never adds latency to the turn itself.
+    """
+
+    def __init__(self, llm_api, recent_turns: int, prompt_token_budget: int, summary_max_words: int):
+        self.llm_api = llm_api
+        self.recent_messages = recent_turns * 2
+        self.prompt_token_budget = prompt_token_budget
+        self.summary_max_words = summary_max_words
+        self._folding = set()
+        self._tasks = set()
+
+    def build_history(self, player_state: dict, memory: list, npc_name: str, token_budget: int):
+        """Returns (summary, recent_messages) for a prompt, trimmed to fit within token_budget."""
+        entry = player_state.get("npc_summaries", {}).get(npc_name, {})
+        summary = entry.get("summary", "")
+        # Everything the summary doesn't cover yet is a candidate, newest kept first.
+        recent = memory[entry.get("folded", 0):]
+
+        token_budget = max(token_budget, 0)
+        summary_tokens = estimate_tokens(summary)
+        if summary_tokens > token_budget // 2:
+            summary = summary[:(token_budget // 2) * 4]
+            summary_tokens = estimate_tokens(summary)
+
+        remaining = token_budget - summary_tokens
+        kept = []
+        for message in reversed(recent):
+            cost = estimate_tokens(json.dumps(message))
+            if cost > remaining:
+                break
+            kept.append(message)
+            remaining -= cost
+        kept.reverse()
+        return summary, kept
+
+    def history_budget(self, prompt_type: str, context: dict) -> int:
+        """Tokens left for chat history once the rest of the prompt is accounted for."""
+        return self.prompt_token_budget - self.llm_api.estimate_prompt_tokens(prompt_type, context)
+
+    def schedule_fold(self, player_state: dict, memory: list, npc_name: str):
+        """Folds exchanges older than the verbatim window into the villager's summary, in the background."""
+        entry = player_state.setdefault("npc_summaries", {}).setdefault(npc_name, {"summary": "", "folded": 0})
+        fold_until = len(memory) - self.recent_messages
+        # Fold in batches of at least one full exchange to keep the number of summary calls low.
+        if fold_until - entry["folded"] < 2:
+            return
+        key = (id(player_state), npc_name)
+        if key in self._folding:
+            return
+
+        self._folding.add(key)
+        task = asyncio.create_task(self._fold(entry, memory[entry["folded"]:fold_until], fold_until, npc_name, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, entry: dict, messages: list, fold_until: int, npc_name: str, key):
+        try:
+            summary_json = await self.llm_api.generate_content_async("MemorySummary", {
+                "villager_name": npc_name,
+                "previous_summary": entry["summary"],
+                "messages": messages,
+                "max_words": self.summary_max_words,
+            })
+            summary = json.loads(summary_json).get("summary")
+            if not isinstance(summary, str) or not summary:
+                raise ValueError("Summary response is missing the 'summary' field.")
+        except Exception as e:
+            # Runs as a background task, so any failure (including the router's or transport's) ends here.
+            print(f"--- WARNING: Memory summary for {npc_name} failed, keeping an extractive summary. Error: {e} ---")
+            summary = self._extractive_summary(entry["summary"], messages)
+        finally:
+            self._folding.discard(key)
+
+        entry["summary"] = summary
+        entry["folded"] = fold_until
+
+    def _extractive_summary(self, previous: str, messages: list) -> str:
+        lines = [previous] if previous else []
+        for message in messages:
+            speaker = "Player" if message.get("role") == "player" else "Me"
+            lines.append(f"{speaker}: {(message.get('content') or '')[:160]}")
+        words = " ".join(lines).split()
+        return " ".join(words[-self.summary_max_words * 2:])
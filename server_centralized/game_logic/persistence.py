@@ -0,0 +1,255 @@
+# game_logic/persistence.py
+# Durable games: compact snapshots plus an append-only per-turn log in SQLite, so a restart loses nothing.
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+from typing import Optional
+from .state_manager import GameState
+from .dialogue_log import DialogueLog
+
+# Most writes committed together in one transaction.
+MAX_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    game_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    game_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    player_key TEXT NOT NULL,
+    villager_name TEXT NOT NULL,
+    player_input TEXT NOT NULL,
+    dialogue TEXT NOT NULL,
+    delta TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (game_id, seq)
+);
+"""
+
+def turn_delta(session, npc_name: str, revealed_node_id) -> dict:
+    """What a turn changed in the player's session, enough to replay it onto the previous state."""
+    delta = {
+        "memory": session.memory[npc_name][-2:],
+        "familiarity": session.state["familiarity"].get(npc_name, 0),
+        "unproductive_turns": session.state.get("unproductive_turns", {}).get(npc_name, 0),
+        "npc_suggestions": session.state.get("npc_suggestions", {}).get(npc_name, []),
+    }
+    # The rolling summary as of this turn; a fold finishing later is picked up by the next turn's delta.
+    summary = session.state.get("npc_summaries", {}).get(npc_name)
+    if summary is not None:
+        delta["npc_summary"] = dict(summary)
+    if revealed_node_id:
+        delta["revealed_node_id"] = revealed_node_id
+        delta["knowledge_summary"] = session.state["knowledge_summary"]
+    return delta
+
+def apply_turn_delta(game_state: GameState, player_key: str, npc_name: str, delta: dict):
+    session = game_state.session(player_key)
+    session.memory.setdefault(npc_name, DialogueLog()).extend(delta["memory"])
+    session.state["familiarity"][npc_name] = delta["familiarity"]
+    session.state.setdefault("unproductive_turns", {})[npc_name] = delta.get("unproductive_turns", 0)
+    session.state.setdefault("npc_suggestions", {})[npc_name] = delta["npc_suggestions"]
+    if "npc_summary" in delta:
+        session.state.setdefault("npc_summaries", {})[npc_name] = dict(delta["npc_summary"])
+    revealed_node_id = delta.get("revealed_node_id")
+    if revealed_node_id and revealed_node_id not in session.state["discovered_nodes"]:
+        session.state["discovered_nodes"].append(revealed_node_id)
+        session.state["knowledge_summary"] = delta["knowledge_summary"]
+
+class GamePersistence:
+    """
+    Stores games in a SQLite database in WAL mode.
+
+    Every applied turn is appended to the `turns` log as its input, dialogue
+    and state delta (see turn_delta). Every `snapshot_every` turns of a game,
+    and when it is created, the whole game is written to `snapshots`, and the
+    turns the snapshot covers are dropped. Loading a game reads its snapshot
+    and replays the turns logged after it.
+
+    Callers never wait on disk: a turn is only put on a queue, and a writer
+    thread commits whatever has queued up within `commit_interval` seconds in
+    one transaction (a group commit). Snapshots are serialized by the caller,
+    as the game may change while the writer runs. Games not written to for
+    `retention` seconds are deleted.
+    """
+
+    def __init__(self, path: str, commit_interval: float, snapshot_every: int, retention: float):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        self.retention = retention
+        self._seq = {}                  # game_id -> seq of its last logged turn
+        self._turns_since_snapshot = {}
+        self._queue = queue.SimpleQueue()
+        self._reader = self._connect()
+        self._reader.executescript(_SCHEMA)
+        # load() runs in worker threads (see GameStore.aget), seq lookups on the event loop
+        self._read_lock = threading.Lock()
+        self.stats = {"turns_logged": 0, "snapshots": 0, "commits": 0, "recovered": 0, "write_failures": 0}
+        self._writer = threading.Thread(target=self._write_loop, name="game-persistence", daemon=True)
+        self._writer.start()
+        print(f"✅ Persisting games to {path}.")
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only risks the last commits on power loss, never corruption.
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _last_seq(self, game_id: str) -> int:
+        """
+        Seq of the game's last logged turn. The first time this process sees a
+        game (e.g. one loaded from the spill directory after a restart) it is
+        read from the database, so numbering carries on after the turns logged
+        before the restart instead of starting over and leaving them behind.
+        """
+        seq = self._seq.get(game_id)
+        if seq is None:
+            with self._read_lock:
+                row = self._reader.execute(
+                    "SELECT MAX(seq) FROM (SELECT seq FROM turns WHERE game_id = ? UNION ALL SELECT seq FROM snapshots WHERE game_id = ?)",
+                    (game_id, game_id),
+                ).fetchone()
+            seq = self._seq[game_id] = row[0] or 0
+        return seq
+
+    def save_snapshot(self, game_state: GameState):
+        game_id = game_state.game_id
+        data = json.dumps(game_state.to_dict())
+        self._queue.put(("snapshot", game_id, self._last_seq(game_id), data, time.time()))
+        self._turns_since_snapshot[game_id] = 0
+        self.stats["snapshots"] += 1
+
+    def log_turn(self, game_state: GameState, session, npc_name: str, player_input: str, dialogue_data: dict, revealed_node_id=None):
+        game_id = game_state.game_id
+        if game_id not in self._turns_since_snapshot:
+            # A game this process hasn't stored yet (e.g. loaded from the spill directory) has nothing
+            # to replay onto, so it is snapshotted right after this turn.
+            self._turns_since_snapshot[game_id] = self.snapshot_every
+        seq = self._seq[game_id] = self._last_seq(game_id) + 1
+        self._queue.put((
+            "turn", game_id, seq, session.player_key, npc_name, player_input,
+            dialogue_data, turn_delta(session, npc_name, revealed_node_id), time.time(),
+        ))
+        self.stats["turns_logged"] += 1
+        self._turns_since_snapshot[game_id] = self._turns_since_snapshot.get(game_id, 0) + 1
+        if self._turns_since_snapshot[game_id] >= self.snapshot_every:
+            self.save_snapshot(game_state)
+
+    def load(self, game_id: str) -> Optional[GameState]:
+        """Rebuilds a game from its snapshot and the turns logged after it, or returns None if it isn't stored."""
+        with self._read_lock:
+            row = self._reader.execute("SELECT seq, data FROM snapshots WHERE game_id = ?", (game_id,)).fetchone()
+            if row is None:
+                return None
+            seq, data = row
+            turns = self._reader.execute(
+                "SELECT seq, player_key, villager_name, delta FROM turns WHERE game_id = ? AND seq > ? ORDER BY seq",
+                (game_id, seq),
+            ).fetchall()
+        game_state = GameState.from_dict(json.loads(data))
+        for seq, player_key, npc_name, delta in turns:
+            apply_turn_delta(game_state, player_key, npc_name, json.loads(delta))
+        self._seq[game_id] = max(self._seq.get(game_id, 0), seq)
+        self._turns_since_snapshot[game_id] = len(turns)
+        self.stats["recovered"] += 1
+        print(f"--- Recovered game {game_id} from its snapshot and {len(turns)} logged turns. ---")
+        return game_state
+
+    def delete(self, game_id: str):
+        self._queue.put(("delete", game_id))
+        self._seq.pop(game_id, None)
+        self._turns_since_snapshot.pop(game_id, None)
+
+    def health(self) -> dict:
+        return {"path": self.path, "queued": self._queue.qsize(), **self.stats}
+
+    def close(self):
+        """Commits everything queued and stops the writer."""
+        self._queue.put(None)
+        self._writer.join()
+        self._reader.close()
+
+    def _write_loop(self):
+        connection = self._connect()
+        last_purge = time.monotonic()
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.commit_interval
+            while len(batch) < MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [item for item in batch if item is not None]
+                # Take whatever was queued after the sentinel as well.
+                while not self._queue.empty():
+                    item = self._queue.get()
+                    if item is not None:
+                        batch.append(item)
+            self._commit(connection, batch)
+
+            if time.monotonic() - last_purge > min(self.retention, 3600):
+                last_purge = time.monotonic()
+                self._purge(connection)
+        connection.close()
+
+    def _commit(self, connection, batch):
+        if not batch:
+            return
+        try:
+            connection.execute("BEGIN")
+            for item in batch:
+                if item[0] == "turn":
+                    _, game_id, seq, player_key, npc_name, player_input, dialogue_data, delta, created_at = item
+                    connection.execute(
+                        "INSERT OR REPLACE INTO turns VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (game_id, seq, player_key, npc_name, player_input, json.dumps(dialogue_data), json.dumps(delta), created_at),
+                    )
+                elif item[0] == "snapshot":
+                    _, game_id, seq, data, updated_at = item
+                    connection.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)", (game_id, seq, data, updated_at))
+                    connection.execute("DELETE FROM turns WHERE game_id = ? AND seq <= ?", (game_id, seq))
+                elif item[0] == "delete":
+                    connection.execute("DELETE FROM snapshots WHERE game_id = ?", (item[1],))
+                    connection.execute("DELETE FROM turns WHERE game_id = ?", (item[1],))
+            connection.execute("COMMIT")
+            self.stats["commits"] += 1
+        except sqlite3.Error as e:
+            print(f"--- WARNING: Failed to persist {len(batch)} game writes. Error: {e} ---")
+            self.stats["write_failures"] += 1
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+
+    def _purge(self, connection):
+        cutoff = time.time() - self.retention
+        try:
+            connection.execute("BEGIN")
+            connection.execute(
+                "DELETE FROM turns WHERE game_id IN (SELECT game_id FROM snapshots WHERE updated_at < ?) "
+                "AND game_id NOT IN (SELECT game_id FROM turns WHERE created_at >= ?)",
+                (cutoff, cutoff),
+            )
+            connection.execute(
+                "DELETE FROM snapshots WHERE updated_at < ? AND game_id NOT IN (SELECT game_id FROM turns)",
+                (cutoff,),
+            )
+            connection.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"--- WARNING: Failed to purge old games. Error: {e} ---")
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
@@ -0,0 +1,154 @@
+# game_logic/quest_index.py
+# A quest network compiled once per world, so clue status is a lookup rather than a scan of every node.
+
+import bisect
+
+def _mentions_friends(message: dict) -> bool:
+    return bool(message.get("content")) and "friend" in message["content"].lower()
+
+class PlayerProgress:
+    """
+    One player's progress through a QuestIndex, kept up to date a turn at a
+    time: the discovered node ids as a set, how many preconditions each node
+    still lacks, how many nodes each villager has left, the discovered nodes'
+    content in network order (the knowledge summary's segments), how many key
+    clues were found, and how many of each villager's messages mention
+    friends. Mirrors player_state["discovered_nodes"] and the player's npc
+    memory, which stay the persisted record.
+    """
+
+    def __init__(self, index: "QuestIndex", player_state: dict):
+        self.player_state = player_state
+        self.discovered = set()
+        self.unmet = dict(index.precondition_counts)
+        self.remaining = {npc_name: len({node["node_id"] for node in nodes}) for npc_name, nodes in index.by_villager.items()}
+        self.summary_positions = []
+        self.key_clues_found = 0
+        self.friend_mentions = {}
+        self.memory_synced = {}
+        self.synced = 0
+        self.sync(index)
+
+    def sync(self, index: "QuestIndex"):
+        """Catches up with node ids appended to discovered_nodes since the last call."""
+        discovered_nodes = self.player_state["discovered_nodes"]
+        for node_id in discovered_nodes[self.synced:]:
+            self.reveal(index, node_id)
+        self.synced = len(discovered_nodes)
+
+    def reveal(self, index: "QuestIndex", node_id: str):
+        if node_id in self.discovered:
+            return
+        self.discovered.add(node_id)
+        node = index.nodes_by_id.get(node_id)
+        if node is not None:
+            self.remaining[node["villager_name"]] -= 1
+        for dependent in index.dependents.get(node_id, ()):
+            self.unmet[dependent] -= 1
+        for position in index.positions.get(node_id, ()):
+            bisect.insort(self.summary_positions, position)
+        if node_id in index.key_clues:
+            self.key_clues_found += 1
+
+    def summary_segments(self, index: "QuestIndex") -> list:
+        return [index.nodes[position]["content"] for position in self.summary_positions]
+
+    def friends_mentioned(self, npc_name: str, memory: list) -> int:
+        """How many of the villager's messages mention friends, counting only messages added since the last call."""
+        synced = self.memory_synced.get(npc_name, 0)
+        if synced > len(memory):
+            # The memory was replaced, e.g. by a restored game; count it again.
+            synced = self.friend_mentions[npc_name] = 0
+        self.friend_mentions[npc_name] = self.friend_mentions.get(npc_name, 0) + sum(
+            1 for message in memory[synced:] if _mentions_friends(message)
+        )
+        self.memory_synced[npc_name] = len(memory)
+        return self.friend_mentions[npc_name]
+
+class QuestIndex:
+    """
+    Lookup tables for one quest network: each villager's nodes in priority
+    order, the nodes that depend on each node, and how many distinct
+    preconditions each node has.
+
+    Per-player PlayerProgress is kept here too, keyed by the player_state dict
+    (which the index holds on to, so the key can't be reused). Revealing a node
+    only touches the nodes that depend on it, and a clue status check only
+    looks at the villager's own nodes.
+    """
+
+    def __init__(self, quest_network: dict):
+        self.quest_network = quest_network
+        self.nodes = quest_network.get("nodes", [])
+        self.nodes_by_id = {}
+        self.by_villager = {}
+        self.dependents = {}
+        self.precondition_counts = {}
+        self.positions = {}
+        self.key_clues = set()
+        for position, node in enumerate(self.nodes):
+            self.nodes_by_id.setdefault(node["node_id"], node)
+            self.positions.setdefault(node["node_id"], []).append(position)
+            self.by_villager.setdefault(node["villager_name"], []).append(node)
+            preconditions = set(node.get("preconditions", []))
+            self.precondition_counts[node["node_id"]] = len(preconditions)
+            for precondition in preconditions:
+                self.dependents.setdefault(precondition, []).append(node["node_id"])
+            if node.get("key_clue"):
+                self.key_clues.add(node["node_id"])
+        for nodes in self.by_villager.values():
+            # Stable, so equal priorities keep their network order, as sorted(..., reverse=True) did.
+            nodes.sort(key=lambda node: node.get("priority", 0), reverse=True)
+        self._progress = {}
+
+    def progress(self, player_state: dict) -> PlayerProgress:
+        progress = self._progress.get(id(player_state))
+        if progress is None or progress.player_state is not player_state:
+            progress = self._progress[id(player_state)] = PlayerProgress(self, player_state)
+        elif progress.synced != len(player_state["discovered_nodes"]):
+            progress.sync(self)
+        return progress
+
+    def clue_status(self, player_state: dict, npc_name: str):
+        """Returns (status, node) exactly as a scan of the whole network would."""
+        progress = self.progress(player_state)
+        if not progress.remaining.get(npc_name):
+            return "PERMANENTLY_EXHAUSTED", None
+
+        familiarity = player_state["familiarity"].get(npc_name, 0)
+        first_locked = None
+        for node in self.by_villager[npc_name]:
+            if node["node_id"] in progress.discovered:
+                continue
+            required_familiarity = node.get("required_familiarity")
+            if progress.unmet[node["node_id"]] == 0 and (required_familiarity is None or familiarity >= required_familiarity):
+                return "CAN_REVEAL", node
+            if first_locked is None:
+                first_locked = node
+        if first_locked is None:
+            return "PERMANENTLY_EXHAUSTED", None
+        return "HAS_LOCKED_CLUES", first_locked
+
+    def reveal(self, player_state: dict, node_id: str) -> bool:
+        """Records a discovered node in player_state and the index; returns False if it was already known."""
+        progress = self.progress(player_state)
+        if node_id in progress.discovered:
+            return False
+        player_state["discovered_nodes"].append(node_id)
+        progress.reveal(self, node_id)
+        progress.synced += 1
+        return True
+
+    def discovered_content(self, player_state: dict) -> list:
+        """The content of every discovered node, in network order."""
+        return self.progress(player_state).summary_segments(self)
+
+    def found_all_key_clues(self, player_state: dict) -> bool:
+        return self.progress(player_state).key_clues_found == len(self.key_clues)
+
+def quest_index(game_state) -> QuestIndex:
+    """Returns the game's QuestIndex, compiling it the first time, or again if its quest network was replaced."""
+    index = game_state.quest_index
+    if index is None or index.quest_network is not game_state.quest_network:
+        index = game_state.quest_index = QuestIndex(game_state.quest_network)
+    return index
@@ -0,0 +1,140 @@
+# game_logic/response_cache.py
+# Reuses Interaction responses for near-identical player inputs in the same clue state.
+
+import copy
+import random
+import re
+import zlib
+from collections import OrderedDict
+
+NUM_PERMUTATIONS = 32
+SHINGLE_SIZE = 3
+# Entries kept per clue state; a lookup compares the input against each of them.
+MAX_VARIANTS_PER_STATE = 8
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Words that carry no meaning for matching, e.g. "hey, where are my friends" ~ "where r my friends".
+# Question words stay: "where were my friends taken?" and "why were my friends taken?" differ.
+STOPWORDS = frozenset(
+    "a about an and any anything are be can could did do does have has hey i is it me my "
+    "of on please r see tell the there to u was were you your".split()
+)
+
+# Inputs asking different questions never share a response, however similar the rest of them is.
+QUESTION_WORDS = frozenset("how what when where which who whom whose why".split())
+
+_rng = random.Random(1729)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+def normalize_input(text: str) -> str:
+    words = re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).split()
+    meaningful = [word for word in words if word not in STOPWORDS]
+    return " ".join(meaningful or words)
+
+def question_words(normalized: str) -> frozenset:
+    return QUESTION_WORDS.intersection(normalized.split())
+
+def minhash(text: str) -> tuple:
+    """MinHash signature of the character shingles of a normalized input."""
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = [zlib.crc32(shingle.encode()) for shingle in shingles]
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+def similarity(signature_a: tuple, signature_b: tuple) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / NUM_PERMUTATIONS
+
+class ResponseCache:
+    """
+    A bounded LRU cache of Interaction responses.
+
+    Responses are grouped by clue state: (game, villager, clue status, context
+    node, familiarity). Within a state, a player input matches a cached one when
+    their normalized forms are equal, or their MinHash signatures are at least
+    `threshold` similar and they ask with the same question words, so "where
+    are my friends?" and "hey, where r my friends" share one response but
+    "why were my friends taken?" and "where were my friends taken?" don't. A hit returns a copy of the stored dialogue
+    data, which the engine applies to the player's state exactly like a fresh
+    LLM response.
+    """
+
+    def __init__(self, max_entries: int, threshold: float):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._states = OrderedDict()  # state key -> list of (normalized, signature, dialogue_data)
+        self._game_keys = {}          # game_id -> set of state keys
+        self._size = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def state_key(self, game_state, session, npc_name: str, clue_status: str, context_node) -> tuple:
+        familiarity = session.state["familiarity"].get(npc_name, 0)
+        node_id = context_node["node_id"] if context_node else None
+        return (game_state.game_id, npc_name, clue_status, node_id, familiarity)
+
+    def get(self, state_key: tuple, player_input: str):
+        variants = self._states.get(state_key)
+        if variants:
+            normalized = normalize_input(player_input)
+            signature, questions = minhash(normalized), question_words(normalized)
+            for cached_input, cached_signature, dialogue_data in variants:
+                if cached_input == normalized or (
+                    similarity(signature, cached_signature) >= self.threshold and question_words(cached_input) == questions
+                ):
+                    self._states.move_to_end(state_key)
+                    self.stats["hits"] += 1
+                    return copy.deepcopy(dialogue_data)
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, state_key: tuple, player_input: str, dialogue_data: dict):
+        normalized = normalize_input(player_input)
+        variants = self._states.setdefault(state_key, [])
+        self._states.move_to_end(state_key)
+        self._game_keys.setdefault(state_key[0], set()).add(state_key)
+        if any(cached_input == normalized for cached_input, _, _ in variants):
+            return
+        if len(variants) >= MAX_VARIANTS_PER_STATE:
+            variants.pop(0)
+            self._size -= 1
+        variants.append((normalized, minhash(normalized), copy.deepcopy(dialogue_data)))
+        self._size += 1
+        self.stats["stores"] += 1
+
+        while self._size > self.max_entries:
+            evicted_key, evicted = self._states.popitem(last=False)
+            self._size -= len(evicted)
+            self.stats["evictions"] += len(evicted)
+            self._forget_key(evicted_key)
+
+    def invalidate_game(self, game_id: str):
+        """Drops every cached response of a game, e.g. once it has ended."""
+        for state_key in self._game_keys.pop(game_id, ()):
+            self._size -= len(self._states.pop(state_key, ()))
+        self.stats["invalidations"] += 1
+
+    def health(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+            **self.stats,
+        }
+
+    def _forget_key(self, state_key: tuple):
+        keys = self._game_keys.get(state_key[0])
+        if keys is not None:
+            keys.discard(state_key)
+            if not keys:
+                del self._game_keys[state_key[0]]
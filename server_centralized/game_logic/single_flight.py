@@ -0,0 +1,78 @@
+# game_logic/single_flight.py
+# Collapses concurrent duplicate requests into one execution whose result they all share.
+
+import asyncio
+
+class SingleFlight:
+    """
+    At most one execution per key at a time.
+
+    The first caller for a key leads: its work runs as a shielded task, so a
+    caller that disconnects doesn't cancel it for the others. Callers that
+    arrive while it is running join it and get the same result or exception.
+    Once it finishes the key is released, and a later call runs again.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._tasks = set()
+        self.stats = {"executions": 0, "coalesced": 0}
+
+    async def run(self, key, factory):
+        """Runs factory() for this key, or joins the execution already in flight."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self.lead(key)
+            task = asyncio.ensure_future(factory())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            task.add_done_callback(lambda done: _settle(flight, done))
+        else:
+            self.stats["coalesced"] += 1
+        return await self.wait(flight)
+
+    @staticmethod
+    async def wait(flight: asyncio.Future):
+        """Awaits a flight without letting this caller's cancellation cancel it for the others."""
+        try:
+            return await asyncio.shield(flight)
+        except asyncio.CancelledError:
+            if flight.cancelled():
+                # The leader went away (e.g. its client disconnected mid-stream); this caller didn't.
+                raise RuntimeError("The identical request this one joined was cancelled.")
+            raise
+
+    def join(self, key):
+        """Returns the in-flight future for this key, counting the caller as coalesced, or None."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.stats["coalesced"] += 1
+        return flight
+
+    def lead(self, key) -> asyncio.Future:
+        """Registers the caller as the leader for this key; it must resolve or cancel the returned future."""
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        self.stats["executions"] += 1
+        flight.add_done_callback(lambda done: self._release(key, done))
+        return flight
+
+    def health(self) -> dict:
+        return {"in_flight": len(self._flights), **self.stats}
+
+    def _release(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Nobody may have joined; mark the exception as retrieved so it isn't logged as lost.
+        if not flight.cancelled():
+            flight.exception()
+
+def _settle(flight: asyncio.Future, task: asyncio.Future):
+    if flight.done():
+        return
+    if task.cancelled():
+        flight.cancel()
+    elif task.exception() is not None:
+        flight.set_exception(task.exception())
+    else:
+        flight.set_result(task.result())
@@ -0,0 +1,250 @@
+# game_logic/snapshot.py
+# A versioned binary format for whole games, for moving them between processes (export/import, draining a node).
+
+import struct
+from config import VILLAGER_ROSTER
+from .dialogue_log import DialogueLog, intern_text
+from .state_manager import GameState, PlayerSession, QuestNode, _MISSING
+
+MAGIC = b"TWGS"
+SNAPSHOT_VERSION = 1
+MEDIA_TYPE = "application/x-towns-game"
+
+# Value tags
+_NIL, _FALSE, _TRUE, _INT, _FLOAT, _STR, _LIST, _DICT, _ABSENT, _ROSTER, _STR_LIST = range(11)
+
+_HEADER = struct.Struct("<4sBI")  # magic, version, body length
+_U32 = struct.Struct("<I")
+_TAGGED_U32 = struct.Struct("<BI")
+_INT64 = struct.Struct("<Bq")
+_FLOAT64 = struct.Struct("<Bd")
+
+class _Writer:
+    """Appends values to a bytearray; every string is written once, to a table after the body, and referenced by index."""
+
+    def __init__(self, out: bytes = b"", strings: dict = None):
+        self.out = bytearray(out)
+        self.strings = dict(strings or {})
+
+    def string(self, text: str) -> int:
+        strings = self.strings
+        return strings.setdefault(text, len(strings))
+
+    def u32(self, number: int):
+        self.out += _U32.pack(number)
+
+    def blob(self, data: bytes):
+        self.out += _U32.pack(len(data))
+        self.out += data
+
+    def value(self, value):
+        out = self.out
+        if value is None:
+            out.append(_NIL)
+        elif value is True:
+            out.append(_TRUE)
+        elif value is False:
+            out.append(_FALSE)
+        elif isinstance(value, str):
+            strings = self.strings
+            out += _TAGGED_U32.pack(_STR, strings.setdefault(value, len(strings)))
+        elif isinstance(value, int):
+            out += _INT64.pack(_INT, value)
+        elif isinstance(value, float):
+            out += _FLOAT64.pack(_FLOAT, value)
+        elif isinstance(value, (list, tuple)):
+            if value and type(value[0]) is str and all(type(item) is str for item in value):
+                # Lists of strings (dialogue texts, node ids, preconditions) are written as one run of indices.
+                strings = self.strings
+                out += _TAGGED_U32.pack(_STR_LIST, len(value))
+                out += struct.pack(f"<{len(value)}I", *[strings.setdefault(item, len(strings)) for item in value])
+            else:
+                out += _TAGGED_U32.pack(_LIST, len(value))
+                for item in value:
+                    self.value(item)
+        elif isinstance(value, dict):
+            strings = self.strings
+            out += _TAGGED_U32.pack(_DICT, len(value))
+            for key, item in value.items():
+                if type(key) is not str:
+                    key = str(key)
+                out += _U32.pack(strings.setdefault(key, len(strings)))
+                if type(item) is int:
+                    out += _INT64.pack(_INT, item)
+                else:
+                    self.value(item)
+        elif value is _MISSING:
+            out.append(_ABSENT)
+        else:
+            raise TypeError(f"Can't snapshot a {type(value).__name__}.")
+
+    def finish(self) -> bytes:
+        # String table: count, every string's byte length, then the strings back to back.
+        encoded = [text.encode("utf-8", "surrogatepass") for text in self.strings]
+        return b"".join((
+            _HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(self.out)), self.out,
+            _U32.pack(len(encoded)), struct.pack(f"<{len(encoded)}I", *map(len, encoded)), *encoded,
+        ))
+
+class _Reader:
+    def __init__(self, data: bytes):
+        magic, version, body_length = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a game snapshot.")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version} (this server reads version {SNAPSHOT_VERSION}).")
+        self.data = memoryview(data)
+        self.pos = _HEADER.size
+        self.end = _HEADER.size + body_length
+        count, = _U32.unpack_from(data, self.end)
+        lengths = struct.unpack_from(f"<{count}I", data, self.end + 4)
+        table_pos = self.end + 4 + 4 * count
+        if table_pos + sum(lengths) != len(data):
+            raise ValueError("Snapshot string table doesn't match its length.")
+        self.strings = []
+        for length in lengths:
+            self.strings.append(intern_text(str(self.data[table_pos:table_pos + length], "utf-8", "surrogatepass")))
+            table_pos += length
+
+    def u32(self) -> int:
+        number, = _U32.unpack_from(self.data, self.pos)
+        self.pos += 4
+        return number
+
+    def string(self) -> str:
+        return self.strings[self.u32()]
+
+    def blob(self) -> bytes:
+        length = self.u32()
+        if self.pos + length > self.end:
+            raise ValueError("Truncated snapshot.")
+        data = bytes(self.data[self.pos:self.pos + length])
+        self.pos += length
+        return data
+
+    def value(self):
+        tag = self.data[self.pos]
+        self.pos += 1
+        if tag == _STR:
+            return self.string()
+        if tag == _NIL:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        if tag == _INT:
+            number, = struct.unpack_from("<q", self.data, self.pos)
+            self.pos += 8
+            return number
+        if tag == _FLOAT:
+            number, = struct.unpack_from("<d", self.data, self.pos)
+            self.pos += 8
+            return number
+        if tag == _STR_LIST:
+            count = self.u32()
+            strings = self.strings
+            indices = struct.unpack_from(f"<{count}I", self.data, self.pos)
+            self.pos += 4 * count
+            return [strings[index] for index in indices]
+        if tag == _LIST:
+            return [self.value() for _ in range(self.u32())]
+        if tag == _DICT:
+            return {self.string(): self.value() for _ in range(self.u32())}
+        if tag == _ABSENT:
+            return _MISSING
+        if tag == _ROSTER:
+            return VILLAGER_ROSTER
+        raise ValueError(f"Unknown value tag {tag} in snapshot.")
+
+def dump_game(game_state: GameState, rooms: list = ()) -> bytes:
+    """
+    Encodes a game and the multiplayer rooms playing it. Quest nodes are
+    written field by field and dialogue logs as stored (old messages stay
+    compressed); the stock villager roster is written as a marker.
+    """
+    # The shared world doesn't change once a game has started, so its encoding is kept on the game and
+    # reused until one of its attributes is reassigned.
+    world = tuple(getattr(game_state, field) for field in GameState._FIELDS)
+    cached = game_state.world_snapshot
+    if cached is None or len(cached[0]) != len(world) or any(a is not b for a, b in zip(cached[0], world)):
+        cached = game_state.world_snapshot = (world, *_dump_world(game_state))
+    writer = _Writer(cached[1], cached[2])
+
+    writer.u32(len(game_state.sessions))
+    for player_key, session in game_state.sessions.items():
+        writer.u32(writer.string(player_key))
+        writer.value(session.state)
+        writer.u32(len(session.memory))
+        for npc_name, log in session.memory.items():
+            roles, cold, texts, block_size = log.parts()
+            writer.u32(writer.string(npc_name))
+            writer.blob(roles)
+            writer.u32(block_size)
+            writer.u32(len(cold))
+            for block in cold:
+                writer.blob(block)
+            writer.value(texts)
+
+    writer.value(list(rooms))
+    return writer.finish()
+
+def _dump_world(game_state: GameState) -> tuple:
+    writer = _Writer()
+    world = {field: getattr(game_state, field) for field in GameState._FIELDS if field not in ("quest_network", "villagers")}
+    writer.value(world)
+    if game_state.villagers is VILLAGER_ROSTER:
+        writer.out.append(_ROSTER)
+    else:
+        writer.value(game_state.villagers)
+
+    quest_network = game_state.quest_network
+    writer.value({key: value for key, value in quest_network.items() if key != "nodes"})
+    nodes = quest_network.get("nodes", [])
+    writer.u32(len(nodes))
+    for node in nodes:
+        for field in QuestNode.FIELDS:
+            writer.value(getattr(node, field))
+        writer.value(node.extra)
+    return bytes(writer.out), writer.strings
+
+def load_game(data: bytes):
+    """Decodes dump_game output into (GameState, rooms); raises ValueError if it isn't a valid snapshot."""
+    try:
+        reader = _Reader(data)
+        world = reader.value()
+        game_state = GameState(world["game_id"], world["difficulty"])
+        for field, value in world.items():
+            if field in GameState._FIELDS:
+                setattr(game_state, field, value)
+        game_state.villagers = reader.value()
+
+        quest_network = reader.value()
+        nodes = []
+        for _ in range(reader.u32()):
+            node = QuestNode.__new__(QuestNode)
+            for field in QuestNode.FIELDS:
+                setattr(node, field, reader.value())
+            node.extra = reader.value()
+            nodes.append(node)
+        quest_network["nodes"] = nodes
+        game_state.quest_network = quest_network
+
+        for _ in range(reader.u32()):
+            player_key = reader.string()
+            state = reader.value()
+            memory = {}
+            for _ in range(reader.u32()):
+                npc_name = reader.string()
+                roles = reader.blob()
+                block_size = reader.u32()
+                cold = [reader.blob() for _ in range(reader.u32())]
+                memory[npc_name] = DialogueLog.from_parts(roles, cold, reader.value(), block_size)
+            game_state.sessions[player_key] = PlayerSession(player_key, state, memory)
+
+        rooms = reader.value()
+        if reader.pos != reader.end:
+            raise ValueError("Snapshot has trailing data.")
+        return game_state, rooms
+    except (struct.error, IndexError, KeyError, TypeError, UnicodeDecodeError, RecursionError) as e:
+        raise ValueError(f"Corrupt game snapshot: {e}") from e
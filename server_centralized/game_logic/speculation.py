@@ -0,0 +1,159 @@
+# game_logic/speculation.py
+# Generates the next NPC turn for each suggested player response before the player picks one.
+
+import asyncio
+import functools
+import json
+import time
+from .fast_path import normalize_choice
+from .llm_calls import estimate_tokens
+
+MAX_SPECULATIONS_PER_TURN = 3
+
+class _Slot:
+    """The speculative turns prepared for one player after their last turn."""
+
+    def __init__(self, npc_name: str, fingerprint: tuple, expires_at: float):
+        self.npc_name = npc_name
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.entries = {}  # normalized suggestion -> (task, context)
+
+def state_fingerprint(session, npc_name: str) -> tuple:
+    """Changes whenever a turn is applied to the player's state, so stale speculation is never committed."""
+    return (
+        npc_name,
+        len(session.memory.get(npc_name, [])),
+        session.state["familiarity"].get(npc_name, 0),
+        len(session.state["discovered_nodes"]),
+    )
+
+class SpeculativePrefetcher:
+    """
+    Opt-in speculative execution of the player's next Interaction turn.
+
+    After a turn, the prompt context for each of the returned player_suggestions
+    is built right away from the player's current state. The contexts share the
+    state's data but are never written to and the live state is never touched,
+    so they act as a copy-on-write snapshot. Each context is then sent to the LLM
+    in the background. The results are kept in a per-player slot for `ttl`
+    seconds. If the player's next input is one of the suggestions and their
+    state is unchanged, that result is committed instead of a new LLM call (a
+    result still in flight is awaited) and the other results are dropped.
+
+    At most `max_concurrency` speculative calls run at once across all players;
+    suggestions beyond that are simply not speculated, so real turns never
+    queue behind speculation.
+    """
+
+    def __init__(self, engine, enabled: bool, max_concurrency: int, ttl: float):
+        self.engine = engine
+        self.enabled = enabled
+        self.max_concurrency = max_concurrency
+        self.ttl = ttl
+        self._slots = {}  # (game_id, player_key) -> _Slot
+        self._in_flight = 0
+        self._last_purge = time.monotonic()
+        self.stats = {
+            "speculated": 0, "skipped_at_capacity": 0, "hits": 0, "misses": 0,
+            "stale": 0, "expired": 0, "used_tokens": 0, "wasted_tokens": 0,
+        }
+
+    def schedule(self, game_state, session, npc_name: str, suggestions, frustration: dict):
+        """Starts speculative turns for the suggestions just offered to a player."""
+        if not self.enabled:
+            return
+        key = (game_state.game_id, session.player_key)
+        self._discard(self._slots.pop(key, None))
+        self._purge_expired()
+
+        clue_status, _ = self.engine.get_villager_clue_status(game_state, session, npc_name)
+        slot = _Slot(npc_name, state_fingerprint(session, npc_name), time.monotonic() + self.ttl)
+        for suggestion in list(dict.fromkeys(suggestions))[:MAX_SPECULATIONS_PER_TURN]:
+            if not isinstance(suggestion, str):
+                continue
+            # Turns the fast path answers locally are instant already.
+            if self.engine.fast_path.covers(session.state, npc_name, suggestion, clue_status):
+                continue
+            if self._in_flight >= self.max_concurrency:
+                self.stats["skipped_at_capacity"] += 1
+                continue
+            context = self.engine._build_interaction_context(game_state, session, npc_name, suggestion, frustration)
+            self._in_flight += 1
+            slot.entries[normalize_choice(suggestion)] = (asyncio.create_task(self._speculate(context)), context)
+            self.stats["speculated"] += 1
+
+        if slot.entries:
+            self._slots[key] = slot
+
+    async def take(self, game_state, session, npc_name: str, player_input: str):
+        """Returns the speculative turn for this input if one was prepared, discarding the rest."""
+        slot = self._slots.pop((game_state.game_id, session.player_key), None)
+        if slot is None:
+            return None
+
+        entry = None
+        if time.monotonic() > slot.expires_at:
+            self.stats["expired"] += 1
+        elif slot.npc_name != npc_name or slot.fingerprint != state_fingerprint(session, npc_name):
+            self.stats["stale"] += 1
+        else:
+            entry = slot.entries.pop(normalize_choice(player_input), None)
+        self._discard(slot)
+
+        dialogue_data = await entry[0] if entry else None
+        if dialogue_data is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self.stats["used_tokens"] += self._tokens(entry[1], dialogue_data)
+        return dialogue_data
+
+    def health(self) -> dict:
+        taken = self.stats["hits"] + self.stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "in_flight": self._in_flight,
+            "pending_slots": len(self._slots),
+            "hit_rate": round(self.stats["hits"] / taken, 3) if taken else None,
+            **self.stats,
+        }
+
+    async def _speculate(self, context: dict):
+        try:
+            return await self.engine.outputs.generate("Interaction", context)
+        except Exception as e:
+            # take() awaits this inside the player's real turn, which then falls back to a live call.
+            print(f"--- WARNING: Speculative turn failed and will not be used. Error: {e} ---")
+            return None
+        finally:
+            self._in_flight -= 1
+
+    def _discard(self, slot):
+        # The calls were already sent, so they are left to finish and only counted as waste.
+        if slot is None:
+            return
+        for task, context in slot.entries.values():
+            if task.done():
+                self._count_wasted(context, task)
+            else:
+                task.add_done_callback(functools.partial(self._count_wasted, context))
+        slot.entries.clear()
+
+    def _count_wasted(self, context: dict, task):
+        self.stats["wasted_tokens"] += self._tokens(context, None if task.cancelled() else task.result())
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        if now - self._last_purge < self.ttl:
+            return
+        self._last_purge = now
+        for key in [key for key, slot in self._slots.items() if now > slot.expires_at]:
+            self.stats["expired"] += 1
+            self._discard(self._slots.pop(key))
+
+    def _tokens(self, context: dict, dialogue_data) -> int:
+        tokens = self.engine.llm_api.estimate_prompt_tokens("Interaction", context)
+        if dialogue_data:
+            tokens += estimate_tokens(json.dumps(dialogue_data))
+        return tokens
@@ -1,7 +1,138 @@
 # game_logic/state_manager.py
-# Defines the GameState class, which holds all dynamic data for a single playthrough.
+# Defines the GameState class, which holds the shared world of a single playthrough, and the PlayerSession of each player in it.
+
+import asyncio
+import sys
+from config import VILLAGER_ROSTER
+from .dialogue_log import DialogueLog, intern_text
+
+# What a player knows when they first talk to anyone.
+NEW_PLAYER_SUMMARY = "You've just woken up in a cozy cottage..."
+
+_MISSING = object()
+
+def _deep_sizeof(value) -> int:
+    """Approximate memory held by a JSON-like value: containers, their contents and QuestNodes."""
+    if isinstance(value, QuestNode):
+        return value.nbytes()
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_sizeof(k) + _deep_sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_deep_sizeof(item) for item in value)
+    return size
+
+class QuestNode:
+    """
+    One node of a quest network. Reads like the dict it was built from
+    (node["content"], node.get("priority", 0), "key_clue" in node); keys
+    other than FIELDS are kept in `extra`. Ids, villager names and types are
+    interned, so every node and game shares one copy of each.
+    """
+
+    __slots__ = ("node_id", "villager_name", "content", "type", "priority", "key_clue", "preconditions",
+                 "required_familiarity", "extra")
+    FIELDS = __slots__[:-1]
+
+    def __init__(self, data: dict):
+        for field in self.FIELDS:
+            value = data.get(field, _MISSING)
+            if field == "preconditions" and isinstance(value, list):
+                value = [intern_text(p) for p in value]
+            elif field in ("node_id", "villager_name", "type"):
+                value = intern_text(value)
+            setattr(self, field, value)
+        extra = {key: value for key, value in data.items() if key not in self.FIELDS}
+        self.extra = extra or None
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __eq__(self, other):
+        if isinstance(other, QuestNode):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def get(self, key, default=None):
+        if key in self.FIELDS:
+            value = getattr(self, key)
+        else:
+            value = self.extra.get(key, _MISSING) if self.extra else _MISSING
+        return default if value is _MISSING else value
+
+    def to_dict(self) -> dict:
+        data = {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not _MISSING}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def nbytes(self) -> int:
+        # Interned ids and names are shared, so only the node's own content and preconditions count.
+        size = sys.getsizeof(self) + sys.getsizeof(self.content)
+        if isinstance(self.preconditions, list):
+            size += sys.getsizeof(self.preconditions)
+        return size + (_deep_sizeof(self.extra) if self.extra else 0)
+
+def compact_quest_network(quest_network: dict) -> dict:
+    """The network with its nodes as QuestNodes; call network_to_dict for the JSON form."""
+    nodes = [node if isinstance(node, QuestNode) else QuestNode(node) for node in quest_network.get("nodes", [])]
+    return {**quest_network, "nodes": nodes}
+
+def network_to_dict(quest_network: dict) -> dict:
+    return {**quest_network, "nodes": [node.to_dict() for node in quest_network.get("nodes", [])]}
+
+class PlayerSession:
+    """
+    One player's side of a game: their progress (`state`) and their
+    conversations with each villager (`memory`, a DialogueLog per villager).
+    A player's turns are serialized by `lock`; players never share anything
+    mutable, so turns of different players in one game run in parallel.
+    """
+
+    __slots__ = ("player_key", "state", "memory", "lock")
+
+    def __init__(self, player_key: str, state: dict, memory: dict):
+        self.player_key = player_key
+        self.state = state
+        self.memory = {
+            intern_text(npc_name): log if isinstance(log, DialogueLog) else DialogueLog(log)
+            for npc_name, log in memory.items()
+        }
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    def new(cls, player_key: str, villagers: list, knowledge_summary: str = NEW_PLAYER_SUMMARY) -> "PlayerSession":
+        state = {
+            "discovered_nodes": [],
+            "knowledge_summary": knowledge_summary,
+            "familiarity": {v["name"]: 0 for v in villagers},
+            "unproductive_turns": {v["name"]: 0 for v in villagers} # Tracks turns since last clue for each villager
+        }
+        return cls(player_key, state, {v["name"]: DialogueLog() for v in villagers})
+
+    def to_dict(self) -> dict:
+        return {"state": self.state, "memory": {npc_name: log.to_list() for npc_name, log in self.memory.items()}}
+
+    def memory_usage(self) -> dict:
+        """Approximate bytes held by the player's progress and conversations."""
+        state = _deep_sizeof(self.state)
+        dialogue = sys.getsizeof(self.memory) + sum(log.nbytes() for log in self.memory.values())
+        return {"state": state, "dialogue": dialogue, "total": sys.getsizeof(self) + state + dialogue}
 
 class GameState:
+    # Slots keep a game's attributes out of a per-instance __dict__; quest nodes and dialogue are compacted too.
+    __slots__ = (
+        "game_id", "difficulty", "correct_location", "story_theme", "inaccessible_locations",
+        "_quest_network", "villagers", "dialogue_templates", "opening_turns", "sessions", "quest_index",
+        "world_snapshot",
+    )
+
     def __init__(self, game_id: str, difficulty: str):
         self.game_id = game_id
         self.difficulty = difficulty
@@ -10,12 +141,76 @@ class GameState:
         self.inaccessible_locations = []
         self.quest_network = {"nodes": []}
         self.villagers = [] # Each game session will store its own list of villagers
-        self.player_state = {
-            "discovered_nodes": [],
-            "knowledge_summary": "You've just woken up in a cozy cottage...",
-            "familiarity": {},
-            "unproductive_turns": {} # Tracks turns since last clue for each villager
-        }
-        self.full_npc_memory = {}
-        self.multiplayer_states = {}
-        self.multiplayer_memories = {}
\ No newline at end of file
+        # Stock farewell/refusal lines per villager, status and familiarity band (see fast_path.py).
+        self.dialogue_templates = {}
+        # Pre-generated familiarity-0 opening turn per villager, shared by every player of the game.
+        self.opening_turns = {}
+        # The world above is shared by every player and not changed once the game has started;
+        # everything a player changes lives in their PlayerSession.
+        self.sessions = {}
+        # Compiled lookup tables for quest_network (see quest_index.py); rebuilt on demand, never persisted.
+        self.quest_index = None
+        # Encoded shared world for binary snapshots (see snapshot.py); likewise rebuilt on demand.
+        self.world_snapshot = None
+
+    # Attributes that make up a game's shared world, in constructor order.
+    _FIELDS = (
+        "game_id", "difficulty", "correct_location", "story_theme", "inaccessible_locations",
+        "quest_network", "villagers", "dialogue_templates", "opening_turns",
+    )
+
+    @property
+    def quest_network(self) -> dict:
+        """The quest network, whose nodes are QuestNodes however it was assigned."""
+        return self._quest_network
+
+    @quest_network.setter
+    def quest_network(self, quest_network: dict):
+        self._quest_network = compact_quest_network(quest_network)
+
+    def session(self, player_key: str) -> PlayerSession:
+        """Returns the player's session, starting a fresh one on their first turn."""
+        session = self.sessions.get(player_key)
+        if session is None:
+            session = self.sessions[player_key] = PlayerSession.new(player_key, self.villagers)
+        return session
+
+    def to_dict(self) -> dict:
+        """Returns a JSON-serializable snapshot of this game."""
+        data = {field: getattr(self, field) for field in self._FIELDS}
+        data["quest_network"] = network_to_dict(self.quest_network)
+        data["sessions"] = {player_key: session.to_dict() for player_key, session in self.sessions.items()}
+        return data
+
+    def memory_usage(self) -> dict:
+        """
+        Approximate bytes held by this game: the shared world (the stock
+        villager roster, which every game shares, isn't counted) and each
+        player's session. The compiled quest index isn't counted either.
+        """
+        world = sys.getsizeof(self) + sum(
+            _deep_sizeof(getattr(self, field)) for field in self._FIELDS if field != "villagers"
+        )
+        if self.villagers is not VILLAGER_ROSTER:
+            world += _deep_sizeof(self.villagers)
+        if self.world_snapshot is not None:
+            world += sys.getsizeof(self.world_snapshot[1]) + sys.getsizeof(self.world_snapshot[2])
+        sessions = {player_key: session.memory_usage()["total"] for player_key, session in self.sessions.items()}
+        return {"world": world, "sessions": sessions, "total": world + sum(sessions.values())}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GameState":
+        game_state = cls(data["game_id"], data["difficulty"])
+        for field in cls._FIELDS:
+            if field in data:
+                setattr(game_state, field, data[field])
+        if game_state.villagers == VILLAGER_ROSTER:
+            # Share the stock roster rather than keeping a copy per restored game.
+            game_state.villagers = VILLAGER_ROSTER
+        for player_key, session in data.get("sessions", {}).items():
+            game_state.sessions[player_key] = PlayerSession(player_key, session["state"], session["memory"])
+        # Snapshots taken before sessions existed kept players' states and memories side by side.
+        for player_key, state in data.get("multiplayer_states", {}).items():
+            memory = data.get("multiplayer_memories", {}).get(player_key, {})
+            game_state.sessions.setdefault(player_key, PlayerSession(player_key, state, memory))
+        return game_state
@@ -0,0 +1,111 @@
+# game_logic/stream_parser.py
+# Incremental JSON scanning used to surface fields of an LLM response while it is still being generated.
+
+_SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+class JsonStringFieldStreamer:
+    """
+    Extracts the value of one top-level string field from a JSON object that
+    arrives in arbitrary chunks, e.g. "npc_dialogue" from a streamed Interaction
+    response. Text inside the value is decoded and returned as soon as it is
+    seen; everything else in the document is only scanned for structure.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.value = ""
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._string_is_key = False
+        self._capturing = False
+        self._key_chars = []
+        self._last_key = None
+        self._expect_key = False
+        self._value_pending = False
+        self._escape = None        # None, "" right after a backslash, or "u..." while reading hex digits
+        self._high_surrogate = None
+
+    def feed(self, chunk: str) -> str:
+        """Consumes the next chunk and returns the newly decoded part of the field's value."""
+        if self.done:
+            return ""
+        out = []
+        for ch in chunk:
+            if self._in_string:
+                self._consume_string_char(ch, out)
+                if self.done:
+                    break
+            else:
+                self._consume_structural_char(ch)
+        delta = "".join(out)
+        self.value += delta
+        return delta
+
+    def _consume_structural_char(self, ch):
+        if ch in " \t\r\n":
+            return
+        if ch == '"':
+            self._in_string = True
+            self._string_is_key = self._depth == 1 and self._expect_key
+            self._capturing = self._depth == 1 and self._value_pending
+            self._expect_key = False
+            self._value_pending = False
+            self._key_chars = []
+            return
+        # Any other token where our value was expected means the field is not a string (e.g. null).
+        self._value_pending = False
+        if ch in "{[":
+            self._depth += 1
+            self._expect_key = ch == "{" and self._depth == 1
+        elif ch in "}]":
+            self._depth -= 1
+        elif ch == "," and self._depth == 1:
+            self._expect_key = True
+        elif ch == ":" and self._depth == 1:
+            self._value_pending = self._last_key == self.field
+
+    def _consume_string_char(self, ch, out):
+        if self._escape is not None:
+            self._consume_escape_char(ch, out)
+        elif ch == "\\":
+            self._escape = ""
+        elif ch == '"':
+            self._in_string = False
+            if self._string_is_key:
+                self._last_key = "".join(self._key_chars)
+            elif self._capturing:
+                self._capturing = False
+                self.done = True
+        else:
+            self._emit(ch, out)
+
+    def _consume_escape_char(self, ch, out):
+        if self._escape == "":
+            if ch == "u":
+                self._escape = "u"
+                return
+            self._escape = None
+            self._emit(_SIMPLE_ESCAPES.get(ch, ch), out)
+            return
+        self._escape += ch
+        if len(self._escape) < 5:
+            return
+        try:
+            code = int(self._escape[1:], 16)
+        except ValueError:
+            code = 0xFFFD
+        self._escape = None
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        self._emit(chr(code), out)
+
+    def _emit(self, ch, out):
+        if self._capturing:
+            out.append(ch)
+        elif self._string_is_key:
+            self._key_chars.append(ch)
@@ -0,0 +1,215 @@
+# game_logic/world_builder.py
+# Builds the quest network as a short skeleton call followed by one concurrent call per villager.
+
+import asyncio
+import json
+import time
+from .llm_calls import world_difficulty_profile
+
+NODE_TYPES = ("Information", "TalkToVillager")
+MAX_NODES_PER_VILLAGER = 10
+
+class ShardedWorldBuilder:
+    """
+    Generates a quest network in two stages instead of one monolithic WorldBuilder call.
+
+    1. A "WorldSkeleton" call fixes the anchors: key clues, the final clue and the
+       TalkToVillager links, together with the cross-villager `requires` edges
+       and a node budget per villager.
+    2. One "VillagerShard" call per villager, run concurrently, writes that
+       villager's nodes around their anchors.
+
+    The shards are then merged into the usual {"nodes": [...]} shape with
+    sequential node ids. A shard that fails or returns malformed JSON only costs
+    that villager's filler nodes: their anchors are still added from the
+    skeleton summaries, so the network stays solvable.
+    """
+
+    def __init__(self, llm_api):
+        self.llm_api = llm_api
+
+    async def build(self, world_context: dict) -> dict:
+        started = time.perf_counter()
+        villagers = world_context["villagers"]
+        skeleton = await self._generate_skeleton(world_context)
+        anchors = skeleton["anchors"]
+        plans = skeleton["plans"]
+
+        shard_results = await asyncio.gather(*[
+            self._generate_shard(world_context, villager, plans[villager["name"]], anchors)
+            for villager in villagers
+        ])
+
+        quest_network = merge_shards(villagers, anchors, shard_results)
+        failed = [v["name"] for v, nodes in zip(villagers, shard_results) if nodes is None]
+        print(
+            f"Sharded quest network built in {time.perf_counter() - started:.1f}s: "
+            f"{len(quest_network['nodes'])} nodes, {len(anchors)} anchors"
+            + (f", fallback anchors for {failed}" if failed else "")
+        )
+        return quest_network
+
+    async def _generate_skeleton(self, world_context: dict) -> dict:
+        skeleton_json = await self.llm_api.generate_content_async("WorldSkeleton", world_context)
+        skeleton = json.loads(skeleton_json)
+        if not isinstance(skeleton, dict):
+            raise ValueError("Generated skeleton is not a JSON object.")
+
+        roster = {v["name"] for v in world_context["villagers"]}
+        anchors = {}
+        for anchor in _objects(skeleton.get("anchors")):
+            anchor_id = str(anchor.get("anchor_id", "")).strip()
+            if not anchor_id or anchor_id in anchors or anchor.get("villager_name") not in roster or not anchor.get("summary"):
+                continue
+            anchors[anchor_id] = {
+                "anchor_id": anchor_id,
+                "villager_name": anchor["villager_name"],
+                "summary": anchor["summary"],
+                "type": anchor.get("type") if anchor.get("type") in NODE_TYPES else "Information",
+                "key_clue": bool(anchor.get("key_clue")),
+                "requires": [r for r in anchor.get("requires") or [] if isinstance(r, str)],
+            }
+        for anchor in anchors.values():
+            # Only keep edges between different villagers' anchors; local ordering is the shard's job.
+            anchor["requires"] = [
+                r for r in dict.fromkeys(anchor["requires"])
+                if r in anchors and anchors[r]["villager_name"] != anchor["villager_name"]
+            ]
+        if not any(anchor["key_clue"] for anchor in anchors.values()):
+            raise ValueError("Generated skeleton has no key clue anchors.")
+
+        profile = world_difficulty_profile(world_context.get("difficulty", "Medium"))
+        default_count = max(1, profile["max_nodes"] // len(roster))
+        plans = {name: {"role": "", "node_count": default_count} for name in roster}
+        for plan in _objects(skeleton.get("villager_plans")):
+            name = plan.get("villager_name")
+            if name in plans:
+                plans[name]["role"] = plan.get("role") or ""
+                if isinstance(plan.get("node_count"), int):
+                    plans[name]["node_count"] = plan["node_count"]
+        for name, plan in plans.items():
+            own_anchors = sum(1 for a in anchors.values() if a["villager_name"] == name)
+            plan["node_count"] = max(1, own_anchors, min(plan["node_count"], MAX_NODES_PER_VILLAGER))
+
+        return {"anchors": anchors, "plans": plans}
+
+    async def _generate_shard(self, world_context: dict, villager: dict, plan: dict, anchors: dict):
+        own_anchors = [a for a in anchors.values() if a["villager_name"] == villager["name"]]
+        external_anchors = [
+            {"anchor_id": a["anchor_id"], "villager_name": a["villager_name"], "summary": a["summary"]}
+            for a in anchors.values() if a["villager_name"] != villager["name"]
+        ]
+        shard_context = {
+            "correctLocation": world_context["correctLocation"],
+            "story_theme": world_context["story_theme"],
+            "difficulty": world_context.get("difficulty", "Medium"),
+            "villager": villager,
+            "role": plan["role"],
+            "node_count": plan["node_count"],
+            "anchors": own_anchors,
+            "external_anchors": external_anchors,
+        }
+        try:
+            shard_json = await self.llm_api.generate_content_async("VillagerShard", shard_context)
+            nodes = json.loads(shard_json).get("nodes")
+            if not isinstance(nodes, list):
+                raise ValueError("Shard is missing the 'nodes' list.")
+            return [node for node in nodes if isinstance(node, dict) and node.get("content")]
+        except (json.JSONDecodeError, ValueError, AttributeError) as e:
+            print(f"--- WARNING: Quest shard for {villager['name']} failed, using skeleton anchors only. Error: {e} ---")
+            return None
+
+def merge_shards(villagers, anchors: dict, shard_results) -> dict:
+    """Merges per-villager shards into a validated quest network with sequential node ids."""
+    nodes = []
+    anchor_to_node = {}
+    shard_maps = {}  # villager name -> {local node_id: global node_id}
+
+    for villager, shard_nodes in zip(villagers, shard_results):
+        name = villager["name"]
+        shard_map = {}
+        realized = set()
+        for raw in shard_nodes or []:
+            anchor_id = raw.get("anchor_id")
+            anchor = anchors.get(anchor_id) if isinstance(anchor_id, str) and anchor_id not in realized else None
+            if anchor and anchor["villager_name"] != name:
+                anchor = None
+            node = _new_node(len(nodes) + 1, name, raw, anchor)
+            if anchor:
+                realized.add(anchor["anchor_id"])
+                anchor_to_node[anchor["anchor_id"]] = node["node_id"]
+            if raw.get("node_id") is not None:
+                shard_map.setdefault(str(raw["node_id"]), node["node_id"])
+            preconditions = raw.get("preconditions") if isinstance(raw.get("preconditions"), list) else []
+            node["preconditions"] = [str(p) for p in preconditions if isinstance(p, (str, int))]
+            nodes.append(node)
+
+        # Anchors the shard left out are added straight from the skeleton.
+        for anchor in anchors.values():
+            if anchor["villager_name"] == name and anchor["anchor_id"] not in realized:
+                node = _new_node(len(nodes) + 1, name, {"content": anchor["summary"], "type": anchor["type"], "priority": 5}, anchor)
+                node["preconditions"] = []
+                anchor_to_node[anchor["anchor_id"]] = node["node_id"]
+                nodes.append(node)
+        shard_maps[name] = shard_map
+
+    for node in nodes:
+        shard_map = shard_maps[node["villager_name"]]
+        resolved = [shard_map.get(p) or anchor_to_node.get(p) for p in node["preconditions"]]
+        node["preconditions"] = [p for p in dict.fromkeys(resolved) if p and p != node["node_id"]]
+        anchor = anchors.get(node.pop("_anchor_id", None))
+        if anchor:
+            for required in anchor["requires"]:
+                required_node = anchor_to_node.get(required)
+                if required_node and required_node not in node["preconditions"]:
+                    node["preconditions"].append(required_node)
+
+    _break_precondition_cycles(nodes)
+    return {"nodes": nodes}
+
+def _objects(value) -> list:
+    """The dicts in a list from the model's JSON; anything else in their place is ignored."""
+    return [item for item in value if isinstance(item, dict)] if isinstance(value, list) else []
+
+def _new_node(index: int, villager_name: str, raw: dict, anchor) -> dict:
+    priority = raw.get("priority")
+    required_familiarity = raw.get("required_familiarity")
+    if anchor:
+        node_type = anchor["type"]
+    else:
+        node_type = raw.get("type") if raw.get("type") in NODE_TYPES else "Information"
+    return {
+        "node_id": f"node{index}",
+        "villager_name": villager_name,
+        "content": raw["content"],
+        "type": node_type,
+        "priority": min(max(priority, 1), 5) if isinstance(priority, int) else 3,
+        # Key clues are fixed by the skeleton so the count always matches the difficulty.
+        "key_clue": bool(anchor and anchor["key_clue"]),
+        "preconditions": [],
+        "required_familiarity": min(max(required_familiarity, 1), 5) if isinstance(required_familiarity, int) else None,
+        "_anchor_id": anchor["anchor_id"] if anchor else None,
+    }
+
+def _break_precondition_cycles(nodes):
+    """Drops precondition edges that close a cycle, which would otherwise lock those nodes forever."""
+    by_id = {node["node_id"]: node for node in nodes}
+    state = {}  # node_id -> 1 while on the DFS stack, 2 once finished
+
+    for root in by_id:
+        if root in state:
+            continue
+        stack = [(root, iter(list(by_id[root]["preconditions"])))]
+        state[root] = 1
+        while stack:
+            node_id, pending = stack[-1]
+            for required in pending:
+                if state.get(required) == 1:
+                    by_id[node_id]["preconditions"].remove(required)
+                elif required not in state:
+                    state[required] = 1
+                    stack.append((required, iter(list(by_id[required]["preconditions"]))))
+                    break
+            else:
+                state[node_id] = 2
+                stack.pop()
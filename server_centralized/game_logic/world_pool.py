@@ -0,0 +1,188 @@
+# game_logic/world_pool.py
+# Keeps pre-generated game worlds ready so that new games don't wait on world generation.
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+from .state_manager import GameState
+
+TEMPLATE_GAME_ID = "world-pool-template"
+BUILD_RETRY_DELAY = 10.0
+
+PoolKey = Tuple[str, int]
+
+def parse_pool_keys(spec: str):
+    """Parses a "difficulty:num_locations,..." spec such as "easy:5,hard:5" into pool keys (difficulty ignores case)."""
+    keys = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        difficulty, _, num_locations = item.strip().rpartition(":")
+        key = (difficulty.lower(), int(num_locations))
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+class WorldPool:
+    """
+    A pool of ready-made GameState templates per (difficulty, num_inaccessible_locations).
+    Only the configured keys are pooled: settings sent by clients never start
+    a refill (each world costs a few dozen LLM calls), they're simply a miss.
+
+    Each template is a complete world (story, locations and quest network) with a
+    fresh player state, so claiming one only re-stamps its game_id. A background
+    task per key refills the pool whenever it drops below the target size, and
+    the pool contents are saved to disk so a restart does not start from empty.
+    Templates are serialized once when they enter the pool; saves reuse that
+    encoding, so claimed games are never read by the writer thread.
+    """
+
+    def __init__(self, engine, target_size: int, keys, path: str, max_concurrent_builds: int = 2):
+        self.engine = engine
+        self.target_size = target_size
+        self.path = path
+        self._pools: Dict[PoolKey, deque] = {}
+        self._wakeups: Dict[PoolKey, asyncio.Event] = {}
+        self._refill_tasks: Dict[PoolKey, asyncio.Task] = {}
+        self._build_slots = asyncio.Semaphore(max_concurrent_builds)
+        self._save_task: Optional[asyncio.Task] = None
+        self._save_pending = False
+        self._running = False
+        self.stats = {"hits": 0, "misses": 0, "builds": 0, "build_failures": 0}
+        for key in keys:
+            self._pools.setdefault(key, deque())
+
+    async def start(self):
+        self._load()
+        self._running = True
+        for key in list(self._pools):
+            self._start_refill(key)
+
+    async def stop(self):
+        self._running = False
+        for task in self._refill_tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._refill_tasks.values(), return_exceptions=True)
+        self._refill_tasks.clear()
+        if self._save_task:
+            await asyncio.gather(self._save_task, return_exceptions=True)
+        await asyncio.to_thread(self._write_snapshot, self._snapshot())
+
+    def claim(self, game_id: str, difficulty: str, num_inaccessible_locations: int) -> Optional[GameState]:
+        """Takes a ready world for the given settings, or returns None if none is available."""
+        # Clients send "Easy" as well as "medium", so "Medium" and "medium" share one pool.
+        key = (difficulty.lower(), num_inaccessible_locations)
+        pool = self._pools.get(key)
+        if not pool:
+            self.stats["misses"] += 1
+            return None
+
+        game_state, _ = pool.popleft()
+        game_state.game_id = game_id
+        self.stats["hits"] += 1
+        if key in self._wakeups:
+            self._wakeups[key].set()
+        self._schedule_save()
+        return game_state
+
+    def health(self) -> dict:
+        ready = sum(len(pool) for pool in self._pools.values())
+        capacity = self.target_size * len(self._pools)
+        claims = self.stats["hits"] + self.stats["misses"]
+        return {
+            "target_size": self.target_size,
+            "ready": ready,
+            "fill_ratio": round(ready / capacity, 3) if capacity else 0.0,
+            "hit_rate": round(self.stats["hits"] / claims, 3) if claims else None,
+            "pools": [
+                {"difficulty": key[0], "num_inaccessible_locations": key[1], "ready": len(pool)}
+                for key, pool in self._pools.items()
+            ],
+            **self.stats,
+        }
+
+    def _start_refill(self, key: PoolKey):
+        self._wakeups[key] = asyncio.Event()
+        self._refill_tasks[key] = asyncio.create_task(self._refill_loop(key))
+
+    async def _refill_loop(self, key: PoolKey):
+        difficulty, num_inaccessible_locations = key
+        pool, wakeup = self._pools[key], self._wakeups[key]
+        while True:
+            while len(pool) < self.target_size:
+                async with self._build_slots:
+                    started = time.perf_counter()
+                    try:
+                        game_state = await self.engine.start_new_game(
+                            game_id=TEMPLATE_GAME_ID,
+                            num_inaccessible_locations=num_inaccessible_locations,
+                            difficulty=difficulty
+                        )
+                    except Exception as e:
+                        game_state = None
+                        self.stats["build_failures"] += 1
+                        print(f"❌ World pool failed to build a {difficulty} world: {e}")
+
+                if game_state is None:
+                    await asyncio.sleep(BUILD_RETRY_DELAY)
+                    continue
+
+                pool.append((game_state, json.dumps(game_state.to_dict())))
+                self.stats["builds"] += 1
+                print(f"✅ World pool built a {difficulty} world in {time.perf_counter() - started:.1f}s ({len(pool)}/{self.target_size} ready).")
+                self._schedule_save()
+
+            wakeup.clear()
+            await wakeup.wait()
+
+    # --- Persistence ---
+
+    def _snapshot(self) -> str:
+        worlds = [
+            f'{{"difficulty": {json.dumps(key[0])}, "num_inaccessible_locations": {key[1]}, "state": {encoded}}}'
+            for key, pool in self._pools.items()
+            for _, encoded in pool
+        ]
+        return '{"version": 1, "worlds": [' + ", ".join(worlds) + "]}"
+
+    def _schedule_save(self):
+        # Saves are coalesced: at most one write runs at a time, with one more queued behind it.
+        self._save_pending = True
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_loop())
+
+    async def _save_loop(self):
+        while self._save_pending:
+            self._save_pending = False
+            try:
+                await asyncio.to_thread(self._write_snapshot, self._snapshot())
+            except Exception as e:
+                print(f"❌ Failed to save world pool to {self.path}: {e}")
+
+    def _write_snapshot(self, snapshot: str):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(snapshot)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"❌ Ignoring unreadable world pool file {self.path}: {e}")
+            return
+
+        loaded = 0
+        for world in snapshot.get("worlds", []):
+            # Worlds of keys no longer configured are dropped
+            pool = self._pools.get((world["difficulty"].lower(), world["num_inaccessible_locations"]))
+            if pool is not None and len(pool) < self.target_size:
+                pool.append((GameState.from_dict(world["state"]), json.dumps(world["state"])))
+                loaded += 1
+        print(f"✅ Loaded {loaded} pre-generated worlds from {self.path}.")
@@ -0,0 +1,450 @@
+# load_test.py
+# End-to-end load test: runs a game server against a stub LLM and storage service and drives it with bot players.
+#
+# Usage (one command, JSON report on stdout and optionally in a file):
+#   python load_test.py --bots 50 --turns 8 --rooms 10 --output load_test.json
+#   python load_test.py --app-dir ../server_centralized_0g_storage
+#   python load_test.py --app-dir ../server_decentralized_0g --llm-latency "lognormal:-1,0.5"
+#
+# The server runs in a child process (`load_test.py serve ...`), so its RSS and event-loop
+# lag are measured apart from the bots. WebSocket rooms need the `websockets` package
+# (installed with uvicorn[standard]); without it the rooms are skipped.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+
+DEFAULT_PORT = 8765
+DEFAULT_STUB_PORT = 8766
+OPENING_PROMPT = "This is the starting prompt of the conversation."
+LAG_INTERVAL = 0.05
+METRICS_PATH = "/__load_test/metrics"
+VILLAGER_NAMES = ["Arthur Hobbs", "Sam", "Elias", "Leo", "Markus", "Edward Gable", "Gavin", "Father Thomas"]
+
+# --- STUB LLM RESPONSES ---
+
+def _stub_story():
+    return {
+        "story_theme": "The village well draws from a cavern where something old is waking.",
+        "inaccessible_locations": ["Old Mine", "Abandoned Mill", "Whispering Bog"],
+        "correct_location": "Old Mine",
+    }
+
+def _stub_world():
+    nodes = []
+    for index, name in enumerate(VILLAGER_NAMES):
+        for step in range(3):
+            node_number = index * 3 + step + 1
+            nodes.append({
+                "node_id": f"node{node_number}",
+                "villager_name": name,
+                "content": f"{name} remembers something strange (part {step + 1}).",
+                "type": "Information",
+                "priority": 5 - step,
+                "key_clue": step == 0 and index < 2,
+                "preconditions": [f"node{node_number - 1}"] if step == 2 else [],
+                "required_familiarity": None,
+            })
+    return {"nodes": nodes}
+
+def _stub_interaction():
+    return {
+        "npc_dialogue": "Well now, stranger, the mist is thick today. Folk don't talk much about the mine.",
+        "player_responses": ["Tell me more about the mine.", "Have you seen my friends?", "Goodbye."],
+        "node_revealed_id": None,
+        "new_familiarity_level": 1,
+    }
+
+STUB_RESPONSES = {
+    "StoryGenerator": _stub_story,
+    "WorldBuilder": _stub_world,
+    "Interaction": _stub_interaction,
+    "DialogueTemplates": lambda: {"templates": []},
+    "MemorySummary": lambda: {"summary": "The player asked about their missing friends."},
+}
+
+def _stub_response_for(prompt: str) -> dict:
+    """Picks a canned response by recognizing the prompt, for servers without a replay backend."""
+    if "master storyteller" in prompt:
+        return _stub_story()
+    if "Quest Network" in prompt:
+        return _stub_world()
+    return _stub_interaction()
+
+def _latency_sampler(spec: str):
+    """fixed:S, uniform:LOW,HIGH or lognormal:MU,SIGMA (seconds); empty for none."""
+    if not spec:
+        return lambda rng: 0.0
+    name, _, args = spec.partition(":")
+    params = [float(arg) for arg in args.split(",") if arg.strip()]
+    samplers = {
+        "fixed": lambda rng: params[0],
+        "uniform": lambda rng: rng.uniform(params[0], params[1]),
+        "lognormal": lambda rng: rng.lognormvariate(params[0], params[1]),
+    }
+    if name not in samplers:
+        raise ValueError(f"Unsupported --llm-latency '{spec}'. Use fixed:S, uniform:LOW,HIGH or lognormal:MU,SIGMA.")
+    return samplers[name]
+
+def _write_stub_cassette(path: str):
+    """A cassette with one response per prompt type; replay serves it for every prompt of that type."""
+    with open(path, "w", encoding="utf-8") as f:
+        for index, (prompt_type, build) in enumerate(STUB_RESPONSES.items()):
+            key = f"{index:040x}"
+            f.write(json.dumps({"key": key, "prompt_type": prompt_type, "response": json.dumps(build())}) + "\n")
+
+# --- STUB SERVICES (0G Compute bridge and 0G storage service) ---
+
+class _StubHandler(BaseHTTPRequestHandler):
+    latency = staticmethod(lambda rng: 0.0)
+    rng = random.Random(0)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0)
+        if self.path.startswith("/generate-narrative"):
+            time.sleep(self.latency(self.rng))
+            prompt = json.loads(body or b"{}").get("prompt", "")
+            self._reply({"narrative": json.dumps(_stub_response_for(prompt))})
+        else:
+            self._reply({"success": True})
+
+    def do_GET(self):
+        self._reply({"history": []})
+
+    def _reply(self, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class _StubModel:
+    """Stands in for google.generativeai.GenerativeModel on servers without a replay backend."""
+
+    latency = staticmethod(lambda rng: 0.0)
+    rng = random.Random(0)
+
+    def __init__(self, *args, system_instruction=None, **kwargs):
+        self.system_instruction = system_instruction or ""
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        time.sleep(self.latency(self.rng))
+        response = type("StubResponse", (), {"text": json.dumps(_stub_response_for(self.system_instruction + str(prompt)))})()
+        return [response] if stream else response
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def serve(args):
+    """Child process: starts the stubs, then the game server with a metrics route added."""
+    app_dir = os.path.abspath(args.app_dir)
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    latency = _latency_sampler(args.llm_latency)
+    _StubHandler.latency = _StubModel.latency = staticmethod(latency)
+    stub_server = ThreadingHTTPServer(("127.0.0.1", args.stub_port), _StubHandler)
+    threading.Thread(target=stub_server.serve_forever, daemon=True).start()
+
+    os.environ.setdefault("GOOGLE_API_KEY", "load-test")
+    os.environ.setdefault("WORLD_POOL_SIZE", "0")
+    os.environ["STORAGE_SERVICE_URL"] = stub_url
+    os.environ["OG_BRIDGE_URL"] = f"{stub_url}/generate-narrative"
+    # Games are persisted and spilled as in production, but outside the app directory.
+    os.environ.setdefault("GAME_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="load_test_"), "games.db"))
+    os.environ.setdefault("GAME_SPILL_DIR", os.path.join(tempfile.mkdtemp(prefix="load_test_"), "game_spill"))
+    has_replay = os.path.exists(os.path.join(app_dir, "game_logic", "cassette.py"))
+    if has_replay:
+        cassette = os.path.join(tempfile.gettempdir(), "load_test_cassette.jsonl")
+        _write_stub_cassette(cassette)
+        os.environ.update(
+            LLM_BACKENDS="replay", LLM_CASSETTE_PATH=cassette, LLM_RECORD="false",
+            LLM_REPLAY_LATENCY=args.llm_latency, SHARDED_WORLD_BUILDER="false",
+        )
+    else:
+        import google.generativeai as genai
+        genai.GenerativeModel = _StubModel
+
+    os.chdir(app_dir)
+    sys.path.insert(0, app_dir)
+    import main
+    if hasattr(main, "STORAGE_SERVICE_URL"):
+        main.STORAGE_SERVICE_URL = stub_url
+
+    lag_samples = []
+
+    async def watch_loop_lag():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            lag_samples.append(time.perf_counter() - started - LAG_INTERVAL)
+
+    async def start_watching():
+        main.app.state.load_test_lag_task = asyncio.create_task(watch_loop_lag())
+
+    async def metrics(reset: bool = False):
+        samples = sorted(lag_samples)
+        if reset:
+            lag_samples.clear()
+        return {
+            "rss_bytes": _rss_bytes(),
+            "active_games": len(getattr(main, "active_games", {})),
+            "loop_lag_seconds": _percentiles(samples) if samples else None,
+        }
+
+    main.app.on_event("startup")(start_watching)
+    main.app.add_api_route(METRICS_PATH, metrics, methods=["GET"])
+
+    import uvicorn
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+# --- BOTS ---
+
+def _percentiles(values) -> dict:
+    ordered = sorted(values)
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {
+        "p50": round(pick(0.5), 4), "p95": round(pick(0.95), 4), "p99": round(pick(0.99), 4),
+        "max": round(ordered[-1], 4), "mean": round(sum(ordered) / len(ordered), 4),
+    }
+
+class Recorder:
+    """Latency samples and error counts per endpoint."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, name: str, seconds: float, ok: bool):
+        if ok:
+            self.latencies.setdefault(name, []).append(seconds)
+        else:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    async def timed(self, name: str, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.record(name, time.perf_counter() - started, ok)
+        return response if ok else None
+
+    def report(self, duration: float) -> dict:
+        endpoints = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            samples = self.latencies.get(name, [])
+            endpoints[name] = {
+                "requests": len(samples) + self.errors.get(name, 0),
+                "errors": self.errors.get(name, 0),
+                "throughput_per_second": round(len(samples) / duration, 2) if duration else None,
+                "latency_seconds": _percentiles(samples) if samples else None,
+            }
+        return endpoints
+
+async def run_bot(client, index: int, args, recorder: Recorder, paths: set, measure):
+    rng = random.Random(args.seed + index)
+    player_id = f"bot-{index}"
+    response = await recorder.timed("POST /game/new", client.post(
+        "/game/new", json={"difficulty": args.difficulty, "num_inaccessible_locations": 3}
+    ))
+    if response is None:
+        return
+    game = response.json()
+    game_id, villagers = game["game_id"], game["villagers"]
+    await measure()
+
+    villager_id, prompt = rng.choice(villagers)["id"], OPENING_PROMPT
+    for turn in range(args.turns):
+        response = await recorder.timed("POST /game/{game_id}/interact", client.post(
+            f"/game/{game_id}/interact",
+            json={"villager_id": villager_id, "player_prompt": prompt, "player_id": player_id},
+        ))
+        suggestions = response.json().get("player_suggestions") if response is not None else None
+        if turn % args.turns_per_villager == args.turns_per_villager - 1 or not suggestions:
+            villager_id, prompt = rng.choice(villagers)["id"], OPENING_PROMPT
+        else:
+            prompt = rng.choice(suggestions)
+        if args.think_time:
+            await asyncio.sleep(rng.uniform(0, args.think_time))
+
+    # The game is still active here; on short runs the periodic sampler may never see it.
+    await measure()
+    await recorder.timed("POST /game/{game_id}/guess", client.post(
+        f"/game/{game_id}/guess",
+        json={"location_name": rng.choice(game["inaccessible_locations"] or ["Old Mine"]), "player_id": player_id},
+    ))
+    if "/game/end" in paths:
+        await recorder.timed("POST /game/end", client.post("/game/end", json={"game_id": game_id, "player_id": player_id}))
+
+async def run_room(client, index: int, args, recorder: Recorder, websockets):
+    response = await recorder.timed("POST /create_room", client.post("/create_room"))
+    if response is None:
+        return
+    room_id = response.json()["room_id"]
+    ws_base = args.base_url.replace("http", "ws", 1)
+    sent = {}
+
+    async def player(number: int):
+        player_id = f"room{index}-p{number}"
+        async with websockets.connect(f"{ws_base}/ws/{room_id}/{player_id}") as ws:
+            async def read():
+                async for raw in ws:
+                    message = json.loads(raw)
+                    if message.get("type") == "player_moved":
+                        started = sent.get((message["playerId"], message["x"]))
+                        if started is not None:
+                            recorder.record("WS move broadcast", time.perf_counter() - started, True)
+
+            reader = asyncio.create_task(read())
+            await asyncio.sleep(0.2)  # let everyone join before moving
+            for move in range(args.moves):
+                sent[(player_id, move)] = time.perf_counter()
+                await ws.send(json.dumps({"type": "move", "x": move, "y": number}))
+                await asyncio.sleep(args.move_interval)
+            await asyncio.sleep(0.5)  # drain the last broadcasts
+            reader.cancel()
+
+    try:
+        await asyncio.gather(*(player(number) for number in range(args.room_players)))
+    except Exception as e:
+        print(f"--- WARNING: WebSocket room {room_id} failed: {e} ---", file=sys.stderr)
+        recorder.record("WS move broadcast", 0.0, False)
+
+async def drive(args) -> dict:
+    recorder = Recorder()
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=httpx.Limits(max_connections=args.bots + 16)) as client:
+        paths = set((await client.get("/openapi.json")).json().get("paths", {}))
+        baseline = (await client.get(METRICS_PATH, params={"reset": True})).json()
+
+        try:
+            import websockets
+        except ImportError:
+            websockets = None
+            if args.rooms:
+                print("--- WARNING: The websockets package is not installed, skipping WebSocket rooms. ---", file=sys.stderr)
+
+        peak = dict(baseline)
+        finished = asyncio.Event()
+
+        async def measure():
+            snapshot = (await client.get(METRICS_PATH)).json()
+            if snapshot["active_games"] >= peak["active_games"]:
+                peak.update(snapshot)
+
+        async def sample():
+            while not finished.is_set():
+                await measure()
+                await asyncio.sleep(0.5)
+
+        sampler = asyncio.create_task(sample())
+        started = time.perf_counter()
+        jobs = [run_bot(client, index, args, recorder, paths, measure) for index in range(args.bots)]
+        if websockets is not None:
+            jobs += [run_room(client, index, args, recorder, websockets) for index in range(args.rooms)]
+        await asyncio.gather(*jobs)
+        duration = time.perf_counter() - started
+        finished.set()
+        await sampler
+        final = (await client.get(METRICS_PATH)).json()
+
+    total = sum(len(samples) for samples in recorder.latencies.values())
+    games = peak["active_games"]
+    return {
+        "server": os.path.basename(os.path.abspath(args.app_dir)),
+        "config": {key: value for key, value in vars(args).items() if key not in ("command", "base_url")},
+        "duration_seconds": round(duration, 3),
+        "throughput_per_second": round(total / duration, 2),
+        "endpoints": recorder.report(duration),
+        "event_loop_lag_seconds": final["loop_lag_seconds"],
+        "memory": {
+            "baseline_rss_bytes": baseline["rss_bytes"],
+            "peak_active_games": games,
+            "rss_at_peak_bytes": peak["rss_bytes"],
+            "rss_per_active_game_bytes": (peak["rss_bytes"] - baseline["rss_bytes"]) // games if games else None,
+            "final_rss_bytes": final["rss_bytes"],
+        },
+    }
+
+def run(args):
+    args.base_url = f"http://127.0.0.1:{args.port}"
+    log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "serve", "--app-dir", args.app_dir, "--port", str(args.port),
+         "--stub-port", str(args.stub_port), "--llm-latency", args.llm_latency],
+        stdout=log, stderr=subprocess.STDOUT,
+    )
+    try:
+        deadline = time.time() + 60
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"The server exited with code {server.returncode}; see --server-log.")
+            try:
+                if httpx.get(f"{args.base_url}{METRICS_PATH}", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > deadline:
+                raise RuntimeError("The server did not start within 60 seconds.")
+            time.sleep(0.25)
+
+        report = asyncio.run(drive(args))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of a game server with bot players.")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "serve"])
+    parser.add_argument("--app-dir", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Server directory containing main.py (any of the three server variants).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--stub-port", type=int, default=DEFAULT_STUB_PORT)
+    parser.add_argument("--llm-latency", default="", help='Stub LLM delay, e.g. "fixed:0.2" or "lognormal:-1,0.5".')
+    parser.add_argument("--bots", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=8, help="Interact calls per bot.")
+    parser.add_argument("--turns-per-villager", type=int, default=3)
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max random pause between a bot's turns (seconds).")
+    parser.add_argument("--difficulty", default="medium")
+    parser.add_argument("--rooms", type=int, default=5)
+    parser.add_argument("--room-players", type=int, default=2)
+    parser.add_argument("--moves", type=int, default=50, help="Move messages per room player.")
+    parser.add_argument("--move-interval", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report to this file.")
+    parser.add_argument("--server-log", help="File for the server's output (discarded by default).")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args)
+    else:
+        run(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,44 @@
 # main.py
 # This script runs the FastAPI server, exposing the game engine through API endpoints.
 
+import asyncio
+import hashlib
+import hmac
 import os
+import re
 import traceback
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import uuid
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
 from schemas import *
 import json
 from game_logic.engine import GameEngine
-from game_logic.state_manager import GameState
+from game_logic.state_manager import GameState, PlayerSession
+from game_logic.world_pool import WorldPool, parse_pool_keys
+from game_logic.single_flight import SingleFlight
+from game_logic.quest_index import quest_index
+from game_logic.game_store import GameStore
+from game_logic.persistence import GamePersistence
+from game_logic.state_backend import create_backend
+from game_logic.cluster import ClusterRouter
+from game_logic.snapshot import MEDIA_TYPE, dump_game, load_game
+from config import WORLD_POOL_SIZE, WORLD_POOL_KEYS, WORLD_POOL_PATH, WORLD_POOL_MAX_BUILDS
+from config import (
+    GAME_STORE_MAX_GAMES, GAME_STORE_MAX_BYTES, GAME_IDLE_TTL_SECONDS,
+    GAME_SPILL_TTL_SECONDS, GAME_STORE_SWEEP_SECONDS,
+    GAME_DB_PATH, GAME_DB_COMMIT_INTERVAL_SECONDS, GAME_DB_SNAPSHOT_EVERY_TURNS, GAME_DB_RETENTION_SECONDS,
+    STATE_BACKEND, STATE_BACKEND_URL, CLUSTER_NODES, CLUSTER_SELF_URL, CLUSTER_VNODES, CLUSTER_SECRET,
+    ADMIN_TOKEN, DRAIN_PEER_URL, DRAIN_ON_SHUTDOWN,
+)
 # Import our new Hedera service function
 from hedera_service import hedera_service
 from mirror_node_service import mirror_service
+from hcs_service import hcs_service
 # -------------------------
 
 app = FastAPI()
@@ -36,21 +59,145 @@ app.add_middleware(
 
 # Initialize the game engine
 game_engine = None
+# Pre-generated worlds for /game/new; None when WORLD_POOL_SIZE is 0
+world_pool: Optional[WorldPool] = None
+
+# Games, rooms and login records outside this worker's memory (see STATE_BACKEND)
+state_backend = create_backend(STATE_BACKEND, STATE_BACKEND_URL)
+# Which node owns each game and room (see CLUSTER_NODES)
+cluster = ClusterRouter(CLUSTER_NODES, CLUSTER_SELF_URL, CLUSTER_VNODES, secret=CLUSTER_SECRET)
+
+# Paths served by the node owning the game or room in them; /game/new is served by any node
+_OWNED_PATH = re.compile(r"^/(?:game|rooms)/([^/]+)(?:/|$)")
+# Paths that start a new game or room, sent to the drain peer once this node is draining
+_NEW_ENTRY_PATHS = ("/game/new", "/create_room")
+
+# The peer /admin/drain is moving this node's games to, games and rooms already moved there
+# (id -> peer URL) and games whose move is in progress
+draining: Optional[str] = None
+migrated: Dict[str, str] = {}
+_migrating = set()
 
-# In-memory storage for user login tracking
-user_login_history = {}
+@app.middleware("http")
+async def route_to_owner(request: Request, call_next):
+    """
+    With CLUSTER_NODES set, forwards requests for a game or room owned by another node to that node.
+    Requests for games and rooms drained to a peer, and new games while draining, go to the peer.
+    """
+    if draining and request.url.path in _NEW_ENTRY_PATHS:
+        return await cluster.forward(request, draining)
+    match = _OWNED_PATH.match(request.url.path)
+    if match and match.group(1) in migrated:
+        return await cluster.forward(request, migrated[match.group(1)])
+    if not cluster.enabled:
+        match = None
+    if match and match.group(1) != "new" and not cluster.is_forwarded(request.headers):
+        owner = cluster.owner(match.group(1))
+        if owner != cluster.self_url:
+            return await cluster.forward(request, owner)
+    return await call_next(request)
+
+# Duplicate in-flight requests (double-clicks, client retries, simultaneous start_game
+# presses) share one execution instead of each calling the LLM.
+interact_flights = SingleFlight()
+room_start_flights = SingleFlight()
 
 @app.on_event("startup")
 async def startup_event():
-    global game_engine
+    global game_engine, world_pool
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         raise RuntimeError("GOOGLE_API_KEY environment variable is required")
     game_engine = GameEngine(api_key)
+    game_engine.turn_log = shared_turn_log or persistence
+    
+    if WORLD_POOL_SIZE > 0:
+        world_pool = WorldPool(
+            game_engine,
+            target_size=WORLD_POOL_SIZE,
+            keys=parse_pool_keys(WORLD_POOL_KEYS),
+            path=WORLD_POOL_PATH,
+            max_concurrent_builds=WORLD_POOL_MAX_BUILDS
+        )
+        await world_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if DRAIN_ON_SHUTDOWN and DRAIN_PEER_URL:
+        await _drain(DRAIN_PEER_URL)
+    if world_pool:
+        await world_pool.stop()
+    if game_engine:
+        game_engine.close()
+    if persistence:
+        persistence.close()
+    await cluster.aclose()
+    if shared_turn_log:
+        await shared_turn_log.flush()
+    state_backend.close()
+
+def _on_game_evicted(game_id: str):
+    # An evicted game's cached responses are unlikely to be hit again before it is.
+    if game_engine:
+        game_engine.response_cache.invalidate_game(game_id)
+
+class _SharedTurnLog:
+    """Writes a game through to the shared backend after every applied turn, off the event loop."""
+
+    def __init__(self):
+        self._writes = set()
+
+    def log_turn(self, game_state: GameState, *args, **kwargs):
+        task = asyncio.create_task(active_games.asave(game_state.game_id))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def flush(self):
+        await asyncio.gather(*self._writes, return_exceptions=True)
 
-# Store active games and rooms
-active_games: Dict[str, any] = {}
-multiplayer_rooms: Dict[str, dict] = {}
+# Snapshots and turn logs of every game, so games survive a restart; None when GAME_DB_PATH is empty.
+# A shared backend already holds every game as of its last turn, so it needs no turn log.
+persistence: Optional[GamePersistence] = None
+if GAME_DB_PATH and not state_backend.shared:
+    persistence = GamePersistence(
+        GAME_DB_PATH,
+        commit_interval=GAME_DB_COMMIT_INTERVAL_SECONDS,
+        snapshot_every=GAME_DB_SNAPSHOT_EVERY_TURNS,
+        retention=GAME_DB_RETENTION_SECONDS
+    )
+shared_turn_log: Optional[_SharedTurnLog] = _SharedTurnLog() if state_backend.shared else None
+
+# Store active games and rooms; idle ones are spilled to the state backend and loaded back on their
+# next request. A game found in neither place is recovered from the database.
+active_games = GameStore(
+    "game",
+    state_backend,
+    serialize=GameState.to_dict,
+    deserialize=GameState.from_dict,
+    max_entries=GAME_STORE_MAX_GAMES,
+    max_bytes=GAME_STORE_MAX_BYTES,
+    idle_ttl=GAME_IDLE_TTL_SECONDS,
+    disk_ttl=GAME_SPILL_TTL_SECONDS,
+    sweep_interval=GAME_STORE_SWEEP_SECONDS,
+    # A player with a turn in flight still holds a reference to the game
+    is_busy=lambda game_id, game_state: any(session.lock.locked() for session in game_state.sessions.values()),
+    on_evict=_on_game_evicted,
+    sizeof=lambda game_state: game_state.memory_usage()["total"],
+    fallback=persistence.load if persistence else None
+)
+multiplayer_rooms = GameStore(
+    "room",
+    state_backend,
+    serialize=dict,
+    deserialize=dict,
+    max_entries=GAME_STORE_MAX_GAMES,
+    max_bytes=GAME_STORE_MAX_BYTES,
+    idle_ttl=GAME_IDLE_TTL_SECONDS,
+    disk_ttl=GAME_SPILL_TTL_SECONDS,
+    sweep_interval=GAME_STORE_SWEEP_SECONDS,
+    # Rooms with players connected are still in use
+    is_busy=lambda room_id, room: bool(manager.active_connections.get(room_id))
+)
 
 class ConnectionManager:
     def __init__(self):
@@ -168,14 +315,22 @@ manager = ConnectionManager()
 
 @app.post("/game/new", response_model=NewGameResponse)
 async def create_new_game(request: NewGameRequest):
-    game_id = str(uuid.uuid4())
+    # Owned by this node, so the game's later requests come back here
+    game_id = cluster.local_id(lambda: str(uuid.uuid4()))
     try:
-        game_state = game_engine.start_new_game(
-            game_id=game_id,
-            num_inaccessible_locations=request.num_inaccessible_locations,
-            difficulty=request.difficulty
-        )
-        active_games[game_id] = game_state
+        game_state = None
+        if world_pool:
+            game_state = world_pool.claim(game_id, request.difficulty, request.num_inaccessible_locations)
+        if game_state is None:
+            # Pool disabled or empty for these settings: generate the world live
+            game_state = await game_engine.start_new_game(
+                game_id=game_id,
+                num_inaccessible_locations=request.num_inaccessible_locations,
+                difficulty=request.difficulty
+            )
+        await active_games.aset(game_id, game_state)
+        if persistence:
+            persistence.save_snapshot(game_state)
         
         initial_villagers = [
             {"id": f"villager_{i}", "title": v["title"]} 
@@ -192,72 +347,64 @@ async def create_new_game(request: NewGameRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to generate new game: {e}")
 
+def _prepare_interaction(game_state: GameState, request: InteractRequest):
+    """Resolves the villager and the requesting player's session for an interaction."""
+    villager_index = int(request.villager_id.split('_')[1])
+    if not (0 <= villager_index < len(game_state.villagers)):
+        raise HTTPException(status_code=400, detail="Invalid villager ID.")
+        
+    villager_name = game_state.villagers[villager_index]["name"]
+    
+    # Each player of a multiplayer game has their own session; none are added while the game is being drained
+    player_key = request.player_id if hasattr(request, 'player_id') and request.player_id else "single_player"
+    if player_key not in game_state.sessions:
+        _check_not_migrating(game_state.game_id)
+    session = game_state.session(player_key)
+    
+    player_input = request.player_prompt if request.player_prompt is not None else "I'd like to talk."
+    return villager_name, session, player_input
+
+def _frustration(game_state: GameState, session: PlayerSession, villager_name: str) -> dict:
+    """How stuck the player is with this villager; read under session.lock so it sees the previous turn."""
+    progress = quest_index(game_state).progress(session.state)
+    return {"friends": progress.friends_mentioned(villager_name, session.memory.get(villager_name, []))}
+
+def _interaction_key(game_id: str, player_key: str, villager_name: str, player_input: str):
+    return (game_id, player_key, villager_name, hashlib.sha1(player_input.encode("utf-8")).hexdigest())
+
+def _interaction_complete_event(request: InteractRequest, villager_name: str, session: PlayerSession, dialogue_data: dict) -> dict:
+    return {
+        "type": "interaction_complete",
+        "villager_id": request.villager_id,
+        "villager_name": villager_name,
+        "npc_dialogue": dialogue_data["npc_dialogue"],
+        "player_suggestions": dialogue_data["player_responses"],
+        "node_revealed_id": dialogue_data.get("node_revealed_id"),
+        "familiarity_level": session.state["familiarity"].get(villager_name, 0),
+    }
+
 @app.post("/game/{game_id}/interact", response_model=InteractResponse)
 async def interact(game_id: str, request: InteractRequest):
-    if game_id not in active_games:
+    game_state = await active_games.aget(game_id)
+    if game_state is None:
         raise HTTPException(status_code=404, detail="Game not found")
     
-    game_state = active_games[game_id]
-    
     try:
-        villager_index = int(request.villager_id.split('_')[1])
-        if not (0 <= villager_index < len(game_state.villagers)):
-            raise HTTPException(status_code=400, detail="Invalid villager ID.")
-            
-        villager_name = game_state.villagers[villager_index]["name"]
-        
-        # Create individual player state key for multiplayer
-        player_key = request.player_id if hasattr(request, 'player_id') and request.player_id else "single_player"
-        
-        # Initialize player-specific states if they don't exist
-        if not hasattr(game_state, 'multiplayer_states'):
-            game_state.multiplayer_states = {}
-        
-        if player_key not in game_state.multiplayer_states:
-            game_state.multiplayer_states[player_key] = {
-                "discovered_nodes": [],
-                "knowledge_summary": "You've just woken up in a cozy cottage...",
-                "familiarity": {v["name"]: 0 for v in game_state.villagers},
-                "unproductive_turns": {v["name"]: 0 for v in game_state.villagers}
-            }
-        
-        if not hasattr(game_state, 'multiplayer_memories'):
-            game_state.multiplayer_memories = {}
-        
-        if player_key not in game_state.multiplayer_memories:
-            game_state.multiplayer_memories[player_key] = {v["name"]: [] for v in game_state.villagers}
-        
-        # Use player-specific state for interaction
-        player_state = game_state.multiplayer_states[player_key]
-        player_memory = game_state.multiplayer_memories[player_key]
-        
-        frustration = {"friends": len([
-            msg for msg in player_memory.get(villager_name, [])
-            if msg.get("content") and "friend" in msg.get("content").lower()
-        ])}
-        
-        player_input = request.player_prompt if request.player_prompt is not None else "I'd like to talk."
+        villager_name, session, player_input = _prepare_interaction(game_state, request)
         
-        # Temporarily replace game_state's player_state and full_npc_memory for this interaction
-        original_player_state = game_state.player_state
-        original_memory = game_state.full_npc_memory
-        
-        game_state.player_state = player_state
-        game_state.full_npc_memory = player_memory
+        async def run_turn():
+            # Only this player's turns are serialized; other players of the game go ahead in parallel
+            async with session.lock:
+                _check_not_migrating(game_id)
+                frustration = _frustration(game_state, session, villager_name)
+                return await game_engine.process_interaction_turn(
+                    game_state, session, villager_name, player_input, frustration
+                )
         
-        try:
-            dialogue_data = game_engine.process_interaction_turn(
-                game_state, villager_name, player_input, frustration
-            )
-            
-            # Update the player-specific states
-            game_state.multiplayer_states[player_key] = game_state.player_state
-            game_state.multiplayer_memories[player_key] = game_state.full_npc_memory
-            
-        finally:
-            # Restore original states
-            game_state.player_state = original_player_state
-            game_state.full_npc_memory = original_memory
+        # A double-click or retry of the same turn shares the result of the one in flight
+        dialogue_data = await interact_flights.run(
+            _interaction_key(game_id, session.player_key, villager_name, player_input), run_turn
+        )
         
         return InteractResponse(
             villager_id=request.villager_id,
@@ -265,25 +412,85 @@ async def interact(game_id: str, request: InteractRequest):
             npc_dialogue=dialogue_data["npc_dialogue"],
             player_suggestions=dialogue_data["player_responses"]
         )
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error processing interaction: {e}")
 
+async def _stream_interaction_events(game_id: str, game_state: GameState, request: InteractRequest):
+    """
+    Runs one interaction turn in streaming mode and yields client events:
+    "npc_dialogue_delta" for each piece of dialogue text as it is generated,
+    then "interaction_complete" with the suggestions, revealed node and
+    familiarity once the turn has been applied, or "error" if it failed.
+    A duplicate of a turn already in flight only gets its "interaction_complete".
+    """
+    flight = None
+    try:
+        villager_name, session, player_input = _prepare_interaction(game_state, request)
+        flight_key = _interaction_key(game_id, session.player_key, villager_name, player_input)
+        
+        in_flight = interact_flights.join(flight_key)
+        if in_flight is not None:
+            dialogue_data = await SingleFlight.wait(in_flight)
+            yield _interaction_complete_event(request, villager_name, session, dialogue_data)
+            return
+        
+        flight = interact_flights.lead(flight_key)
+        async with session.lock:
+            _check_not_migrating(game_id)
+            frustration = _frustration(game_state, session, villager_name)
+            async for event_type, payload in game_engine.stream_interaction_turn(
+                game_state, session, villager_name, player_input, frustration
+            ):
+                if event_type == "dialogue":
+                    yield {"type": "npc_dialogue_delta", "villager_id": request.villager_id, "delta": payload}
+                    continue
+                
+                flight.set_result(payload)
+                yield _interaction_complete_event(request, villager_name, session, payload)
+    except Exception as e:
+        if flight is not None and not flight.done():
+            flight.set_exception(e)
+        traceback.print_exc()
+        detail = e.detail if isinstance(e, HTTPException) else f"Error processing interaction: {e}"
+        yield {"type": "error", "villager_id": request.villager_id, "message": detail}
+    finally:
+        # The client disconnected before the turn completed
+        if flight is not None and not flight.done():
+            flight.cancel()
+
+@app.post("/game/{game_id}/interact/stream")
+async def interact_stream(game_id: str, request: InteractRequest):
+    """Server-Sent Events variant of /interact that pushes npc_dialogue while it is being generated."""
+    game_state = await active_games.aget(game_id)
+    if game_state is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    
+    async def event_source():
+        async for event in _stream_interaction_events(game_id, game_state, request):
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/game/{game_id}/guess", response_model=GuessResponse)
 async def guess(game_id: str, request: GuessRequest):
-    if game_id not in active_games:
+    game_state = await active_games.aget(game_id)
+    if game_state is None:
         raise HTTPException(status_code=404, detail="Game not found")
-    
-    game_state = active_games[game_id]
     is_correct = request.location_name == game_state.correct_location
     
     # Use player-specific state for ending calculation
     player_key = request.player_id if hasattr(request, 'player_id') and request.player_id else "single_player"
-    player_state = game_state.multiplayer_states.get(player_key, game_state.player_state)
+    # A guess never adds a player to the game; one who hasn't talked to anyone is scored on a fresh, unsaved session
+    session = game_state.sessions.get(player_key) or PlayerSession.new(player_key, game_state.villagers)
     
-    key_clues = [node['node_id'] for node in game_state.quest_network.get('nodes', []) if node.get('key_clue')]
-    discovered_key_clues = [node_id for node_id in player_state['discovered_nodes'] if node_id in key_clues]
-    is_true_ending = len(discovered_key_clues) == len(key_clues)
+    is_true_ending = quest_index(game_state).found_all_key_clues(session.state)
 
     message = ""
     if is_correct:
@@ -294,6 +501,10 @@ async def guess(game_id: str, request: GuessRequest):
             message += "You never fully understood why they were taken. YOU WIN, BUT THE MYSTERY REMAINS..."
     else:
         message = f"You find nothing but silence and dust at {request.location_name}. Your friends are gone forever. The correct location was {game_state.correct_location}. GAME OVER."
+    
+    if player_key == "single_player":
+        # The game is over, so its cached responses can't be hit again
+        game_engine.response_cache.invalidate_game(game_id)
 
     return GuessResponse(
         message=message,
@@ -302,8 +513,164 @@ async def guess(game_id: str, request: GuessRequest):
         story=message
     )
 
+# --- ADMIN ENDPOINTS: GAME EXPORT/IMPORT AND DRAINING ---
+
+def _require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def _check_not_migrating(game_id: str):
+    """Called holding a player's lock: a game being drained to a peer takes no more turns here."""
+    if game_id in _migrating or game_id in migrated:
+        raise HTTPException(status_code=503, detail="This game is moving to another server, try again in a moment", headers={"Retry-After": "1"})
+
+async def _game_rooms(game_id: str) -> list:
+    rooms = [await multiplayer_rooms.aget(room_id) for room_id in multiplayer_rooms.resident()]
+    return [room for room in rooms if room and room.get("game_id") == game_id]
+
+@app.get("/admin/game/{game_id}/export")
+async def export_game(game_id: str, request: Request):
+    """The game and its multiplayer rooms as a binary snapshot (see game_logic/snapshot.py), for /admin/game/import on another node."""
+    _require_admin(request)
+    game_state = await active_games.aget(game_id)
+    if game_state is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    data = dump_game(game_state, await _game_rooms(game_id))
+    return Response(content=data, media_type=MEDIA_TYPE, headers={"Content-Disposition": f'attachment; filename="{game_id}.twgs"'})
+
+@app.post("/admin/game/import")
+async def import_game(request: Request, replace: bool = False):
+    """
+    Takes a snapshot from /admin/game/{game_id}/export as the request body and serves the game from this node.
+    With `replace`, a game (and rooms) already here are overwritten, for a migration sending a newer export.
+    """
+    _require_admin(request)
+    try:
+        game_state, rooms = load_game(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    game_id = game_state.game_id
+    if not replace and await active_games.aget(game_id) is not None:
+        raise HTTPException(status_code=409, detail=f"Game {game_id} already exists on this node")
+
+    await active_games.aset(game_id, game_state)
+    if persistence:
+        persistence.save_snapshot(game_state)
+    for room in rooms:
+        if room.get("id") and (replace or await multiplayer_rooms.aget(room["id"]) is None):
+            await multiplayer_rooms.aset(room["id"], room)
+
+    print(f"✅ Imported game {game_id} with {len(game_state.sessions)} players and {len(rooms)} rooms.")
+    return {"status": "imported", "game_id": game_id, "players": len(game_state.sessions), "rooms": [room.get("id") for room in rooms]}
+
+def _game_version(game_state: GameState) -> tuple:
+    """Changes whenever a player joins the game, a turn is applied or a conversation summary is folded."""
+    return tuple(
+        (
+            player_key,
+            sum(len(log) for log in session.memory.values()),
+            sum(entry.get("folded", 0) for entry in session.state.get("npc_summaries", {}).values()),
+        )
+        for player_key, session in game_state.sessions.items()
+    )
+
+async def _migrate_game(client, game_id: str, peer: str, max_exports: int = 3) -> bool:
+    """
+    Moves one resident game and its rooms to `peer`. Every player's lock is
+    held while the game is exported, so no turn is half applied; turns queued
+    behind them, and players joining, get a 503 and their retry is forwarded
+    to the peer. If the game still changed while the export was being sent
+    (e.g. a summary fold finished), it is exported again over the first one;
+    the peer replaces any copy it has, e.g. from an earlier failed drain.
+    """
+    import httpx
+
+    game_state = await active_games.aget(game_id)
+    if game_state is None:
+        return False
+    _migrating.add(game_id)
+    locked = {}
+    try:
+        for _ in range(max_exports):
+            for player_key, session in list(game_state.sessions.items()):
+                if player_key not in locked:
+                    await session.lock.acquire()
+                    locked[player_key] = session.lock
+            version = _game_version(game_state)
+            rooms = await _game_rooms(game_id)
+            try:
+                response = await client.post(
+                    f"{peer}/admin/game/import",
+                    params={"replace": "true"},
+                    content=dump_game(game_state, rooms),
+                    headers={"Content-Type": MEDIA_TYPE, "X-Admin-Token": ADMIN_TOKEN},
+                )
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                print(f"--- WARNING: Could not migrate game {game_id} to {peer}. Error: {e} ---")
+                return False
+            if _game_version(game_state) == version:
+                break
+        else:
+            print(f"--- WARNING: Game {game_id} kept changing while being migrated to {peer}; keeping it here. ---")
+            return False
+
+        migrated[game_id] = peer
+        active_games.discard(game_id)
+        if persistence:
+            persistence.delete(game_id)
+        for room in rooms:
+            migrated[room["id"]] = peer
+            multiplayer_rooms.discard(room["id"])
+            # Players reconnect, and their new sockets are relayed to the peer
+            for connection in manager.active_connections.pop(room["id"], []):
+                try:
+                    await connection["websocket"].close(code=1012)
+                except RuntimeError:
+                    pass
+        return True
+    finally:
+        _migrating.discard(game_id)
+        for lock in locked.values():
+            lock.release()
+
+async def _drain(peer: str) -> dict:
+    """Moves every resident game to `peer`; from now on new games are created there too."""
+    global draining
+    import httpx
+
+    draining = peer
+    if state_backend.shared:
+        # Every game is already in the shared backend, which the peer reads too
+        return {"status": "drained", "peer": peer, "migrated": [], "failed": []}
+
+    moved, failed = [], []
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        for game_id in active_games.resident():
+            (moved if await _migrate_game(client, game_id, peer) else failed).append(game_id)
+    print(f"--- Drained {len(moved)} games to {peer}; {len(failed)} could not be moved. ---")
+    return {"status": "drained" if not failed else "partial", "peer": peer, "migrated": moved, "failed": failed}
+
+@app.post("/admin/drain")
+async def drain(request: Request, peer: Optional[str] = None):
+    """Migrates all resident games to `peer` (default DRAIN_PEER_URL), e.g. before taking this node down."""
+    _require_admin(request)
+    peer = (peer or DRAIN_PEER_URL).rstrip("/")
+    if not peer:
+        raise HTTPException(status_code=400, detail="No peer to drain to: pass ?peer= or set DRAIN_PEER_URL")
+    return await _drain(peer)
+
 # --- CHEST ENDPOINTS FOR RUNE TOKEN SYSTEM ---
 
+async def _login_record(account_id: str) -> dict:
+    """The account's login tracking (bonus claims, ISO timestamps), shared by every node."""
+    return await asyncio.to_thread(state_backend.get, "login", account_id) or {}
+
+async def _save_login_record(account_id: str, user_data: dict):
+    await asyncio.to_thread(state_backend.put, "login", account_id, user_data)
+
 @app.get("/balance/{account_id}")
 async def get_balance(account_id: str):
     """Get the Rune Token balance for a specific Hedera account"""
@@ -325,18 +692,17 @@ async def welcome_chest(request: OpenChestRequest):
     """Send 250 Rune tokens as a first-time login bonus"""
     try:
         # Check if user has already received welcome bonus
-        if request.player_account_id in user_login_history:
-            if user_login_history[request.player_account_id].get('welcome_bonus_claimed', False):
-                raise HTTPException(status_code=400, detail="Welcome bonus already claimed")
-        else:
-            user_login_history[request.player_account_id] = {}
+        if (await _login_record(request.player_account_id)).get('welcome_bonus_claimed', False):
+            raise HTTPException(status_code=400, detail="Welcome bonus already claimed")
         
         result = await hedera_service.send_welcome_bonus(request.player_account_id)
         
         if result['status'] == 'success':
             # Mark welcome bonus as claimed
-            user_login_history[request.player_account_id]['welcome_bonus_claimed'] = True
-            user_login_history[request.player_account_id]['first_login'] = datetime.now()
+            user_data = await _login_record(request.player_account_id)
+            user_data['welcome_bonus_claimed'] = True
+            user_data['first_login'] = datetime.now().isoformat()
+            await _save_login_record(request.player_account_id, user_data)
             
             return {
                 "status": "success",
@@ -360,16 +726,12 @@ async def daily_chest(request: OpenChestRequest):
     try:
         current_time = datetime.now()
         
-        # Check if user exists in login history
-        if request.player_account_id not in user_login_history:
-            user_login_history[request.player_account_id] = {}
-        
-        user_data = user_login_history[request.player_account_id]
+        user_data = await _login_record(request.player_account_id)
         last_daily = user_data.get('last_daily_claim')
         
         # Check if 24 hours have passed since last daily reward
         if last_daily:
-            time_since_last = current_time - last_daily
+            time_since_last = current_time - datetime.fromisoformat(last_daily)
             if time_since_last < timedelta(hours=24):
                 hours_remaining = 24 - time_since_last.total_seconds() / 3600
                 raise HTTPException(
@@ -381,7 +743,9 @@ async def daily_chest(request: OpenChestRequest):
         
         if result['status'] == 'success':
             # Update last daily claim time
-            user_login_history[request.player_account_id]['last_daily_claim'] = current_time
+            user_data = await _login_record(request.player_account_id)
+            user_data['last_daily_claim'] = current_time.isoformat()
+            await _save_login_record(request.player_account_id, user_data)
             
             return {
                 "status": "success",
@@ -512,11 +876,12 @@ async def get_network_analytics():
         current_time = datetime.now()
         
         # Mock game statistics (in production, store these in database)
+        login_records = await asyncio.to_thread(state_backend.values, "login")
         game_stats = {
-            "active_players_today": len(user_login_history),
-            "total_games_played": sum(1 for user_data in user_login_history.values() 
+            "active_players_today": len(login_records),
+            "total_games_played": sum(1 for user_data in login_records 
                                     if user_data.get('games_played', 0) > 0),
-            "total_rewards_distributed": calculate_total_rewards_distributed(),
+            "total_rewards_distributed": calculate_total_rewards_distributed(login_records),
             "average_session_time": "25.3 minutes",  # Mock data
             "top_performing_players": get_top_players()  # Mock data
         }
@@ -549,14 +914,14 @@ def get_transaction_description(amount: int, tx_type: str) -> str:
     else:
         return f"Sent {abs(amount)} Rune Tokens"
 
-def calculate_total_rewards_distributed() -> int:
+def calculate_total_rewards_distributed(login_records: list) -> int:
     """Calculate total rewards distributed (mock implementation)"""
     # In production, query Mirror Node for all Rune token distributions
     return sum(
         (250 if user_data.get('welcome_bonus_claimed') else 0) +
         (user_data.get('daily_rewards_claimed', 0) * 125) +  # Average daily reward
         (user_data.get('victory_rewards_claimed', 0) * 1500)  # Average victory reward
-        for user_data in user_login_history.values()
+        for user_data in login_records
     )
 
 def get_top_players() -> list:
@@ -736,24 +1101,60 @@ async def ping():
     """Health check endpoint"""
     return {"message": "Server is running", "timestamp": datetime.now().isoformat()}
 
+@app.get("/health/games")
+async def games_health():
+    """Resident count, size and evictions of the active game and room stores, persistence activity and cluster routing"""
+    return {
+        "games": await active_games.ahealth(),
+        "rooms": await multiplayer_rooms.ahealth(),
+        "persistence": persistence.health() if persistence else {"status": "disabled"},
+        "cluster": cluster.health(),
+        "drain": {"peer": draining, "migrated": len(migrated), "in_progress": len(_migrating)},
+    }
+
+@app.get("/health/world-pool")
+async def world_pool_health():
+    """Fill level and hit rate of the pre-generated world pool"""
+    if not world_pool:
+        return {"status": "disabled"}
+    return {"status": "enabled", **world_pool.health()}
+
+@app.get("/health/llm")
+async def llm_health():
+    """Estimated prompt sizes per LLM prompt type, backend latency and routing, and how many turns skipped the LLM"""
+    return {
+        "status": "success",
+        "prompt_stats": game_engine.llm_api.prompt_stats,
+        "router": game_engine.llm_api.health(),
+        "outputs": game_engine.outputs.health(),
+        "fast_path": game_engine.fast_path.health(),
+        "response_cache": game_engine.response_cache.health(),
+        "speculation": game_engine.speculator.health(),
+        "opening_turns": game_engine.opening_stats,
+        "single_flight": {
+            "interact": interact_flights.health(),
+            "start_game": room_start_flights.health(),
+        },
+    }
+
 @app.post("/create_room")
 async def create_room():
-    room_id = str(uuid.uuid4())[:8]
-    multiplayer_rooms[room_id] = {
+    room_id = cluster.local_id(lambda: str(uuid.uuid4())[:8])
+    await multiplayer_rooms.aset(room_id, {
         "id": room_id,
         "players": [],
         "game_id": None,
         "started": False,
         "winner": None
-    }
+    })
     return {"room_id": room_id, "status": "created"}
 
 @app.get("/rooms/{room_id}")
 async def get_room(room_id: str):
-    if room_id not in multiplayer_rooms:
+    room = await multiplayer_rooms.aget(room_id)
+    if room is None:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    room = multiplayer_rooms[room_id]
     players = manager.get_room_players(room_id)
     
     return {
@@ -766,23 +1167,34 @@ async def get_room(room_id: str):
 
 @app.websocket("/ws/{room_id}/{player_id}")
 async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str):
+    if room_id in migrated:
+        await websocket.accept()
+        await cluster.relay_websocket(websocket, migrated[room_id])
+        return
+    if not cluster.is_local(room_id) and not cluster.is_forwarded(websocket.headers):
+        # A room's sockets all live on the node that owns it, so broadcasts reach every player
+        await websocket.accept()
+        await cluster.relay_websocket(websocket, cluster.owner(room_id))
+        return
+    
     player_name = f"Player_{player_id[:8]}"
     await manager.connect(websocket, room_id, player_id, player_name)
     
     # Update the room's player list with unique players only
-    if room_id in multiplayer_rooms:
-        room = multiplayer_rooms[room_id]
+    room = await multiplayer_rooms.aget(room_id)
+    if room is not None:
         # Remove any existing entries for this player
         room["players"] = [p for p in room["players"] if p["id"] != player_id]
         # Add the player once
         room["players"].append({"id": player_id, "name": player_name})
+        await multiplayer_rooms.asave(room_id)
     
     try:
         # Send initial room state
         await websocket.send_text(json.dumps({
             "type": "room_joined",
             "players": manager.get_room_players(room_id),
-            "room": multiplayer_rooms.get(room_id, {})
+            "room": await multiplayer_rooms.aget(room_id, {})
         }))
         
         while True:
@@ -800,7 +1212,8 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
                 }, room_id, exclude_websocket=websocket)
                 
             elif message["type"] == "start_game":
-                if room_id in multiplayer_rooms and not multiplayer_rooms[room_id]["started"]:
+                room = await multiplayer_rooms.aget(room_id)
+                if room is not None and not room["started"]:
                     # Check if we have at least 2 unique players
                     unique_players = manager.get_room_players(room_id)
                     if len(unique_players) < 2:
@@ -810,27 +1223,56 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
                         }))
                         continue
                     
-                    # Create a shared game for all players in the room
-                    game_response = await create_new_game(NewGameRequest(difficulty="medium"))
-                    game_id = game_response.game_id
+                    async def start_room_game():
+                        # Create a shared game for all players in the room
+                        game_response = await create_new_game(NewGameRequest(difficulty="medium"))
+                        game_id = game_response.game_id
                     
-                    multiplayer_rooms[room_id]["game_id"] = game_id
-                    multiplayer_rooms[room_id]["started"] = True
+                        room = await multiplayer_rooms.aget(room_id)
+                        if room is None:
+                            return
+                        room["game_id"] = game_id
+                        room["started"] = True
+                        await multiplayer_rooms.asave(room_id)
                     
-                    # Notify all players in the room to start the game
-                    await manager.broadcast_to_room({
-                        "type": "game_started",
-                        "game_id": game_id,
-                        "game_data": {
+                        # Notify all players in the room to start the game
+                        await manager.broadcast_to_room({
+                            "type": "game_started",
                             "game_id": game_id,
-                            "inaccessible_locations": game_response.inaccessible_locations,
-                            "villagers": game_response.villagers
-                        }
-                    }, room_id)
+                            "game_data": {
+                                "game_id": game_id,
+                                "inaccessible_locations": game_response.inaccessible_locations,
+                                "villagers": game_response.villagers
+                            }
+                        }, room_id)
+                    
+                    # Players pressing start at the same moment share one game creation
+                    await room_start_flights.run(room_id, start_room_game)
+            
+            elif message["type"] == "interact":
+                # Streaming interaction over the room socket; events go to this player only
+                room = await multiplayer_rooms.aget(room_id)
+                game_state = await active_games.aget(room["game_id"]) if room and room.get("game_id") else None
+                if game_state is None:
+                    await websocket.send_text(json.dumps({
+                        "type": "error",
+                        "message": "Game has not started"
+                    }))
+                    continue
+                
+                interact_request = InteractRequest(
+                    villager_id=message["villager_id"],
+                    player_prompt=message.get("player_prompt"),
+                    player_id=player_id
+                )
+                async for event in _stream_interaction_events(room["game_id"], game_state, interact_request):
+                    await websocket.send_text(json.dumps(event))
             
             elif message["type"] == "game_won":
-                if room_id in multiplayer_rooms and not multiplayer_rooms[room_id].get("winner"):
-                    multiplayer_rooms[room_id]["winner"] = player_id
+                room = await multiplayer_rooms.aget(room_id)
+                if room is not None and not room.get("winner"):
+                    room["winner"] = player_id
+                    await multiplayer_rooms.asave(room_id)
                     
                     # Notify all players about the winner
                     await manager.broadcast_to_room({
@@ -843,9 +1285,10 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
         manager.disconnect(websocket, room_id, player_id)
         
         # Remove player from room
-        if room_id in multiplayer_rooms:
-            room = multiplayer_rooms[room_id]
+        room = await multiplayer_rooms.aget(room_id)
+        if room is not None:
             room["players"] = [p for p in room["players"] if p["id"] != player_id]
+            await multiplayer_rooms.asave(room_id)
         
         # Notify other players that this player left
         await manager.broadcast_to_room({
@@ -0,0 +1,7 @@
+# tests/conftest.py
+import pytest
+from game_fixtures import make_game
+
+@pytest.fixture
+def game_state():
+    return make_game()
@@ -0,0 +1,37 @@
+# tests/game_fixtures.py
+# A small two-villager game and a turn helper shared by the tests.
+
+from game_logic.state_manager import GameState
+
+VILLAGERS = [
+    {"name": "Mara", "title": "The Miller", "traits": ["kind"]},
+    {"name": "Tobias", "title": "The Smith", "traits": ["gruff"]},
+]
+
+def play_turn(game_state, player_key, npc_name, player_input, npc_dialogue, revealed_node_id=None):
+    """Applies a turn to the player's session the way the engine does, and returns the session."""
+    session = game_state.session(player_key)
+    session.memory[npc_name].append({"role": "player", "content": player_input})
+    session.memory[npc_name].append({"role": "npc", "content": npc_dialogue})
+    session.state["familiarity"][npc_name] = min(session.state["familiarity"][npc_name] + 1, 5)
+    session.state.setdefault("npc_suggestions", {})[npc_name] = [f"Ask {npc_name} more"]
+    if revealed_node_id:
+        session.state["discovered_nodes"].append(revealed_node_id)
+        session.state["knowledge_summary"] = f"You learned about {revealed_node_id}."
+    return session
+
+def make_game(game_id: str = "game-1") -> GameState:
+    game_state = GameState(game_id, "Medium")
+    game_state.correct_location = "Old Mine"
+    game_state.story_theme = "Lanterns in the fog"
+    game_state.inaccessible_locations = ["Old Mine", "Chapel Loft", "Sunken Well"]
+    game_state.villagers = [dict(villager) for villager in VILLAGERS]
+    game_state.quest_network = {"nodes": [
+        {"node_id": "node1", "villager_name": "Mara", "content": "Footprints lead north.", "type": "Information",
+         "priority": 3, "key_clue": True, "preconditions": [], "required_familiarity": None},
+        {"node_id": "node2", "villager_name": "Tobias", "content": "The mine key is missing.", "type": "Item",
+         "priority": 5, "key_clue": False, "preconditions": ["node1"], "required_familiarity": 2, "hint": "ask twice"},
+    ]}
+    game_state.dialogue_templates = {"Mara": {"HAS_LOCKED_CLUES": {"distant": [["Not now.", "Goodbye."]]}}}
+    game_state.opening_turns = {}
+    return game_state
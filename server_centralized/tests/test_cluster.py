@@ -0,0 +1,43 @@
+# tests/test_cluster.py
+import uuid
+from game_logic.cluster import FORWARDED_HEADER, ClusterRouter, HashRing
+
+NODES = ["http://10.0.0.1:8000", "http://10.0.0.2:8000", "http://10.0.0.3:8000"]
+KEYS = [f"game-{i}" for i in range(2000)]
+
+def test_keys_spread_over_nodes_and_only_move_to_an_added_node():
+    ring = HashRing(NODES, vnodes=64)
+    owners = {key: ring.owner(key) for key in KEYS}
+    counts = [list(owners.values()).count(node) for node in NODES]
+    assert min(counts) > len(KEYS) / len(NODES) / 2
+
+    grown = HashRing(NODES + ["http://10.0.0.4:8000"], vnodes=64)
+    moved = [key for key in KEYS if grown.owner(key) != owners[key]]
+    assert moved and all(grown.owner(key) == "http://10.0.0.4:8000" for key in moved)
+
+def test_every_node_agrees_on_the_owner():
+    routers = [ClusterRouter(NODES, node, vnodes=64) for node in NODES]
+    for key in KEYS[:200]:
+        assert sum(router.is_local(key) for router in routers) == 1
+        assert len({router.owner(key) for router in routers}) == 1
+
+def test_local_id_draws_ids_this_node_owns():
+    router = ClusterRouter(NODES, NODES[1] + "/", vnodes=64)
+    for _ in range(20):
+        assert router.owner(router.local_id(lambda: str(uuid.uuid4()))) == NODES[1]
+
+def test_routing_is_disabled_for_one_node_or_an_unknown_self():
+    for router in (ClusterRouter(NODES[:1], NODES[0], vnodes=64), ClusterRouter(NODES, "http://elsewhere", vnodes=64)):
+        assert not router.enabled
+        assert all(router.is_local(key) for key in KEYS[:50])
+
+def test_only_requests_carrying_the_secret_count_as_forwarded():
+    router = ClusterRouter(NODES, NODES[0], vnodes=64, secret="s3cret")
+    assert router.is_forwarded({FORWARDED_HEADER: "s3cret"})
+    assert not router.is_forwarded({FORWARDED_HEADER: "1"})
+    assert not router.is_forwarded({})
+    assert router._forward_headers() == {FORWARDED_HEADER: "s3cret"}
+
+    unsecured = ClusterRouter(NODES, NODES[0], vnodes=64)
+    assert not unsecured.is_forwarded({FORWARDED_HEADER: ""})
+    assert unsecured._forward_headers() == {}
@@ -0,0 +1,125 @@
+# tests/test_game_store.py
+import asyncio
+import pytest
+from game_logic.game_store import GameStore
+from game_logic.state_backend import FileBackend, InProcessBackend, SQLiteBackend
+
+def make_store(backend, **kwargs) -> GameStore:
+    options = dict(
+        serialize=dict, deserialize=dict, max_entries=100, max_bytes=10**9,
+        idle_ttl=3600, disk_ttl=3600, sweep_interval=3600,
+    )
+    options.update(kwargs)
+    return GameStore("game", backend, **options)
+
+@pytest.fixture(params=["memory", "file", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InProcessBackend()
+    if request.param == "file":
+        return FileBackend(str(tmp_path / "spill"))
+    return SQLiteBackend(str(tmp_path / "state.db"))
+
+def test_spills_least_recently_used_and_faults_back_in(backend):
+    evicted = []
+    store = make_store(backend, max_entries=2, on_evict=evicted.append)
+    store["a"] = {"turns": 1}
+    store["b"] = {"turns": 2}
+    assert store["a"] == {"turns": 1}  # a is now the most recently used
+    store["c"] = {"turns": 3}
+
+    assert store.resident() == ["a", "c"]
+    assert evicted == ["b"]
+    assert backend.get("game", "b") == {"turns": 2}
+    assert "b" in store and "missing" not in store
+
+    assert store["b"] == {"turns": 2}
+    assert store.stats["evictions"] == 2 and store.stats["faults"] == 1
+    assert len(store) == 2
+    if not backend.shared:
+        # Only the spilled copy lives in the backend, and a faulted-in entry leaves it.
+        assert not backend.exists("game", "b")
+
+def test_bounds_bytes_and_never_evicts_busy_entries(backend):
+    store = make_store(backend, max_bytes=25, sizeof=lambda value: value["size"],
+                       is_busy=lambda key, value: value.get("busy", False))
+    store["busy"] = {"size": 10, "busy": True}
+    store["idle"] = {"size": 10}
+    store["new"] = {"size": 10}
+    assert store.resident() == ["busy", "new"]
+    assert store.health()["resident_bytes"] == 20
+
+def test_sweep_expires_idle_entries(backend):
+    store = make_store(backend, idle_ttl=0, sweep_interval=0)
+    store["old"] = {"turns": 1}
+    store["new"] = {"turns": 2}
+    assert store.resident() == ["new"]
+    assert store.stats["expirations"] == 1
+    assert store["old"] == {"turns": 1}
+
+def test_pop_removes_the_stored_copy(backend):
+    store = make_store(backend, max_entries=1)
+    store["a"] = {"turns": 1}
+    store["b"] = {"turns": 2}
+    assert store.pop("a") == {"turns": 1}
+    assert "a" not in store and not backend.exists("game", "a")
+    assert store.pop("a", "gone") == "gone"
+    with pytest.raises(KeyError):
+        del store["a"]
+
+def test_fallback_supplies_unknown_keys():
+    store = make_store(InProcessBackend(), fallback=lambda key: {"from": "fallback"} if key == "durable" else None)
+    assert store.get("durable") == {"from": "fallback"}
+    assert store.resident() == ["durable"]
+    assert store.get("unknown") is None
+
+def test_shared_backend_reloads_entries_written_by_another_process(tmp_path):
+    path = str(tmp_path / "state.db")
+    mine, theirs = make_store(SQLiteBackend(path)), make_store(SQLiteBackend(path))
+    mine["game"] = {"turns": 1}
+    assert theirs["game"] == {"turns": 1}
+
+    theirs["game"]["turns"] = 2
+    theirs.save("game")
+    assert mine["game"] == {"turns": 2}
+    assert mine.stats["reloads"] == 1
+
+def test_shared_backend_keeps_a_busy_entry_in_memory(tmp_path):
+    path = str(tmp_path / "state.db")
+    mine = make_store(SQLiteBackend(path), is_busy=lambda key, value: value.get("busy", False))
+    theirs = make_store(SQLiteBackend(path))
+    mine["game"] = {"turns": 1, "busy": True}
+    theirs["game"] = {"turns": 5}
+    assert mine["game"] == {"turns": 1, "busy": True}
+
+def test_async_api_round_trips_and_spills(backend):
+    async def scenario():
+        store = make_store(backend, max_entries=1)
+        await store.aset("a", {"turns": 1})
+        await store.aset("b", {"turns": 2})
+        assert store.resident() == ["b"]
+        assert await store.aget("a") == {"turns": 1}
+        assert store.resident() == ["a"]
+        assert await store.aget("missing", "default") == "default"
+        health = await store.ahealth()
+        assert health["resident"] == 1 and health["spilled"] >= 1
+
+    asyncio.run(scenario())
+
+def test_asave_writes_the_entry_as_it_was_when_called(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+
+    async def scenario():
+        store = make_store(backend)
+        await store.aset("game", {"turns": 1})
+        entry = await store.aget("game")
+        entry["turns"] = 2
+        saving = asyncio.ensure_future(store.asave("game"))
+        await asyncio.sleep(0)
+        entry["turns"] = 3  # changed while the write is in flight
+        await saving
+        assert backend.get("game", "game") == {"turns": 2}
+        await store.asave("game")
+        assert backend.get("game", "game") == {"turns": 3}
+
+    asyncio.run(scenario())
@@ -0,0 +1,122 @@
+# tests/test_llm_router.py
+import asyncio
+import time
+from game_logic.llm_router import LLMRouter
+
+GOOD = '{"npc_dialogue": "hello"}'
+
+class FakeBackend:
+    """Answers every call with `answer` after `delay` seconds, or raises it if it's an exception."""
+
+    def __init__(self, answer=GOOD, delay=0.0):
+        self.answer = answer
+        self.delay = delay
+        self.calls = 0
+
+    def _result(self):
+        self.calls += 1
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return self.answer
+
+    def generate_content(self, prompt_type, context):
+        time.sleep(self.delay)
+        return self._result()
+
+    async def generate_content_async(self, prompt_type, context):
+        await asyncio.sleep(self.delay)
+        return self._result()
+
+class FakeStreamingBackend(FakeBackend):
+    def __init__(self, chunks):
+        super().__init__("".join(chunks))
+        self.chunks = chunks
+
+    async def stream_content(self, prompt_type, context):
+        for chunk in self.chunks:
+            yield chunk
+
+def make_router(backends, **kwargs) -> LLMRouter:
+    router = LLMRouter(backends, **kwargs)
+    router._random.random = lambda: 1.0  # never explore, so the order is deterministic
+    return router
+
+def measure(router, name, prompt_type, seconds, count=10, ok=True):
+    for _ in range(count):
+        router._record(name, prompt_type, seconds, ok)
+
+def test_ranks_measured_backends_by_median_latency():
+    router = make_router({"slow": FakeBackend(), "fast": FakeBackend()}, min_samples=5)
+    assert router._plan("Interaction")[0] == ["slow", "fast"]
+    measure(router, "slow", "Interaction", 2.0)
+    measure(router, "fast", "Interaction", 0.5)
+    assert router._plan("Interaction")[0] == ["fast", "slow"]
+    # Rankings are per prompt type.
+    assert router._plan("StoryGenerator")[0] == ["slow", "fast"]
+
+def test_unhealthy_backend_is_tried_last():
+    router = make_router({"flaky": FakeBackend(), "steady": FakeBackend()}, min_samples=5, max_error_rate=0.5)
+    measure(router, "flaky", "Interaction", 0.1, ok=False)
+    measure(router, "steady", "Interaction", 3.0)
+    assert router._plan("Interaction")[0] == ["steady", "flaky"]
+    assert router.health()["backends"]["flaky"]["healthy"] is False
+
+def test_fails_over_when_the_first_backend_answers_empty_or_raises():
+    for broken in (FakeBackend("{}"), FakeBackend(RuntimeError("transport down"))):
+        backup = FakeBackend()
+        router = make_router({"primary": broken, "backup": backup})
+        assert router.generate_content("Interaction", {}) == GOOD
+        assert asyncio.run(router.generate_content_async("Interaction", {})) == GOOD
+        assert router.stats["failovers"] == 2
+        assert backup.calls == 2
+        assert router.health()["backends"]["primary"]["error_rate"] == 1.0
+        router.close()
+
+def test_returns_empty_object_when_every_backend_fails():
+    router = make_router({"a": FakeBackend("{}"), "b": FakeBackend(ValueError("bad"))})
+    assert asyncio.run(router.generate_content_async("Interaction", {})) == "{}"
+    assert router.generate_content("Interaction", {}) == "{}"
+    assert router.stats["failures"] == 2
+    router.close()
+
+def test_hedges_a_slow_call_to_the_next_backend():
+    primary, hedge = FakeBackend(delay=1.0), FakeBackend(delay=0.0)
+    router = make_router({"primary": primary, "hedge": hedge}, hedge_prompt_types=["Interaction"], min_samples=5)
+    measure(router, "primary", "Interaction", 0.05)
+    order, hedge_after = router._plan("Interaction")
+    assert order[0] == "primary" and hedge_after == 0.05
+
+    started = time.monotonic()
+    assert asyncio.run(router.generate_content_async("Interaction", {})) == GOOD
+    assert time.monotonic() - started < 0.5
+    assert router.stats["hedges"] == 1 and router.stats["hedge_wins"] == 1
+    assert hedge.calls == 1
+    router.close()
+
+def test_does_not_hedge_unlisted_types_or_with_one_healthy_backend():
+    router = make_router({"a": FakeBackend(), "b": FakeBackend()}, hedge_prompt_types=["Interaction"], min_samples=5)
+    measure(router, "a", "StoryGenerator", 0.05)
+    assert router._plan("StoryGenerator")[1] is None
+    router = make_router({"only": FakeBackend()}, hedge_prompt_types=["Interaction"], min_samples=5)
+    measure(router, "only", "Interaction", 0.05)
+    assert router._plan("Interaction")[1] is None
+
+def test_stream_fails_over_before_anything_reaches_the_caller():
+    empty = FakeStreamingBackend(["{", "}"])
+    good = FakeStreamingBackend(['```json\n{', ' "npc_dialogue": "hi', '"}', '\n```'])
+    router = make_router({"empty": empty, "good": good})
+
+    async def collect():
+        return [chunk async for chunk in router.stream_content("Interaction", {})]
+
+    chunks = asyncio.run(collect())
+    assert "".join(chunks) == '```json\n{ "npc_dialogue": "hi"}\n```'
+    assert router.stats["failovers"] == 1
+    assert router.health()["backends"]["empty"]["error_rate"] == 1.0
+    assert router.health()["backends"]["good"]["error_rate"] == 0.0
+
+def test_prompt_helpers_come_from_the_first_backend():
+    first, second = FakeBackend(), FakeBackend()
+    first.estimate_prompt_tokens = lambda prompt_type, context: 42
+    router = make_router({"first": first, "second": second})
+    assert router.estimate_prompt_tokens("Interaction", {}) == 42
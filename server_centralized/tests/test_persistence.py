@@ -0,0 +1,85 @@
+# tests/test_persistence.py
+import json
+import sqlite3
+from game_logic.persistence import GamePersistence, apply_turn_delta, turn_delta
+from game_logic.state_manager import GameState
+from game_fixtures import play_turn
+
+def open_store(path, snapshot_every=100):
+    return GamePersistence(str(path), commit_interval=0.01, snapshot_every=snapshot_every, retention=3600)
+
+def rows(path, table):
+    with sqlite3.connect(str(path)) as connection:
+        return connection.execute(f"SELECT game_id, seq FROM {table} ORDER BY seq").fetchall()
+
+def play(persistence, game_state, turns):
+    for player_key, npc_name, player_input, npc_dialogue, revealed in turns:
+        session = play_turn(game_state, player_key, npc_name, player_input, npc_dialogue, revealed)
+        dialogue_data = {"npc_dialogue": npc_dialogue, "node_revealed_id": revealed}
+        persistence.log_turn(game_state, session, npc_name, player_input, dialogue_data, revealed)
+
+TURNS = [
+    ("alice", "Mara", "Hello?", "Welcome, stranger.", None),
+    ("bob", "Tobias", "Seen my friends?", "Ask the miller.", None),
+    ("alice", "Mara", "Where are my friends?", "Footprints lead north.", "node1"),
+    ("alice", "Tobias", "What about the mine?", "Its key is missing.", "node2"),
+]
+
+def test_turn_delta_replays_onto_the_previous_state(game_state):
+    before = GameState.from_dict(game_state.to_dict())
+    session = play_turn(game_state, "alice", "Mara", "Where are my friends?", "North.", "node1")
+    session.state.setdefault("npc_summaries", {})["Mara"] = {"summary": "Asked about friends.", "folded": 0}
+
+    apply_turn_delta(before, "alice", "Mara", json.loads(json.dumps(turn_delta(session, "Mara", "node1"))))
+    assert before.to_dict() == game_state.to_dict()
+
+def test_restart_recovers_the_snapshot_and_every_logged_turn(tmp_path, game_state):
+    path = tmp_path / "games.db"
+    persistence = open_store(path)
+    persistence.save_snapshot(game_state)
+    play(persistence, game_state, TURNS)
+    persistence.close()
+    assert len(rows(path, "turns")) == len(TURNS)
+
+    recovered = open_store(path).load("game-1")
+    assert recovered.to_dict() == game_state.to_dict()
+    assert recovered.session("alice").state["discovered_nodes"] == ["node1", "node2"]
+
+def test_snapshots_compact_the_turn_log(tmp_path, game_state):
+    path = tmp_path / "games.db"
+    persistence = open_store(path, snapshot_every=3)
+    persistence.save_snapshot(game_state)
+    play(persistence, game_state, TURNS)
+    persistence.close()
+
+    assert rows(path, "snapshots") == [("game-1", 3)]
+    assert rows(path, "turns") == [("game-1", 4)]
+    assert open_store(path).load("game-1").to_dict() == game_state.to_dict()
+
+def test_turn_numbering_carries_on_after_a_restart(tmp_path, game_state):
+    path = tmp_path / "games.db"
+    persistence = open_store(path)
+    persistence.save_snapshot(game_state)
+    play(persistence, game_state, TURNS[:2])
+    persistence.close()
+
+    # A process that never loaded the game (e.g. it came back from the spill directory) keeps counting.
+    persistence = open_store(path)
+    play(persistence, game_state, TURNS[2:])
+    persistence.close()
+    assert [seq for _, seq in rows(path, "snapshots")] == [3]
+    assert [seq for _, seq in rows(path, "turns")] == [4]
+    assert open_store(path).load("game-1").to_dict() == game_state.to_dict()
+
+def test_deleted_and_unknown_games_load_as_none(tmp_path, game_state):
+    path = tmp_path / "games.db"
+    persistence = open_store(path)
+    persistence.save_snapshot(game_state)
+    play(persistence, game_state, TURNS[:1])
+    persistence.delete("game-1")
+    persistence.close()
+
+    persistence = open_store(path)
+    assert persistence.load("game-1") is None
+    assert persistence.load("never-created") is None
+    assert rows(path, "turns") == []
@@ -0,0 +1,52 @@
+# tests/test_response_cache.py
+from game_logic.response_cache import ResponseCache, minhash, normalize_input, similarity
+
+STATE = ("game-1", "Mara", "CAN_REVEAL", "node1", 0)
+
+def test_normalization_drops_filler_but_keeps_question_words():
+    assert normalize_input("Hey, where are my friends?") == normalize_input("where r my friends")
+    assert normalize_input("Where were my friends taken?") != normalize_input("Why were my friends taken?")
+    # Input made only of stopwords is kept as it is rather than emptied.
+    assert normalize_input("Can you tell me?") == "can you tell me"
+
+def test_similarity_of_signatures():
+    signature = minhash(normalize_input("where are my friends"))
+    assert similarity(signature, signature) == 1.0
+    assert similarity(signature, minhash(normalize_input("what did the blacksmith forge"))) < 0.5
+
+def test_near_identical_input_hits_and_returns_a_copy():
+    cache = ResponseCache(max_entries=10, threshold=0.5)
+    cache.put(STATE, "Where are my friends?", {"npc_dialogue": "North.", "player_responses": ["Thanks"]})
+    hit = cache.get(STATE, "hey where r my friends")
+    assert hit == {"npc_dialogue": "North.", "player_responses": ["Thanks"]}
+    hit["player_responses"].append("changed")
+    assert cache.get(STATE, "Where are my friends?")["player_responses"] == ["Thanks"]
+
+def test_misses_on_other_questions_and_other_states():
+    # At the default threshold these two are similar enough; only their question words differ.
+    cache = ResponseCache(max_entries=10, threshold=0.5)
+    cache.put(STATE, "Where were my friends taken?", {"npc_dialogue": "To the mill."})
+    assert cache.get(STATE, "Why were my friends taken?") is None
+    assert cache.get(STATE[:-1] + (1,), "Where were my friends taken?") is None
+    assert cache.stats["misses"] == 2
+
+def test_evicts_the_least_recently_used_state():
+    cache = ResponseCache(max_entries=2, threshold=0.5)
+    states = [("game-1", name, "CAN_REVEAL", None, 0) for name in ("A", "B", "C")]
+    cache.put(states[0], "hello", {"npc_dialogue": "a"})
+    cache.put(states[1], "hello", {"npc_dialogue": "b"})
+    assert cache.get(states[0], "hello")
+    cache.put(states[2], "hello", {"npc_dialogue": "c"})
+    assert cache.get(states[1], "hello") is None
+    assert cache.get(states[0], "hello") and cache.get(states[2], "hello")
+    assert cache.health()["entries"] == 2
+
+def test_invalidate_game_drops_only_that_game():
+    cache = ResponseCache(max_entries=10, threshold=0.5)
+    other = ("game-2",) + STATE[1:]
+    cache.put(STATE, "hello", {"npc_dialogue": "a"})
+    cache.put(other, "hello", {"npc_dialogue": "b"})
+    cache.invalidate_game("game-1")
+    assert cache.get(STATE, "hello") is None
+    assert cache.get(other, "hello") == {"npc_dialogue": "b"}
+    assert cache.health()["entries"] == 1
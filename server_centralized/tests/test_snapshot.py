@@ -0,0 +1,79 @@
+# tests/test_snapshot.py
+import random
+import struct
+import pytest
+from config import VILLAGER_ROSTER
+from game_logic.dialogue_log import HOT_MESSAGES
+from game_logic.snapshot import MAGIC, SNAPSHOT_VERSION, dump_game, load_game
+from game_fixtures import play_turn
+
+ROOMS = [{"room_id": "room-1", "players": ["alice", "bob"], "positions": {"alice": [1.5, -2]}}]
+
+def long_game(game_state):
+    # Enough turns that the oldest messages are compressed into cold blocks.
+    for turn in range(HOT_MESSAGES + 5):
+        play_turn(game_state, "alice", "Mara", f"Question {turn} é\U0001F56F", f"Answer {turn}")
+    play_turn(game_state, "bob", "Tobias", "Hello?", "Go away.", "node1")
+    state = game_state.session("alice").state
+    state["npc_summaries"] = {"Mara": {"summary": "Asked a lot.", "folded": 10}}
+    state["score"] = {"ratio": 0.25, "penalty": -7, "big": 2**40, "flags": [True, False, None]}
+    return game_state
+
+def test_round_trips_a_game_and_its_rooms(game_state):
+    long_game(game_state)
+    loaded, rooms = load_game(dump_game(game_state, ROOMS))
+    assert loaded.to_dict() == game_state.to_dict()
+    assert rooms == ROOMS
+    assert [message["content"] for message in loaded.session("alice").memory["Mara"]][:2] == [
+        "Question 0 é\U0001F56F", "Answer 0",
+    ]
+
+def test_keeps_absent_node_fields_absent(game_state):
+    game_state.quest_network = {"nodes": [{"node_id": "node1", "villager_name": "Mara", "content": "A clue."}]}
+    loaded, _ = load_game(dump_game(game_state))
+    node = loaded.quest_network["nodes"][0]
+    assert "required_familiarity" not in node
+    assert node.to_dict() == {"node_id": "node1", "villager_name": "Mara", "content": "A clue."}
+
+def test_the_stock_roster_is_shared_after_loading(game_state):
+    game_state.villagers = VILLAGER_ROSTER
+    loaded, _ = load_game(dump_game(game_state))
+    assert loaded.villagers is VILLAGER_ROSTER
+
+def test_reused_world_encoding_follows_changes(game_state):
+    first = dump_game(game_state)
+    play_turn(game_state, "alice", "Mara", "Hello?", "Welcome.")
+    loaded, _ = load_game(dump_game(game_state))
+    assert loaded.to_dict() == game_state.to_dict()
+
+    game_state.story_theme = "A different story"
+    loaded, _ = load_game(dump_game(game_state))
+    assert loaded.story_theme == "A different story"
+    assert load_game(first)[0].sessions == {}
+
+@pytest.mark.parametrize("damage", [
+    lambda data: b"NOPE" + data[4:],
+    lambda data: data[:4] + bytes([SNAPSHOT_VERSION + 1]) + data[5:],
+    lambda data: data[:-1],
+    lambda data: data + b"\x00",
+    lambda data: data[:9] + b"\xff" + data[10:],
+])
+def test_rejects_damaged_snapshots(game_state, damage):
+    data = dump_game(long_game(game_state))
+    with pytest.raises(ValueError):
+        load_game(damage(data))
+
+def test_truncated_or_corrupted_bytes_only_ever_raise_value_error(game_state):
+    data = dump_game(long_game(game_state), ROOMS)
+    assert data.startswith(MAGIC)
+    for length in range(0, len(data), 7):
+        with pytest.raises(ValueError):
+            load_game(data[:length])
+    rng = random.Random(7)
+    for _ in range(300):
+        corrupted = bytearray(data)
+        corrupted[rng.randrange(struct.calcsize("<4sBI"), len(data))] ^= 1 << rng.randrange(8)
+        try:
+            load_game(bytes(corrupted))
+        except ValueError:
+            pass
@@ -0,0 +1,192 @@
+# tests/test_state_backend.py
+import fnmatch
+import socket
+import socketserver
+import threading
+import time
+import pytest
+from game_logic.state_backend import (
+    FileBackend, InProcessBackend, RedisBackend, RedisError, SQLiteBackend, create_backend,
+)
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    """Just enough of a RESP server for RedisBackend: strings, GETRANGE, SCAN and MGET, with an optional password."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password=None):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.password = password
+        self.data = {}
+        self.connections = set()
+        self.commands = []
+        threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        credentials = f":{self.password}@" if self.password else ""
+        return f"redis://{credentials}127.0.0.1:{self.server_address[1]}/2"
+
+    def drop_connections(self):
+        for connection in list(self.connections):
+            connection.shutdown(socket.SHUT_RDWR)
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.connections.add(self.request)
+        authenticated = self.server.password is None
+        try:
+            while True:
+                args = self._read_command()
+                if args is None:
+                    return
+                command = args[0].upper()
+                self.server.commands.append(command)
+                if command == "AUTH":
+                    authenticated = args[1] == self.server.password
+                    self._reply(b"+OK\r\n" if authenticated else b"-WRONGPASS invalid password\r\n")
+                elif not authenticated:
+                    self._reply(b"-NOAUTH Authentication required.\r\n")
+                else:
+                    self._reply(self._execute(command, args[1:]))
+        except OSError:
+            return
+        finally:
+            self.server.connections.discard(self.request)
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def _reply(self, data: bytes):
+        self.wfile.write(data)
+
+    def _execute(self, command, args) -> bytes:
+        data = self.server.data
+        if command == "SELECT":
+            return b"+OK\r\n"
+        if command == "SET":
+            data[args[0]] = args[1]
+            return b"+OK\r\n"
+        if command == "GET":
+            return _bulk(data.get(args[0]))
+        if command == "GETRANGE":
+            value = data.get(args[0], "")
+            return _bulk(value[int(args[1]):int(args[2]) + 1])
+        if command == "DEL":
+            return b":%d\r\n" % (data.pop(args[0], None) is not None)
+        if command == "EXISTS":
+            return b":%d\r\n" % (args[0] in data)
+        if command == "SCAN":
+            keys = [key for key in data if fnmatch.fnmatchcase(key, args[2])]
+            return b"*2\r\n" + _bulk("0") + b"*%d\r\n" % len(keys) + b"".join(_bulk(key) for key in keys)
+        if command == "MGET":
+            return b"*%d\r\n" % len(args) + b"".join(_bulk(data.get(key)) for key in args)
+        return b"-ERR unknown command\r\n"
+
+def _bulk(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    encoded = value.encode()
+    return b"$%d\r\n%s\r\n" % (len(encoded), encoded)
+
+@pytest.fixture
+def redis_server():
+    server = FakeRedis()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(params=["memory", "file", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InProcessBackend()
+    if request.param == "file":
+        return FileBackend(str(tmp_path / "state"))
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "state.db"))
+    return RedisBackend(request.getfixturevalue("redis_server").url)
+
+def test_stores_reads_and_deletes_entries(backend):
+    value = {"players": ["alice"], "turns": 3, "text": "é\U0001F56F \"quoted\""}
+    assert backend.get("game", "g1") is None and not backend.exists("game", "g1")
+    backend.put("game", "g1", value)
+    backend.put_json("game", "g2", '{"turns": 1}')
+    backend.put("room", "r1", {"room": True})
+
+    assert backend.get("game", "g1") == value
+    assert backend.exists("game", "g2")
+    assert sorted(entry["turns"] for entry in backend.values("game")) == [1, 3]
+    assert backend.count("game") == 2 and backend.count("room") == 1
+
+    backend.delete("game", "g1")
+    backend.delete("game", "never-stored")
+    assert backend.get("game", "g1") is None
+    assert backend.count("game") == 1
+    backend.close()
+
+def test_keys_from_clients_never_become_paths(tmp_path):
+    backend = FileBackend(str(tmp_path / "state"))
+    backend.put("game", "../../escape", {"ok": True})
+    assert backend.get("game", "../../escape") == {"ok": True}
+    assert not (tmp_path / "escape.json").exists()
+    assert len(list((tmp_path / "state" / "game").iterdir())) == 1
+
+@pytest.mark.parametrize("kind", ["sqlite", "redis"])
+def test_shared_backends_version_every_write(kind, tmp_path, request):
+    if kind == "sqlite":
+        backend = SQLiteBackend(str(tmp_path / "state.db"))
+    else:
+        backend = RedisBackend(request.getfixturevalue("redis_server").url)
+    assert backend.shared
+    assert backend.version("game", "g1") is None
+    first = backend.put("game", "g1", {"turns": 1})
+    assert backend.version("game", "g1") == first and len(first) == RedisBackend.VERSION_LENGTH
+    second = backend.put("game", "g1", {"turns": 2})
+    assert second != first and backend.version("game", "g1") == second
+
+@pytest.mark.parametrize("kind", ["memory", "file", "sqlite"])
+def test_purge_removes_entries_older_than_the_ttl(kind, tmp_path):
+    backend = {"memory": InProcessBackend, "file": lambda: FileBackend(str(tmp_path / "state")),
+               "sqlite": lambda: SQLiteBackend(str(tmp_path / "state.db"))}[kind]()
+    backend.put("game", "old", {"n": 1}, ttl=60)
+    time.sleep(0.05)
+    backend.put("game", "new", {"n": 2}, ttl=60)
+    assert backend.purge("game", 0.02) == 1
+    assert backend.get("game", "old") is None and backend.get("game", "new") == {"n": 2}
+
+def test_sqlite_purge_keeps_entries_put_without_a_ttl(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    backend.put("login", "alice", {"last": "today"})
+    time.sleep(0.02)
+    assert backend.purge("login", 0.0) == 0
+    assert backend.get("login", "alice") == {"last": "today"}
+
+def test_redis_client_authenticates_selects_and_sets_expiry(redis_server):
+    redis_server.password = "s3cret"
+    backend = RedisBackend(redis_server.url, prefix="towns")
+    backend.put("game", "g1", {"turns": 1}, ttl=30)
+    assert redis_server.commands[:3] == ["AUTH", "SELECT", "SET"]
+    assert "towns:game:g1" in redis_server.data
+    assert backend.get("game", "g1") == {"turns": 1}
+
+    with pytest.raises(RedisError):
+        RedisBackend(redis_server.url.replace("s3cret", "wrong")).get("game", "g1")
+
+def test_redis_client_reconnects_once_after_a_dropped_connection(redis_server):
+    backend = RedisBackend(redis_server.url)
+    backend.put("game", "g1", {"turns": 1})
+    redis_server.drop_connections()
+    assert backend.get("game", "g1") == {"turns": 1}
+
+def test_create_backend_rejects_unknown_kinds(tmp_path):
+    assert isinstance(create_backend("file", str(tmp_path)), FileBackend)
+    with pytest.raises(ValueError):
+        create_backend("memcached", "")
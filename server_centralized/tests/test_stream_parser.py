@@ -0,0 +1,45 @@
+# tests/test_stream_parser.py
+import json
+import pytest
+from game_logic.stream_parser import JsonStringFieldStreamer
+
+def stream(document: str, field: str, chunk_size: int) -> JsonStringFieldStreamer:
+    streamer = JsonStringFieldStreamer(field)
+    for start in range(0, len(document), chunk_size):
+        streamer.feed(document[start:start + chunk_size])
+    return streamer
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1000])
+def test_decodes_the_field_across_any_chunking(chunk_size):
+    dialogue = 'He said "run" \\ then\nleft é \U0001F600 / tab\t'
+    document = json.dumps({"player_responses": ["npc_dialogue"], "npc_dialogue": dialogue, "node_revealed_id": None})
+    streamer = stream(document, "npc_dialogue", chunk_size)
+    assert streamer.value == dialogue
+    assert streamer.done
+
+def test_feed_returns_only_the_new_part_of_the_value():
+    streamer = JsonStringFieldStreamer("npc_dialogue")
+    assert streamer.feed('{"npc_dialogue": "Hel') == "Hel"
+    assert streamer.feed('lo') == "lo"
+    assert streamer.feed('", "more": "ignored"}') == ""
+    assert streamer.value == "Hello" and streamer.done
+
+def test_ignores_the_same_key_in_nested_objects_and_in_values():
+    document = json.dumps({
+        "context": {"npc_dialogue": "nested"},
+        "notes": "npc_dialogue",
+        "list": [{"npc_dialogue": "in a list"}],
+        "npc_dialogue": "top level",
+    })
+    assert stream(document, "npc_dialogue", 5).value == "top level"
+
+def test_a_field_that_is_not_a_string_yields_nothing():
+    streamer = stream('{"npc_dialogue": null, "other": "text"}', "npc_dialogue", 4)
+    assert streamer.value == ""
+    assert not streamer.done
+
+def test_stops_after_the_closing_quote():
+    streamer = JsonStringFieldStreamer("npc_dialogue")
+    streamer.feed('{"npc_dialogue": "done"')
+    assert streamer.feed(', "npc_dialogue": "again"}') == ""
+    assert streamer.value == "done"
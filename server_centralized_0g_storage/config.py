@@ -14,6 +14,46 @@ HEDERA_ACCOUNT_ID = os.getenv("HEDERA_ACCOUNT_ID")
 HEDERA_PRIVATE_KEY = os.getenv("HEDERA_PRIVATE_KEY")
 RUNE_COIN_TOKEN_ID = "0.0.6913517" # Your Rune Coin Token ID
 
+# --- LLM ROUTING ---
+# Prompt types whose calls get a duplicate request once they run past the backend's p95 latency.
+LLM_HEDGE_PROMPT_TYPES = [name.strip() for name in os.getenv("LLM_HEDGE_PROMPT_TYPES", "Interaction").split(",") if name.strip()]
+# Calls per backend and prompt type the latency percentiles are taken over, and the
+# number needed before hedging starts or a backend is marked unhealthy.
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "100"))
+LLM_ROUTER_MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "10"))
+LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+
+# --- CONVERSATION MEMORY ---
+# Number of recent player/NPC exchanges per villager sent verbatim in Interaction prompts.
+# Older exchanges, including history loaded from 0G Storage, are folded into a rolling
+# per-villager summary in the background.
+CHAT_RECENT_TURNS = int(os.getenv("CHAT_RECENT_TURNS", "6"))
+# Upper bound on the estimated size of a whole Interaction prompt; history is trimmed to fit.
+INTERACTION_PROMPT_TOKEN_BUDGET = int(os.getenv("INTERACTION_PROMPT_TOKEN_BUDGET", "4000"))
+CHAT_SUMMARY_MAX_WORDS = int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "120"))
+
+# --- ACTIVE GAME STORE ---
+# Games and multiplayer rooms kept in memory, least recently used first out. An entry idle for
+# GAME_IDLE_TTL_SECONDS, or pushed out by the count/size bounds, is written to GAME_SPILL_DIR and
+# loaded back on its next request. Spilled entries untouched for GAME_SPILL_TTL_SECONDS are deleted.
+GAME_STORE_MAX_GAMES = int(os.getenv("GAME_STORE_MAX_GAMES", "500"))
+GAME_STORE_MAX_BYTES = int(os.getenv("GAME_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+GAME_IDLE_TTL_SECONDS = float(os.getenv("GAME_IDLE_TTL_SECONDS", "1800"))
+GAME_SPILL_DIR = os.getenv("GAME_SPILL_DIR", "game_spill")
+GAME_SPILL_TTL_SECONDS = float(os.getenv("GAME_SPILL_TTL_SECONDS", str(7 * 24 * 3600)))
+# How often idle entries are looked for and resident sizes re-measured.
+GAME_STORE_SWEEP_SECONDS = float(os.getenv("GAME_STORE_SWEEP_SECONDS", "30"))
+
+# --- 0G STORAGE SERVICE ---
+# Connections to the storage service kept open between calls.
+STORAGE_MAX_CONNECTIONS = int(os.getenv("STORAGE_MAX_CONNECTIONS", "50"))
+STORAGE_MAX_KEEPALIVE = int(os.getenv("STORAGE_MAX_KEEPALIVE", "20"))
+# After this many failed calls in a row (unreachable, timed out or a 5xx) the storage service is
+# skipped and players start fresh sessions; it is probed every STORAGE_PROBE_INTERVAL_SECONDS
+# and used again once it answers.
+STORAGE_FAILURE_THRESHOLD = int(os.getenv("STORAGE_FAILURE_THRESHOLD", "3"))
+STORAGE_PROBE_INTERVAL_SECONDS = float(os.getenv("STORAGE_PROBE_INTERVAL_SECONDS", "15"))
+
 # --- GAME WORLD DATA ---
 # This file contains the static, base data for the game world.
 # It defines the characters that the LLM can use to build a mystery.
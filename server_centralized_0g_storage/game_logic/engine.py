@@ -5,11 +5,29 @@ import json
 import traceback
 from .state_manager import GameState
 from .llm_calls import GeminiAPI
-from config import VILLAGER_ROSTER, FAMILIARITY_LEVELS
+from .llm_router import LLMRouter
+from .memory_manager import ConversationMemory
+from config import (
+    VILLAGER_ROSTER, FAMILIARITY_LEVELS,
+    LLM_HEDGE_PROMPT_TYPES, LLM_ROUTER_WINDOW, LLM_ROUTER_MIN_SAMPLES, LLM_ROUTER_MAX_ERROR_RATE,
+    CHAT_RECENT_TURNS, INTERACTION_PROMPT_TOKEN_BUDGET, CHAT_SUMMARY_MAX_WORDS,
+)
 
 class GameEngine:
     def __init__(self, api_key: str):
-        self.llm_api = GeminiAPI(api_key)
+        self.llm_api = LLMRouter(
+            {"gemini": GeminiAPI(api_key)},
+            hedge_prompt_types=LLM_HEDGE_PROMPT_TYPES,
+            window=LLM_ROUTER_WINDOW,
+            min_samples=LLM_ROUTER_MIN_SAMPLES,
+            max_error_rate=LLM_ROUTER_MAX_ERROR_RATE
+        )
+        self.memory = ConversationMemory(
+            self.llm_api,
+            recent_turns=CHAT_RECENT_TURNS,
+            prompt_token_budget=INTERACTION_PROMPT_TOKEN_BUDGET,
+            summary_max_words=CHAT_SUMMARY_MAX_WORDS
+        )
 
     def start_new_game(self, game_id: str, num_inaccessible_locations: int, difficulty: str) -> GameState:
         game_state = GameState(game_id, difficulty)
@@ -96,9 +114,10 @@ class GameEngine:
         
         familiarity = game_state.player_state["familiarity"].get(npc_name, 0)
         
-        dialogue_turn = self.llm_api.generate_content("Interaction", {
+        context = {
             "villagerProfile": villager_profile,
-            "chatHistory": game_state.full_npc_memory.get(npc_name, []),
+            "chatSummary": "",
+            "chatHistory": [],
             "player_last_response": player_input,
             "conversational_status": clue_status,
             "context_node": context_node,
@@ -106,7 +125,15 @@ class GameEngine:
             "player_knowledge_summary": game_state.player_state["knowledge_summary"],
             "familiarity_level": familiarity,
             "familiarity_description": FAMILIARITY_LEVELS.get(familiarity, "Unknown"),
-        })
+        }
+        # Fill in as much chat history as the prompt's token budget allows.
+        context["chatSummary"], context["chatHistory"] = self.memory.build_history(
+            game_state.player_state,
+            game_state.full_npc_memory.get(npc_name, []),
+            npc_name,
+            self.memory.history_budget("Interaction", context)
+        )
+        dialogue_turn = self.llm_api.generate_content("Interaction", context)
         
         dialogue_data = json.loads(dialogue_turn)
         
@@ -128,6 +155,8 @@ class GameEngine:
             all_discovered_content = [node['content'] for node in game_state.quest_network.get('nodes', []) if node['node_id'] in game_state.player_state['discovered_nodes']]
             game_state.player_state["knowledge_summary"] = "Key points discovered so far: " + "; ".join(all_discovered_content)
 
+        self.memory.schedule_fold(game_state.player_state, game_state.full_npc_memory[npc_name], npc_name)
+
         print("\n\n" + "-"*20 + " CURRENT PLAYER STATE " + "-"*20)
         print(json.dumps(game_state.player_state, indent=2, default=str))
         print("-"*60 + "\n\n")
@@ -4,6 +4,10 @@
 import json
 import google.generativeai as genai
 
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for prompt budgeting."""
+    return (len(text) + 3) // 4
+
 class GeminiAPI:
     def __init__(self, api_key):
         try:
@@ -22,16 +26,23 @@ class GeminiAPI:
             text_response = text_response[:-3]
         return text_response.strip()
 
-    def generate_content(self, prompt_type, context):
-        if not self.model: return "{}"
-        print(f"\n--- 🤖 Live Gemini API Call ({prompt_type}) ---")
-        
+    def _build_prompt(self, prompt_type, context):
         prompts = {
             "StoryGenerator": self._create_story_generator_prompt,
             "WorldBuilder": self._create_world_builder_prompt,
             "Interaction": self._create_interaction_prompt,
+            "MemorySummary": self._create_memory_summary_prompt,
         }
-        prompt = prompts.get(prompt_type, lambda _: "")(context)
+        return prompts.get(prompt_type, lambda _: "")(context)
+
+    def estimate_prompt_tokens(self, prompt_type, context):
+        return estimate_tokens(self._build_prompt(prompt_type, context))
+
+    def generate_content(self, prompt_type, context):
+        if not self.model: return "{}"
+        print(f"\n--- 🤖 Live Gemini API Call ({prompt_type}) ---")
+        
+        prompt = self._build_prompt(prompt_type, context)
         if not prompt: 
             print(f"--- ERROR: No prompt found for type '{prompt_type}' ---")
             return "{}"
@@ -223,7 +234,8 @@ class GeminiAPI:
         Current clue node (if any): {json.dumps(context_node)}
 
         --- CONVERSATION HISTORY ---
-        {json.dumps(context['chatHistory'], indent=2)}
+        Summary of your earlier conversations with the player: {context.get('chatSummary') or "None."}
+        Most recent exchanges: {json.dumps(context['chatHistory'])}
 
         --- THIS TURN ---
         - Objective: {turn_objective}  
@@ -234,3 +246,21 @@ class GeminiAPI:
 
         Respond ONLY with the raw JSON object.
         """
+
+    # ================= MEMORY ================= #
+    def _create_memory_summary_prompt(self, context):
+        return f"""
+        You maintain the memory of {context['villager_name']}, a villager in the game "Village of Echoes", about their conversations with the player.
+
+        **Current memory summary:** {context.get('previous_summary') or "(none yet)"}
+
+        **New exchanges to fold into the summary:**
+        {json.dumps(context['messages'])}
+
+        **Your Task:**
+        Write an updated summary of at most {context['max_words']} words, written from {context['villager_name']}'s point of view.
+        - Keep what the player asked about, what {context['villager_name']} revealed or promised, the player's attitude, and any names or places mentioned.
+        - Drop greetings and small talk. Never invent events that are not in the exchanges.
+
+        Output ONLY a raw JSON object with a single key "summary".
+        """
@@ -0,0 +1,322 @@
+# game_logic/llm_router.py
+# Routes LLM calls across backends by observed latency, with hedged requests for slow calls.
+
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Share of calls sent to a backend other than the fastest one, so that unmeasured
+# and unhealthy backends keep getting samples and can recover.
+EXPLORE_RATE = 0.05
+
+def _failed(text) -> bool:
+    # Backends swallow their own errors and answer "{}".
+    return not isinstance(text, str) or text.strip() in ("", "{}")
+
+def _json_body(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+def _stream_started(text: str) -> bool:
+    # True once the streamed JSON object has begun its first field; "{}" never gets there.
+    body = _json_body(text)
+    return body.startswith("{") and body[1:].lstrip().startswith('"')
+
+def _parses(text: str) -> bool:
+    try:
+        return bool(json.loads(_json_body(text)))
+    except ValueError:
+        return False
+
+class LatencyWindow:
+    """The most recent outcomes of calls to one backend, with the latencies of the successful ones."""
+
+    def __init__(self, size: int):
+        self.latencies = deque(maxlen=size)
+        self.outcomes = deque(maxlen=size)
+
+    def record(self, seconds: float, ok: bool):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(seconds)
+
+    def percentile(self, fraction: float):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    @property
+    def error_rate(self):
+        if not self.outcomes:
+            return None
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def summary(self) -> dict:
+        p50, p95, error_rate = self.percentile(0.5), self.percentile(0.95), self.error_rate
+        return {
+            "samples": len(self.outcomes),
+            "p50_seconds": round(p50, 3) if p50 is not None else None,
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+            "error_rate": round(error_rate, 3) if error_rate is not None else None,
+        }
+
+class LLMRouter:
+    """
+    Sends each call to the fastest healthy backend for its prompt type.
+
+    `backends` maps a name to an object with generate_content(prompt_type,
+    context) and optionally generate_content_async / stream_content, such as
+    GeminiAPI or the 0G Compute bridge client. The router has the same methods,
+    so a GameEngine uses it in place of a single backend; prompt helpers such as
+    estimate_prompt_tokens come from the first backend.
+
+    Latency (p50/p95) is tracked per backend and prompt type over the last
+    `window` calls, and the error rate per backend. Backends are ranked by
+    p50 once they have `min_samples` calls; a backend whose error rate exceeds
+    `max_error_rate` is only used when nothing else is left, or as an
+    occasional probe. When a call of a type in `hedge_prompt_types` is still
+    running after the primary's p95 for that type, a duplicate is sent to the
+    next backend and the first good answer wins; the other is cancelled.
+    Hedging needs at least two healthy backends. Backends that block in a
+    thread can't be interrupted, so a cancelled call there only has its result
+    discarded. A call that fails outright is retried once on the next backend.
+    """
+
+    def __init__(self, backends: dict, hedge_prompt_types=(), window: int = 100, min_samples: int = 10,
+                 max_error_rate: float = 0.5, max_workers: int = 16):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend.")
+        self.backends = dict(backends)
+        self.hedge_prompt_types = set(hedge_prompt_types)
+        self.window = window
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self._latency = {}  # (backend, prompt type) -> LatencyWindow
+        self._errors = {name: LatencyWindow(window) for name in self.backends}
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        # Runs calls for the blocking generate_content path and for backends without an async API.
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+        self.stats = {"calls": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0, "failures": 0}
+
+    def __getattr__(self, name):
+        # Only reached for attributes the router doesn't define itself.
+        backends = self.__dict__.get("backends")
+        if not backends:
+            raise AttributeError(name)
+        return getattr(next(iter(backends.values())), name)
+
+    @property
+    def model(self):
+        return next((backend.model for backend in self.backends.values() if getattr(backend, "model", None)), None)
+
+    @property
+    def prompt_stats(self) -> dict:
+        merged = {}
+        for backend in self.backends.values():
+            for prompt_type, stats in getattr(backend, "prompt_stats", {}).items():
+                total = merged.setdefault(prompt_type, dict(stats, calls=0, total_tokens=0, max_tokens=0))
+                total["calls"] += stats["calls"]
+                total["total_tokens"] += stats["total_tokens"]
+                total["max_tokens"] = max(total["max_tokens"], stats["max_tokens"])
+        return merged
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for backend in self.backends.values():
+            if hasattr(backend, "close"):
+                backend.close()
+
+    def generate_content(self, prompt_type, context):
+        """Blocking call; the hedge and the failover run on the router's own threads."""
+        order, hedge_after = self._plan(prompt_type)
+        pending = {self._executor.submit(self._attempt, order[0], prompt_type, context): order[0]}
+        hedge, spare_used = None, False
+        try:
+            while pending:
+                timeout = None if spare_used else hedge_after
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    hedge = self._executor.submit(self._attempt, order[1], prompt_type, context)
+                    pending[hedge] = order[1]
+                    spare_used = True
+                    self.stats["hedges"] += 1
+                    continue
+                for future in done:
+                    pending.pop(future)
+                    text = future.result()
+                    if text is not None:
+                        self._won(future is hedge)
+                        return text
+                if not pending and not spare_used and len(order) > 1:
+                    pending[self._executor.submit(self._attempt, order[1], prompt_type, context)] = order[1]
+                    spare_used = True
+                    self.stats["failovers"] += 1
+        finally:
+            for future in pending:
+                future.cancel()
+        self.stats["failures"] += 1
+        return "{}"
+
+    async def generate_content_async(self, prompt_type, context):
+        order, hedge_after = self._plan(prompt_type)
+        pending = {asyncio.ensure_future(self._attempt_async(order[0], prompt_type, context)): order[0]}
+        hedge, spare_used = None, False
+        try:
+            while pending:
+                timeout = None if spare_used else hedge_after
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge = asyncio.ensure_future(self._attempt_async(order[1], prompt_type, context))
+                    pending[hedge] = order[1]
+                    spare_used = True
+                    self.stats["hedges"] += 1
+                    continue
+                for task in done:
+                    pending.pop(task)
+                    text = task.result()
+                    if text is not None:
+                        self._won(task is hedge)
+                        return text
+                if not pending and not spare_used and len(order) > 1:
+                    pending[asyncio.ensure_future(self._attempt_async(order[1], prompt_type, context))] = order[1]
+                    spare_used = True
+                    self.stats["failovers"] += 1
+        finally:
+            for task in pending:
+                task.cancel()
+        self.stats["failures"] += 1
+        return "{}"
+
+    async def stream_content(self, prompt_type, context):
+        """
+        Streams from the chosen backend. Streams aren't hedged. Chunks are held
+        back until the response has started its first JSON field, so a backend
+        that ends without real content ("{}", an error, nothing) fails over to
+        the next one before anything reaches the caller.
+        """
+        order, _ = self._plan(prompt_type)
+        for name in order[:2]:
+            backend = self.backends[name]
+            started = time.monotonic()
+            chunks, committed = [], False
+            if hasattr(backend, "stream_content"):
+                async for chunk in backend.stream_content(prompt_type, context):
+                    chunks.append(chunk)
+                    if committed:
+                        yield chunk
+                    elif _stream_started("".join(chunks)):
+                        committed = True
+                        yield "".join(chunks)
+            else:
+                text = await self._call_async(backend, prompt_type, context)
+                if not _failed(text) and _stream_started(text):
+                    chunks.append(text)
+                    committed = True
+                    yield text
+            # Truncated streams are still served (the caller repairs them) but count against the backend.
+            ok = committed and _parses("".join(chunks))
+            self._record(name, prompt_type, time.monotonic() - started, ok)
+            if committed:
+                return
+            self.stats["failovers"] += 1
+        self.stats["failures"] += 1
+
+    def health(self) -> dict:
+        with self._lock:
+            backends = {}
+            for name in self.backends:
+                errors = self._errors[name]
+                backends[name] = {
+                    "healthy": self._healthy(name),
+                    **errors.summary(),
+                    "prompt_types": {
+                        prompt_type: window.summary()
+                        for (backend, prompt_type), window in self._latency.items() if backend == name
+                    },
+                }
+                if hasattr(self.backends[name], "health"):
+                    backends[name]["details"] = self.backends[name].health()
+        return {"backends": backends, "hedge_prompt_types": sorted(self.hedge_prompt_types), **self.stats}
+
+    def _plan(self, prompt_type):
+        """Returns the backends in the order to try them, and after how many seconds to hedge (or None)."""
+        self.stats["calls"] += 1
+        with self._lock:
+            healthy = [name for name in self.backends if self._healthy(name)]
+            measured = sorted(
+                (name for name in healthy if self._samples(name, prompt_type) >= self.min_samples),
+                key=lambda name: self._latency[(name, prompt_type)].percentile(0.5),
+            )
+            order = measured + [name for name in self.backends if name not in measured and name in healthy]
+            order += [name for name in self.backends if name not in healthy]
+            if len(order) > 1 and self._random.random() < EXPLORE_RATE:
+                order.insert(0, order.pop(self._random.randrange(1, len(order))))
+
+            # A hedge sent to the same backend would only compete with itself (and, on a
+            # thread-bound backend, keep a thread busy after it loses).
+            hedge_after = None
+            if (len(healthy) > 1 and prompt_type in self.hedge_prompt_types
+                    and self._samples(order[0], prompt_type) >= self.min_samples):
+                hedge_after = self._latency[(order[0], prompt_type)].percentile(0.95)
+        return order, hedge_after
+
+    def _won(self, by_hedge: bool):
+        if by_hedge:
+            self.stats["hedge_wins"] += 1
+
+    def _samples(self, name, prompt_type) -> int:
+        window = self._latency.get((name, prompt_type))
+        return len(window.latencies) if window else 0
+
+    def _healthy(self, name) -> bool:
+        errors = self._errors[name]
+        return len(errors.outcomes) < self.min_samples or errors.error_rate <= self.max_error_rate
+
+    def _record(self, name, prompt_type, seconds: float, ok: bool):
+        with self._lock:
+            window = self._latency.get((name, prompt_type))
+            if window is None:
+                window = self._latency[(name, prompt_type)] = LatencyWindow(self.window)
+            window.record(seconds, ok)
+            self._errors[name].record(seconds, ok)
+
+    def _attempt(self, name, prompt_type, context):
+        """One blocking call to a backend; returns its text, or None if it failed."""
+        started = time.monotonic()
+        try:
+            text = self.backends[name].generate_content(prompt_type, context)
+        except Exception as e:
+            print(f"--- WARNING: LLM backend '{name}' failed on {prompt_type}. Error: {e} ---")
+            text = None
+        ok = not _failed(text)
+        self._record(name, prompt_type, time.monotonic() - started, ok)
+        return text if ok else None
+
+    async def _attempt_async(self, name, prompt_type, context):
+        started = time.monotonic()
+        try:
+            text = await self._call_async(self.backends[name], prompt_type, context)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"--- WARNING: LLM backend '{name}' failed on {prompt_type}. Error: {e} ---")
+            text = None
+        ok = not _failed(text)
+        self._record(name, prompt_type, time.monotonic() - started, ok)
+        return text if ok else None
+
+    async def _call_async(self, backend, prompt_type, context):
+        if hasattr(backend, "generate_content_async"):
+            return await backend.generate_content_async(prompt_type, context)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, backend.generate_content, prompt_type, context)
@@ -17,5 +17,26 @@ class GameState:
             "unproductive_turns": {} # Tracks turns since last clue for each villager
         }
         self.full_npc_memory = {}
+        # Interact calls working on this game right now; not persisted (see _FIELDS)
+        self.turns_in_flight = 0
         self.multiplayer_states = {}
-        self.multiplayer_memories = {}
\ No newline at end of file
+        self.multiplayer_memories = {}
+
+    # Attributes that make up a game's persistent state, in constructor order.
+    _FIELDS = (
+        "game_id", "difficulty", "correct_location", "story_theme", "inaccessible_locations",
+        "quest_network", "villagers", "player_state", "full_npc_memory",
+        "multiplayer_states", "multiplayer_memories",
+    )
+
+    def to_dict(self) -> dict:
+        """Returns a JSON-serializable snapshot of this game."""
+        return {field: getattr(self, field) for field in self._FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GameState":
+        game_state = cls(data["game_id"], data["difficulty"])
+        for field in cls._FIELDS:
+            if field in data:
+                setattr(game_state, field, data[field])
+        return game_state
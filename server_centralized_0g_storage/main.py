@@ -8,16 +8,23 @@ import uuid
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import requests # Ensure requests is imported
 import json
 from schemas import *
-from datetime import datetime
+from datetime import datetime, timedelta
 from game_logic.engine import GameEngine
 from game_logic.state_manager import GameState
+from game_logic.game_store import GameStore
+from game_logic.state_backend import FileBackend
+from config import (
+    GAME_STORE_MAX_GAMES, GAME_STORE_MAX_BYTES, GAME_IDLE_TTL_SECONDS,
+    GAME_SPILL_DIR, GAME_SPILL_TTL_SECONDS, GAME_STORE_SWEEP_SECONDS,
+)
 # Import our new Hedera service function
 from hedera_service import hedera_service
 from mirror_node_service import mirror_service
+from hcs_service import hcs_service
 # --- MODIFIED IMPORT ---
+import storage_client
 from storage_client import get_dialogue_history, save_full_dialogue_history
 # -------------------------
 from dotenv import load_dotenv
@@ -50,22 +57,6 @@ game_engine = None
 # In-memory storage for user login tracking
 user_login_history = {}
 
-STORAGE_SERVICE_URL = "http://localhost:3002"
-
-# --- NEW HELPER FUNCTION ---
-async def get_dialogue_history(player_id: str) -> Optional[Dict]:
-    """Fetches dialogue history from the 0G storage service with a long timeout."""
-    print(f"Attempting to load persistent dialogue history for {player_id}...")
-    try:
-        # The core fix: Add a 60-second timeout to handle slow 0G downloads
-        response = requests.get(f"{STORAGE_SERVICE_URL}/dialogue/{player_id}", timeout=60)
-        response.raise_for_status()
-        return response.json()
-    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
-        print(f"An unexpected error occurred while fetching dialogue history:\n{e}")
-        return None
-# --- END NEW HELPER FUNCTION ---
-
 @app.on_event("startup")
 async def startup_event():
     global game_engine
@@ -73,10 +64,40 @@ async def startup_event():
     if not api_key:
         raise RuntimeError("GOOGLE_API_KEY environment variable is required")
     game_engine = GameEngine(api_key)
-
-# Store active games and rooms
-active_games: Dict[str, any] = {}
-multiplayer_rooms: Dict[str, dict] = {}
+    await storage_client.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await storage_client.close()
+
+# Store active games and rooms; idle ones are spilled to disk and loaded back on their next request
+spill_backend = FileBackend(GAME_SPILL_DIR)
+active_games = GameStore(
+    "game",
+    spill_backend,
+    serialize=GameState.to_dict,
+    deserialize=GameState.from_dict,
+    max_entries=GAME_STORE_MAX_GAMES,
+    max_bytes=GAME_STORE_MAX_BYTES,
+    idle_ttl=GAME_IDLE_TTL_SECONDS,
+    disk_ttl=GAME_SPILL_TTL_SECONDS,
+    sweep_interval=GAME_STORE_SWEEP_SECONDS,
+    # A game with a turn in flight is still referenced by that turn, so its changes would be lost
+    is_busy=lambda game_id, game_state: game_state.turns_in_flight > 0
+)
+multiplayer_rooms = GameStore(
+    "room",
+    spill_backend,
+    serialize=dict,
+    deserialize=dict,
+    max_entries=GAME_STORE_MAX_GAMES,
+    max_bytes=GAME_STORE_MAX_BYTES,
+    idle_ttl=GAME_IDLE_TTL_SECONDS,
+    disk_ttl=GAME_SPILL_TTL_SECONDS,
+    sweep_interval=GAME_STORE_SWEEP_SECONDS,
+    # Rooms with players connected are still in use
+    is_busy=lambda room_id, room: bool(manager.active_connections.get(room_id))
+)
 
 class ConnectionManager:
     def __init__(self):
@@ -224,6 +245,8 @@ async def interact(game_id: str, request: InteractRequest):
         raise HTTPException(status_code=404, detail="Game not found")
     
     game_state = active_games[game_id]
+    # Keeps the game in memory until the turn is done (see is_busy below)
+    game_state.turns_in_flight += 1
     
     try:
         villager_index = int(request.villager_id.split('_')[1])
@@ -312,6 +335,8 @@ async def interact(game_id: str, request: InteractRequest):
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Interaction failed: {e}")
+    finally:
+        game_state.turns_in_flight -= 1
 
 @app.post("/game/{game_id}/guess", response_model=GuessResponse)
 async def guess(game_id: str, request: GuessRequest):
@@ -830,6 +855,11 @@ async def get_consensus_topics():
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to get consensus topics: {e}")
 
+@app.get("/health/games")
+async def games_health():
+    """Resident count, size and evictions of the active game and room stores, and the 0G Storage circuit breaker"""
+    return {"games": active_games.health(), "rooms": multiplayer_rooms.health(), "storage": storage_client.health()}
+
 @app.get("/ping")
 async def ping():
     """Health check endpoint"""
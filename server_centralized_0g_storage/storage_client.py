@@ -1,18 +1,132 @@
+import asyncio
 import httpx
 import os
 from typing import Dict, Any, Optional
+from config import (
+    STORAGE_MAX_CONNECTIONS, STORAGE_MAX_KEEPALIVE, STORAGE_FAILURE_THRESHOLD, STORAGE_PROBE_INTERVAL_SECONDS,
+)
 
 STORAGE_SERVICE_URL = os.getenv("STORAGE_SERVICE_URL", "http://localhost:3002")
 
+class StorageUnavailable(Exception):
+    """Raised instead of calling the storage service while its circuit breaker is open."""
+
+class CircuitBreaker:
+    """
+    Stops calling the storage service after `threshold` failed calls in a
+    row, so turns don't each wait out a timeout while it is down. While open,
+    a background task probes the service every `probe_interval` seconds
+    (half-open) and closes the breaker once it answers.
+    """
+
+    def __init__(self, threshold: int, probe_interval: float):
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self.state = "closed"
+        self.failures = 0
+        self._probe_task = None
+        self.stats = {"failures": 0, "short_circuited": 0, "opened": 0, "probes": 0}
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        self.stats["short_circuited"] += 1
+        return False
+
+    def record_success(self):
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        self.stats["failures"] += 1
+        if self.state == "closed" and self.failures >= self.threshold:
+            self.state = "open"
+            self.stats["opened"] += 1
+            print(f"--- WARNING: 0G Storage failed {self.failures} times in a row; using fresh sessions until it answers again. ---")
+            if self._probe_task is None or self._probe_task.done():
+                self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def _probe_loop(self):
+        while self.state != "closed":
+            await asyncio.sleep(self.probe_interval)
+            self.state = "half_open"
+            self.stats["probes"] += 1
+            try:
+                response = await _get_client().get(f"{STORAGE_SERVICE_URL}/", timeout=5.0)
+                up = response.status_code < 500
+            except httpx.HTTPError:
+                up = False
+            if up:
+                self.state = "closed"
+                self.failures = 0
+                print("✅ 0G Storage is answering again.")
+            else:
+                self.state = "open"
+
+    def health(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures, **self.stats}
+
+    def stop(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+
+breaker = CircuitBreaker(STORAGE_FAILURE_THRESHOLD, STORAGE_PROBE_INTERVAL_SECONDS)
+_client: Optional[httpx.AsyncClient] = None
+
+def _get_client() -> httpx.AsyncClient:
+    """The shared client; connections to the storage service are pooled and kept alive between calls."""
+    global _client
+    if _client is None:
+        limits = httpx.Limits(max_connections=STORAGE_MAX_CONNECTIONS, max_keepalive_connections=STORAGE_MAX_KEEPALIVE)
+        try:
+            _client = httpx.AsyncClient(limits=limits, http2=True)
+        except ImportError:
+            print("--- WARNING: HTTP/2 support is not installed (pip install 'httpx[http2]'); 0G Storage calls use HTTP/1.1. ---")
+            _client = httpx.AsyncClient(limits=limits)
+    return _client
+
+async def start():
+    """Opens the shared client; call at app startup."""
+    _get_client()
+
+async def close():
+    """Closes the shared client and stops probing; call at app shutdown."""
+    global _client
+    breaker.stop()
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def health() -> dict:
+    return {"url": STORAGE_SERVICE_URL, "circuit": breaker.health()}
+
+async def _request(method: str, path: str, timeout: float, **kwargs) -> httpx.Response:
+    """Sends a request through the breaker; 5xx responses and connection errors count as failures."""
+    if not breaker.allow():
+        raise StorageUnavailable("0G Storage is unavailable (circuit open)")
+    try:
+        response = await _get_client().request(method, f"{STORAGE_SERVICE_URL}{path}", timeout=timeout, **kwargs)
+    except httpx.TransportError:
+        breaker.record_failure()
+        raise
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    response.raise_for_status()
+    return response
+
 async def get_dialogue_history(wallet_address: str) -> Optional[Dict[str, Any]]:
     """Fetches the entire dialogue history for a given wallet address from 0G Storage."""
     if not wallet_address:
         return None
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{STORAGE_SERVICE_URL}/dialogue/{wallet_address}", timeout=10.0)
-            response.raise_for_status()
-            return response.json()
+        # 0G downloads can be slow, hence the long timeout
+        response = await _request("GET", f"/dialogue/{wallet_address}", timeout=60.0)
+        return response.json()
+    except StorageUnavailable as e:
+        print(f"{e}; {wallet_address} starts with a fresh session.")
+        return None
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
             print(f"No persistent history found for {wallet_address}. A new one will be created.")
@@ -28,15 +142,9 @@ async def save_dialogue(wallet_address: str, new_dialogue: Dict[str, str]) -> bo
     if not wallet_address:
         return False
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{STORAGE_SERVICE_URL}/dialogue/{wallet_address}",
-                json={"newDialogue": new_dialogue},
-                timeout=20.0
-            )
-            response.raise_for_status()
-            print(f"Successfully saved dialogue for {wallet_address} to 0G Storage.")
-            return True
+        await _request("POST", f"/dialogue/{wallet_address}", json={"newDialogue": new_dialogue}, timeout=20.0)
+        print(f"Successfully saved dialogue for {wallet_address} to 0G Storage.")
+        return True
     except Exception as e:
         print(f"Error saving dialogue to 0G Storage for {wallet_address}: {e}")
         return False
@@ -46,15 +154,14 @@ async def save_full_dialogue_history(wallet_address: str, history: Dict[str, Any
     if not wallet_address:
         return False
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{STORAGE_SERVICE_URL}/dialogue/history/{wallet_address}",
-                json=history,
-                timeout=40.0  # Increased timeout for potentially larger payload
-            )
-            response.raise_for_status()
-            print(f"Successfully saved full dialogue history for {wallet_address} to 0G Storage.")
-            return True
+        await _request(
+            "POST",
+            f"/dialogue/history/{wallet_address}",
+            json=history,
+            timeout=40.0  # Increased timeout for potentially larger payload
+        )
+        print(f"Successfully saved full dialogue history for {wallet_address} to 0G Storage.")
+        return True
     except Exception as e:
         print(f"Error saving full dialogue history to 0G Storage for {wallet_address}: {e}")
-        return False
\ No newline at end of file
+        return False
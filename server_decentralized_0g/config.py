@@ -1,7 +1,49 @@
 # config.py
 # This file contains the static, base data for the game world.
 # It defines the characters that the LLM can use to build a mystery.
+import os
+from dotenv import load_dotenv
 
+# Load environment variables from .env file
+load_dotenv()
+
+# --- LLM ROUTING ---
+# Prompt types whose calls get a duplicate request once they run past the backend's p95 latency.
+LLM_HEDGE_PROMPT_TYPES = [name.strip() for name in os.getenv("LLM_HEDGE_PROMPT_TYPES", "Interaction").split(",") if name.strip()]
+# Calls per backend and prompt type the latency percentiles are taken over, and the
+# number needed before hedging starts or a backend is marked unhealthy.
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "100"))
+LLM_ROUTER_MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "10"))
+LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+
+# --- 0G COMPUTE BRIDGE ---
+OG_BRIDGE_URL = os.getenv("OG_BRIDGE_URL", "http://localhost:3001/generate-narrative")
+# Connections kept open to the bridge, and calls the bridge works on at once; further calls wait.
+OG_BRIDGE_MAX_CONNECTIONS = int(os.getenv("OG_BRIDGE_MAX_CONNECTIONS", "32"))
+OG_BRIDGE_MAX_CONCURRENCY = int(os.getenv("OG_BRIDGE_MAX_CONCURRENCY", "8"))
+# Per-prompt-type timeouts in seconds, e.g. "Interaction=30,WorldBuilder=120"; others use the default.
+OG_BRIDGE_TIMEOUT_SECONDS = float(os.getenv("OG_BRIDGE_TIMEOUT_SECONDS", "90"))
+OG_BRIDGE_TIMEOUTS = {
+    prompt_type.strip(): float(seconds)
+    for prompt_type, _, seconds in (
+        entry.partition("=") for entry in os.getenv("OG_BRIDGE_TIMEOUTS", "Interaction=30,StoryGenerator=60,WorldBuilder=120").split(",")
+    )
+    if seconds
+}
+
+# --- ACTIVE GAME STORE ---
+# Games and multiplayer rooms kept in memory, least recently used first out. An entry idle for
+# GAME_IDLE_TTL_SECONDS, or pushed out by the count/size bounds, is written to GAME_SPILL_DIR and
+# loaded back on its next request. Spilled entries untouched for GAME_SPILL_TTL_SECONDS are deleted.
+GAME_STORE_MAX_GAMES = int(os.getenv("GAME_STORE_MAX_GAMES", "500"))
+GAME_STORE_MAX_BYTES = int(os.getenv("GAME_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+GAME_IDLE_TTL_SECONDS = float(os.getenv("GAME_IDLE_TTL_SECONDS", "1800"))
+GAME_SPILL_DIR = os.getenv("GAME_SPILL_DIR", "game_spill")
+GAME_SPILL_TTL_SECONDS = float(os.getenv("GAME_SPILL_TTL_SECONDS", str(7 * 24 * 3600)))
+# How often idle entries are looked for and resident sizes re-measured.
+GAME_STORE_SWEEP_SECONDS = float(os.getenv("GAME_STORE_SWEEP_SECONDS", "30"))
+
+# --- GAME WORLD DATA ---
 VILLAGER_ROSTER = [
     {
         "name": "Arthur Hobbs",
@@ -5,20 +5,34 @@ import json
 import traceback
 from .state_manager import GameState
 from .llm_calls import ZeroGravityAI_API
-from config import VILLAGER_ROSTER, FAMILIARITY_LEVELS
+from .llm_router import LLMRouter
+from config import (
+    VILLAGER_ROSTER, FAMILIARITY_LEVELS,
+    LLM_HEDGE_PROMPT_TYPES, LLM_ROUTER_WINDOW, LLM_ROUTER_MIN_SAMPLES, LLM_ROUTER_MAX_ERROR_RATE,
+)
 
 class GameEngine:
     def __init__(self):
-        self.llm_api = ZeroGravityAI_API()
-
-    def start_new_game(self, game_id: str, num_inaccessible_locations: int, difficulty: str) -> GameState:
+        self.bridge = ZeroGravityAI_API()
+        self.llm_api = LLMRouter(
+            {"0g": self.bridge},
+            hedge_prompt_types=LLM_HEDGE_PROMPT_TYPES,
+            window=LLM_ROUTER_WINDOW,
+            min_samples=LLM_ROUTER_MIN_SAMPLES,
+            max_error_rate=LLM_ROUTER_MAX_ERROR_RATE
+        )
+
+    async def aclose(self):
+        await self.bridge.aclose()
+
+    async def start_new_game(self, game_id: str, num_inaccessible_locations: int, difficulty: str) -> GameState:
         game_state = GameState(game_id, difficulty)
         
         # 1. Generate the core story idea
         try:
             print("Attempting to generate story idea...")
             story_context = {"num_inaccessible_locations": num_inaccessible_locations}
-            story_idea_json = self.llm_api.generate_content("StoryGenerator", story_context)
+            story_idea_json = await self.llm_api.generate_content_async("StoryGenerator", story_context)
             story_idea = json.loads(story_idea_json)
             print("Story idea generated successfully.")
         except (json.JSONDecodeError, ValueError, KeyError) as e:
@@ -50,7 +64,7 @@ class GameEngine:
                 "difficulty": difficulty,
                 "story_theme": game_state.story_theme
             }
-            quest_network_json = self.llm_api.generate_content("WorldBuilder", world_context)
+            quest_network_json = await self.llm_api.generate_content_async("WorldBuilder", world_context)
             game_state.quest_network = json.loads(quest_network_json)
             if not game_state.quest_network.get("nodes"):
                  raise ValueError("Generated quest network is missing the 'nodes' list.")
@@ -89,14 +103,14 @@ class GameEngine:
 
         return "HAS_LOCKED_CLUES", sorted_nodes[0]
 
-    def process_interaction_turn(self, game_state: GameState, npc_name: str, player_input: str, frustration: dict):
+    async def process_interaction_turn(self, game_state: GameState, npc_name: str, player_input: str, frustration: dict):
         clue_status, context_node = self.get_villager_clue_status(game_state, npc_name)
 
         villager_profile = next((v for v in game_state.villagers if v["name"] == npc_name), None)
         
         familiarity = game_state.player_state["familiarity"].get(npc_name, 0)
         
-        dialogue_turn = self.llm_api.generate_content("Interaction", {
+        dialogue_turn = await self.llm_api.generate_content_async("Interaction", {
             "villagerProfile": villager_profile,
             "chatHistory": game_state.full_npc_memory.get(npc_name, []),
             "player_last_response": player_input,
@@ -0,0 +1,454 @@
+# game_logic/game_store.py
+# A dict-like store for games (or rooms) that keeps memory bounded by spilling idle entries to a StateBackend.
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from .state_backend import StateBackend
+
+class GameStore:
+    """
+    Holds live entries in memory as an LRU, bounded by `max_entries` and
+    `max_bytes`, and evicts entries idle for longer than `idle_ttl` seconds.
+    Evicted entries are turned into JSON-serializable data with `serialize`,
+    put in `backend` under the namespace `name` and rebuilt with
+    `deserialize` the next time they're looked up, so an evicted game simply
+    resumes. Stored entries idle for longer than `disk_ttl` seconds are
+    deleted, and `on_evict(key)` is called for every entry that leaves memory
+    or is replaced by a newer copy. A key found neither in memory nor in the
+    backend is passed to `fallback(key)`, if given, which may return the
+    entry from elsewhere (e.g. durable storage).
+
+    With a shared backend, other processes use the same entries: new entries
+    and `save(key)` write through to the backend, and a lookup reloads an
+    entry whose stored version has changed since this process last read or
+    wrote it, unless it is busy here. Writes are last-writer-wins, so each
+    entry must only be changed by one process at a time (see ClusterRouter).
+
+    The dict operations, `get`, `save` and `pop` do their backend I/O (and
+    any spills and sweeps they trigger) on the calling thread, which is fine
+    for a local backend. `aget`, `aset`, `asave` and `ahealth` do the same
+    from a coroutine with all backend I/O in a worker thread, so a remote or
+    slow backend doesn't stall the event loop; request handlers use those.
+    An entry is always encoded on the caller's
+    thread and only the JSON text goes to the worker, since the event loop
+    keeps changing live entries and a copy taken halfway through a turn would
+    store a state that never existed.
+
+    Sizes are `sizeof(value)` if given (e.g. GameState.memory_usage), else
+    the length of an entry's serialized form. They're measured when
+    an entry is stored or faulted in and re-measured for entries used since
+    the last sweep, which runs at most every `sweep_interval` seconds. An
+    entry `is_busy(key, value)` says is in use (e.g. has a turn in flight) is
+    never evicted, because changes made to it after eviction would be lost.
+
+    Supports `in`, `[]`, `get`, `pop` and `del` like the dict it replaces;
+    `len()` and `resident()` count and list the entries in memory.
+    """
+
+    def __init__(self, name: str, backend: StateBackend, serialize, deserialize, max_entries: int, max_bytes: int,
+                 idle_ttl: float, disk_ttl: float, sweep_interval: float, is_busy=None, on_evict=None, fallback=None, sizeof=None):
+        self.name = name
+        self.backend = backend
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.disk_ttl = disk_ttl
+        self.sweep_interval = sweep_interval
+        self.is_busy = is_busy or (lambda key, value: False)
+        self.on_evict = on_evict
+        self.fallback = fallback
+        self.sizeof = sizeof or (lambda value: len(json.dumps(self.serialize(value))))
+        self._entries = OrderedDict()  # key -> value, least recently used first
+        self._last_used = {}
+        self._sizes = {}
+        self._versions = {}  # key -> backend version of the resident copy, shared backends only
+        self._dirty = set()  # keys with changes asave hasn't started writing yet
+        self._write_locks = {}  # key -> asyncio.Lock ordering asave's writes of it
+        self._write_waiters = {}  # key -> asave calls holding or waiting for that lock
+        self._maintaining = False  # an async sweep or spill pass is running
+        self._used_since_sweep = set()
+        self._bytes = 0
+        self._last_sweep = time.monotonic()
+        self.stats = {
+            "evictions": 0, "expirations": 0, "faults": 0, "reloads": 0,
+            "spill_failures": 0, "write_failures": 0, "deleted_from_disk": 0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        if key in self._entries or self.backend.exists(self.name, key):
+            return True
+        return self.fallback is not None and self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self._entries:
+            self._bytes -= self._sizes.pop(key)
+        self._entries[key] = value
+        self._measure(key)
+        self._touch(key)
+        self.save(key)
+        self._maybe_sweep(keep=key)
+        self._enforce_bounds(keep=key)
+
+    def __delitem__(self, key):
+        if self.pop(key, None) is None:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._entries:
+            if self.backend.shared:
+                self._refresh(key)
+        elif not self._fault_in(key) and not self._fall_back(key):
+            return default
+        self._touch(key)
+        self._maybe_sweep(keep=key)
+        return self._entries[key]
+
+    async def aget(self, key, default=None):
+        """Like get, with the backend reads done in a worker thread."""
+        if key in self._entries:
+            if self.backend.shared and key not in self._write_waiters:
+                try:
+                    version = await asyncio.to_thread(self.backend.version, self.name, key)
+                except Exception as e:
+                    print(f"--- WARNING: Could not check stored {self.name} '{key}', using the copy in memory. Error: {e} ---")
+                    version = None
+                if self._is_stale(key, version):
+                    value, version = await asyncio.to_thread(self._load, key)
+                    if value is not None and self._is_stale(key, version):
+                        self._replace(key, value, version)
+        else:
+            value, version = await asyncio.to_thread(self._load, key)
+            if key in self._entries:
+                pass  # Faulted in by another request while this one was reading
+            elif value is not None:
+                if not self.backend.shared:
+                    await asyncio.to_thread(self.backend.delete, self.name, key)
+                if key not in self._entries:
+                    self._install(key, value, version)
+            elif not await self._afall_back(key):
+                return default
+        self._touch(key)
+        value = self._entries[key]
+        await self._amaintain(keep=key)
+        return value
+
+    async def aset(self, key, value):
+        """Like `store[key] = value`, with the write-through and any spills it causes in a worker thread."""
+        if key in self._entries:
+            self._bytes -= self._sizes.pop(key)
+        self._entries[key] = value
+        self._measure(key)
+        self._touch(key)
+        await self.asave(key)
+        await self._amaintain(keep=key)
+
+    async def asave(self, key):
+        """
+        Like save, from a coroutine: the entry is encoded here and written in a
+        worker thread. Writes of one key happen in order, and changes made
+        while a write is waiting are covered by that write.
+        """
+        if self.backend.shared and key in self._entries:
+            await self._awrite(key)
+
+    async def _awrite(self, key) -> bool:
+        """Writes the entry, in order with the key's other writes; False if it couldn't be written."""
+        self._dirty.add(key)
+        lock = self._write_locks.setdefault(key, asyncio.Lock())
+        self._write_waiters[key] = self._write_waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                if key not in self._dirty or key not in self._entries:
+                    return True  # Written by a call that started after this one
+                self._dirty.discard(key)
+                try:
+                    text = self._encode(key)
+                    version = await asyncio.to_thread(self.backend.put_json, self.name, key, text, self.disk_ttl)
+                except Exception as e:
+                    print(f"--- WARNING: Could not write {self.name} '{key}' to the {type(self.backend).__name__}. Error: {e} ---")
+                    self.stats["write_failures"] += 1
+                    return False
+                if key in self._entries:
+                    self._versions[key] = version
+                return True
+        finally:
+            self._write_waiters[key] -= 1
+            if not self._write_waiters[key]:
+                del self._write_waiters[key]
+                del self._write_locks[key]
+
+    def _encode(self, key) -> str:
+        return json.dumps(self.serialize(self._entries[key]))
+
+    def pop(self, key, default=None):
+        value = self.get(key)
+        if value is None:
+            return default
+        self._forget(key)
+        try:
+            self.backend.delete(self.name, key)
+        except Exception as e:
+            print(f"--- WARNING: Could not delete stored {self.name} '{key}'. Error: {e} ---")
+        return value
+
+    def resident(self) -> list:
+        """Keys of the entries in memory, least recently used first."""
+        return list(self._entries)
+
+    def discard(self, key):
+        """Drops a resident entry from memory without touching its stored copy (e.g. once another node serves it)."""
+        if key in self._entries:
+            self._forget(key)
+            if self.on_evict:
+                self.on_evict(key)
+
+    def save(self, key):
+        """Call after changing a resident entry: with a shared backend, writes it through so other workers see it."""
+        if self.backend.shared and key in self._entries:
+            self._write(key)
+
+    def _write(self, key) -> bool:
+        try:
+            version = self.backend.put_json(self.name, key, self._encode(key), ttl=self.disk_ttl)
+        except Exception as e:
+            print(f"--- WARNING: Could not write {self.name} '{key}' to the {type(self.backend).__name__}. Error: {e} ---")
+            self.stats["write_failures"] += 1
+            return False
+        self._versions[key] = version
+        return True
+
+    def health(self) -> dict:
+        try:
+            spilled = self.backend.count(self.name)
+        except Exception:
+            spilled = None
+        return self._health(spilled)
+
+    async def ahealth(self) -> dict:
+        try:
+            spilled = await asyncio.to_thread(self.backend.count, self.name)
+        except Exception:
+            spilled = None
+        return self._health(spilled)
+
+    def _health(self, spilled) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "resident": len(self._entries),
+            "resident_bytes": self._bytes,
+            "spilled": spilled,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            **self.stats,
+        }
+
+    def _touch(self, key):
+        self._entries.move_to_end(key)
+        self._last_used[key] = time.monotonic()
+        self._used_since_sweep.add(key)
+
+    def _measure(self, key):
+        try:
+            size = self.sizeof(self._entries[key])
+        except (TypeError, ValueError):
+            size = 0
+        self._sizes[key] = size
+        self._bytes += size
+
+    def _load(self, key):
+        """Reads the stored entry and its version, or returns (None, None)."""
+        try:
+            version = self.backend.version(self.name, key) if self.backend.shared else None
+            data = self.backend.get(self.name, key)
+        except Exception as e:
+            print(f"--- WARNING: Could not load stored {self.name} '{key}'. Error: {e} ---")
+            return None, None
+        if data is None:
+            return None, None
+        return self.deserialize(data), version
+
+    def _fault_in(self, key) -> bool:
+        value, version = self._load(key)
+        if value is None:
+            return False
+        if not self.backend.shared:
+            # Nobody else reads it, and it is rewritten if the entry is evicted again.
+            self.backend.delete(self.name, key)
+        self._install(key, value, version)
+        self._enforce_bounds(keep=key)
+        return True
+
+    def _install(self, key, value, version):
+        self._entries[key] = value
+        self._versions[key] = version
+        self._measure(key)
+        self.stats["faults"] += 1
+
+    def _is_stale(self, key, version) -> bool:
+        # A missing entry was lost or not yet written from here; the resident copy is the newest there is.
+        return (
+            key in self._entries and version is not None and version != self._versions.get(key)
+            and key not in self._write_waiters and not self.is_busy(key, self._entries[key])
+        )
+
+    def _refresh(self, key):
+        """Replaces the resident entry with the stored one if another process has written it since."""
+        try:
+            version = self.backend.version(self.name, key)
+        except Exception as e:
+            print(f"--- WARNING: Could not check stored {self.name} '{key}', using the copy in memory. Error: {e} ---")
+            return
+        if not self._is_stale(key, version):
+            return
+        value, version = self._load(key)
+        if value is None:
+            return
+        self._replace(key, value, version)
+
+    def _replace(self, key, value, version):
+        self._bytes -= self._sizes.pop(key)
+        self._entries[key] = value
+        self._versions[key] = version
+        self._measure(key)
+        self.stats["reloads"] += 1
+        if self.on_evict:
+            self.on_evict(key)
+
+    def _fall_back(self, key) -> bool:
+        value = self.fallback(key) if self.fallback else None
+        if value is None:
+            return False
+        self._entries[key] = value
+        self._measure(key)
+        self.save(key)
+        self._enforce_bounds(keep=key)
+        return True
+
+    async def _afall_back(self, key) -> bool:
+        value = await asyncio.to_thread(self.fallback, key) if self.fallback else None
+        if key in self._entries:
+            return True  # Loaded by another request while this one was reading
+        if value is None:
+            return False
+        self._entries[key] = value
+        self._measure(key)
+        await self.asave(key)
+        return True
+
+    def _spill(self, key) -> bool:
+        if not self._write(key):
+            print(f"--- WARNING: Could not spill {self.name} '{key}', keeping it in memory. ---")
+            self.stats["spill_failures"] += 1
+            return False
+        self._forget(key)
+        if self.on_evict:
+            self.on_evict(key)
+        return True
+
+    async def _aspill(self, key) -> bool:
+        """Like _spill with the write in a worker thread; an entry used while it was being written stays."""
+        last_used = self._last_used.get(key)
+        if not await self._awrite(key):
+            print(f"--- WARNING: Could not spill {self.name} '{key}', keeping it in memory. ---")
+            self.stats["spill_failures"] += 1
+            return False
+        if key not in self._entries or self._last_used.get(key) != last_used or not self._evictable(key):
+            return False
+        self._forget(key)
+        if self.on_evict:
+            self.on_evict(key)
+        return True
+
+    def _evictable(self, key, keep=None) -> bool:
+        # An entry with an asave in flight is kept until it lands, so the write can't overwrite a newer spill.
+        return key != keep and key not in self._write_waiters and not self.is_busy(key, self._entries[key])
+
+    def _forget(self, key):
+        self._dirty.discard(key)
+        self._entries.pop(key, None)
+        self._last_used.pop(key, None)
+        self._used_since_sweep.discard(key)
+        self._versions.pop(key, None)
+        self._bytes -= self._sizes.pop(key, 0)
+
+    def _enforce_bounds(self, keep=None):
+        """Spills least recently used entries until the store is within max_entries and max_bytes."""
+        for key in list(self._entries):
+            if not self._over_bounds():
+                return
+            if self._evictable(key, keep) and self._spill(key):
+                self.stats["evictions"] += 1
+
+    def _over_bounds(self) -> bool:
+        return len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+
+    def _sweep_due(self) -> bool:
+        """Starts a sweep if one is due: re-measures the entries used since the last one."""
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return False
+        self._last_sweep = now
+        for key in self._used_since_sweep & self._entries.keys():
+            self._bytes -= self._sizes.pop(key)
+            self._measure(key)
+        self._used_since_sweep.clear()
+        return True
+
+    def _idle(self, key) -> bool:
+        now = time.monotonic()
+        return now - self._last_used.get(key, now) > self.idle_ttl
+
+    def _maybe_sweep(self, keep=None):
+        if not self._sweep_due():
+            return
+        for key in list(self._entries):
+            if not self._idle(key):
+                break  # LRU order, so every later entry was used more recently
+            if self._evictable(key, keep) and self._spill(key):
+                self.stats["expirations"] += 1
+        self._enforce_bounds(keep=keep)
+
+        try:
+            self.stats["deleted_from_disk"] += self.backend.purge(self.name, self.disk_ttl)
+        except Exception as e:
+            print(f"--- WARNING: Could not purge old {self.name} entries. Error: {e} ---")
+
+    async def _amaintain(self, keep=None):
+        """_maybe_sweep and _enforce_bounds for the async methods, with every write in a worker thread."""
+        if self._maintaining:
+            return  # The pass already running covers this one
+        self._maintaining = True
+        try:
+            if self._sweep_due():
+                for key in list(self._entries):
+                    if key not in self._entries:
+                        continue
+                    if not self._idle(key):
+                        break
+                    if self._evictable(key, keep) and await self._aspill(key):
+                        self.stats["expirations"] += 1
+                try:
+                    self.stats["deleted_from_disk"] += await asyncio.to_thread(self.backend.purge, self.name, self.disk_ttl)
+                except Exception as e:
+                    print(f"--- WARNING: Could not purge old {self.name} entries. Error: {e} ---")
+
+            for key in list(self._entries):
+                if not self._over_bounds():
+                    break
+                if key in self._entries and self._evictable(key, keep) and await self._aspill(key):
+                    self.stats["evictions"] += 1
+        finally:
+            self._maintaining = False
@@ -1,21 +1,32 @@
 # game_logic/llm_calls.py
 # Contains the API class and all prompt engineering logic.
 
+import asyncio
 import json
-import requests # Import the requests library
+import httpx
+from config import OG_BRIDGE_URL, OG_BRIDGE_MAX_CONNECTIONS, OG_BRIDGE_MAX_CONCURRENCY, OG_BRIDGE_TIMEOUTS, OG_BRIDGE_TIMEOUT_SECONDS
 # We no longer need the google library
 # import google.generativeai as genai
 
-# Define the URL for our local Node.js bridge server
-OG_BRIDGE_URL = "http://localhost:3001/generate-narrative"
-
 class ZeroGravityAI_API:
-    def __init__(self):
-        # The api_key is no longer used for Gemini, but the GameEngine passes it.
+    def __init__(self, bridge_url=OG_BRIDGE_URL, max_connections: int = OG_BRIDGE_MAX_CONNECTIONS,
+                 max_concurrency: int = OG_BRIDGE_MAX_CONCURRENCY, timeouts: dict = OG_BRIDGE_TIMEOUTS):
         # We just need to ensure self.model is not None so the checks pass.
-        self.model = True 
+        self.model = True
+        self.bridge_url = bridge_url
+        self.timeouts = timeouts
+        # One keep-alive connection pool shared by all calls, so calls don't pay TCP setup.
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=OG_BRIDGE_TIMEOUT_SECONDS,
+        )
+        # Calls beyond what the bridge can work on at once wait here rather than at the bridge.
+        self._semaphore = asyncio.Semaphore(max_concurrency)
         print("✅ 0G Compute client initialized and ready.")
 
+    async def aclose(self):
+        await self._client.aclose()
+
     def _clean_json_response(self, text_response):
         # This function is still useful as the new model might also wrap JSON in markdown.
         text_response = text_response.strip()
@@ -25,24 +36,37 @@ class ZeroGravityAI_API:
             text_response = text_response[:-3]
         return text_response.strip()
 
-    def generate_content(self, prompt_type, context):
-        if not self.model: return "{}"
-        print(f"\n--- 🤖 Calling 0G Compute Bridge ({prompt_type}) ---")
-        
+    def _build_prompt(self, prompt_type, context):
         prompts = {
             "StoryGenerator": self._create_story_generator_prompt,
             "WorldBuilder": self._create_world_builder_prompt,
             "Interaction": self._create_interaction_prompt,
         }
-        prompt = prompts.get(prompt_type, lambda _: "")(context)
+        return prompts.get(prompt_type, lambda _: "")(context)
+
+    async def generate_content_async(self, prompt_type, context):
+        """
+        Sends the prompt to the bridge on the shared client. If the caller is
+        cancelled (e.g. the player's request was aborted), the HTTP request is
+        aborted with it and its concurrency slot is freed.
+        """
+        if not self.model: return "{}"
+        print(f"\n--- 🤖 Calling 0G Compute Bridge ({prompt_type}) ---")
+
+        prompt = self._build_prompt(prompt_type, context)
         if not prompt: 
             print(f"--- ERROR: No prompt found for type '{prompt_type}' ---")
             return "{}"
 
         print("--- Sending Prompt to local bridge... (This may take a moment) ---")
         try:
-            # Make a POST request to the Node.js bridge server
-            response = requests.post(OG_BRIDGE_URL, json={"prompt": prompt}, timeout=90)
+            async with self._semaphore:
+                # Make a POST request to the Node.js bridge server
+                response = await self._client.post(
+                    self.bridge_url,
+                    json={"prompt": prompt},
+                    timeout=self.timeouts.get(prompt_type, OG_BRIDGE_TIMEOUT_SECONDS),
+                )
             response.raise_for_status()  # Raise an exception for HTTP errors (like 4xx or 5xx)
 
             data = response.json()
@@ -52,11 +76,12 @@ class ZeroGravityAI_API:
             # The game engine expects a clean JSON string, so we still use this
             return self._clean_json_response(ai_text)
             
-        except requests.exceptions.RequestException as e:
-            print(f"❌ An error occurred during the call to the 0G bridge: {e}")
+        except httpx.HTTPError as e:
+            print(f"❌ An error occurred during the call to the 0G bridge: {e!r}")
             print("--- Is the bridge_server running? Run 'node server.js' in its directory. ---")
             return "{}"
-        except Exception as e:
+        except (ValueError, AttributeError, TypeError) as e:
+            # A body that isn't JSON, or isn't an object with a string "narrative"
             print(f"❌ An unexpected error occurred: {e}")
             return "{}"
 
@@ -0,0 +1,365 @@
+# game_logic/state_backend.py
+# Pluggable key-value storage for games, rooms and player records, so several workers or nodes can share them.
+
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+class StateBackend:
+    """
+    Stores JSON-serializable dicts by (namespace, key).
+
+    `shared` is True when other processes see the same data (SQLite on one
+    machine, Redis across machines), in which case callers should write
+    changes through instead of only on eviction. Shared backends give every
+    write a new `version`, so a process can tell whether its cached copy of
+    an entry is still current without reading the entry itself.
+
+    `put(..., ttl)` marks an entry as expiring: `purge(namespace, ttl)`
+    removes the namespace's entries not written for that long (Redis expires
+    them by itself). SQLite keeps entries put without a ttl; the local
+    backends purge by age alone, so only namespaces whose entries all expire
+    (a GameStore's) should be purged.
+    """
+
+    shared = False
+
+    def get(self, namespace: str, key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def put(self, namespace: str, key: str, value: dict, ttl: Optional[float] = None) -> Optional[str]:
+        """Stores the value and returns its new version (None for backends that aren't shared)."""
+        return self.put_json(namespace, key, json.dumps(value), ttl)
+
+    def put_json(self, namespace: str, key: str, text: str, ttl: Optional[float] = None) -> Optional[str]:
+        """Like put, with the value already encoded as JSON text (e.g. on another thread than the write)."""
+        raise NotImplementedError
+
+    def version(self, namespace: str, key: str) -> Optional[str]:
+        return None
+
+    def delete(self, namespace: str, key: str):
+        raise NotImplementedError
+
+    def exists(self, namespace: str, key: str) -> bool:
+        return self.get(namespace, key) is not None
+
+    def values(self, namespace: str) -> list:
+        raise NotImplementedError
+
+    def count(self, namespace: str) -> int:
+        return len(self.values(namespace))
+
+    def purge(self, namespace: str, older_than: float) -> int:
+        """Removes the namespace's entries last written more than `older_than` seconds ago; returns how many."""
+        return 0
+
+    def close(self):
+        pass
+
+class InProcessBackend(StateBackend):
+    """Keeps entries in this process, as JSON text so that every read returns a fresh copy. Not shared."""
+
+    def __init__(self):
+        self._data = {}  # namespace -> {key: (json text, written at)}
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        entry = self._data.get(namespace, {}).get(key)
+        return json.loads(entry[0]) if entry else None
+
+    def put_json(self, namespace, key, text, ttl=None):
+        with self._lock:
+            self._data.setdefault(namespace, {})[key] = (text, time.time())
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.get(namespace, {}).pop(key, None)
+
+    def exists(self, namespace, key):
+        return key in self._data.get(namespace, {})
+
+    def values(self, namespace):
+        return [json.loads(text) for text, _ in list(self._data.get(namespace, {}).values())]
+
+    def count(self, namespace):
+        return len(self._data.get(namespace, {}))
+
+    def purge(self, namespace, older_than):
+        cutoff = time.time() - older_than
+        with self._lock:
+            entries = self._data.get(namespace, {})
+            expired = [key for key, (_, written_at) in entries.items() if written_at < cutoff]
+            for key in expired:
+                del entries[key]
+        return len(expired)
+
+class FileBackend(StateBackend):
+    """One JSON file per entry under `directory`/namespace. Not shared."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, namespace, key) -> str:
+        # Keys may come from clients, so they never become part of a path.
+        return os.path.join(self.directory, namespace, hashlib.sha1(str(key).encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, namespace, key):
+        try:
+            with open(self._path(namespace, key), "r", encoding="utf-8") as f:
+                return json.load(f)["value"]
+        except FileNotFoundError:
+            return None
+
+    def put_json(self, namespace, key, text, ttl=None):
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write('{"key": %s, "value": %s}' % (json.dumps(key), text))
+        os.replace(path + ".tmp", path)
+
+    def delete(self, namespace, key):
+        try:
+            os.remove(self._path(namespace, key))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, namespace, key):
+        return os.path.exists(self._path(namespace, key))
+
+    def _files(self, namespace) -> list:
+        directory = os.path.join(self.directory, namespace)
+        if not os.path.isdir(directory):
+            return []
+        return [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json")]
+
+    def values(self, namespace):
+        values = []
+        for path in self._files(namespace):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    values.append(json.load(f)["value"])
+            except (OSError, ValueError):
+                continue
+        return values
+
+    def count(self, namespace):
+        return len(self._files(namespace))
+
+    def purge(self, namespace, older_than):
+        cutoff = time.time() - older_than
+        removed = 0
+        for path in self._files(namespace):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+class SQLiteBackend(StateBackend):
+    """A SQLite database in WAL mode, shared by every worker process on the machine."""
+
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, version TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, expires INTEGER NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._lock = threading.Lock()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def get(self, namespace, key):
+        rows = self._execute("SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+        return json.loads(rows[0][0]) if rows else None
+
+    def put_json(self, namespace, key, text, ttl=None):
+        version = _new_version()
+        self._execute(
+            "INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, key, text, version, time.time(), ttl is not None),
+        )
+        return version
+
+    def version(self, namespace, key):
+        rows = self._execute("SELECT version FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+        return rows[0][0] if rows else None
+
+    def delete(self, namespace, key):
+        self._execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def exists(self, namespace, key):
+        return bool(self._execute("SELECT 1 FROM state WHERE namespace = ? AND key = ?", (namespace, key)))
+
+    def values(self, namespace):
+        return [json.loads(value) for value, in self._execute("SELECT value FROM state WHERE namespace = ?", (namespace,))]
+
+    def count(self, namespace):
+        return self._execute("SELECT COUNT(*) FROM state WHERE namespace = ?", (namespace,))[0][0]
+
+    def purge(self, namespace, older_than):
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM state WHERE namespace = ? AND expires AND updated_at < ?", (namespace, time.time() - older_than)
+            )
+            return cursor.rowcount
+
+    def close(self):
+        self._connection.close()
+
+class RedisError(Exception):
+    pass
+
+class RedisBackend(StateBackend):
+    """
+    Any server that speaks the Redis protocol (RESP), shared by every node.
+    Keys are "<prefix>:<namespace>:<key>" and values are the entry's version
+    (VERSION_LENGTH characters) followed by its JSON, so `version` only reads
+    the first few bytes. Commands are sent over one connection, reconnecting
+    once if it has dropped.
+    """
+
+    shared = True
+    VERSION_LENGTH = 16
+
+    def __init__(self, url: str, prefix: str = "towns", timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._socket = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _key(self, namespace, key) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def _connect(self):
+        self._socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._socket.makefile("rb")
+        if self.password:
+            self._send("AUTH", self.password)
+        if self.db:
+            self._send("SELECT", self.db)
+
+    def _disconnect(self):
+        if self._socket:
+            self._socket.close()
+        self._socket = self._reader = None
+
+    def _send(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._socket.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis closed the connection.")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def command(self, *args):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._socket is None:
+                        self._connect()
+                    return self._send(*args)
+                except (OSError, ConnectionError):
+                    self._disconnect()
+                    if attempt:
+                        raise
+
+    def get(self, namespace, key):
+        data = self.command("GET", self._key(namespace, key))
+        return json.loads(data[self.VERSION_LENGTH:]) if data is not None else None
+
+    def put_json(self, namespace, key, text, ttl=None):
+        version = _new_version()
+        expiry = ("EX", max(1, int(ttl))) if ttl is not None else ()
+        self.command("SET", self._key(namespace, key), version + text, *expiry)
+        return version
+
+    def version(self, namespace, key):
+        data = self.command("GETRANGE", self._key(namespace, key), 0, self.VERSION_LENGTH - 1)
+        return data.decode() if data else None
+
+    def delete(self, namespace, key):
+        self.command("DEL", self._key(namespace, key))
+
+    def exists(self, namespace, key):
+        return self.command("EXISTS", self._key(namespace, key)) == 1
+
+    def _scan(self, namespace) -> list:
+        keys, cursor = [], b"0"
+        while True:
+            cursor, batch = self.command("SCAN", cursor, "MATCH", self._key(namespace, "*"), "COUNT", 500)
+            keys.extend(batch)
+            if cursor in (b"0", "0"):
+                return keys
+
+    def values(self, namespace):
+        keys = self._scan(namespace)
+        if not keys:
+            return []
+        return [json.loads(data[self.VERSION_LENGTH:]) for data in self.command("MGET", *keys) if data is not None]
+
+    def count(self, namespace):
+        return len(self._scan(namespace))
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+def _new_version() -> str:
+    return os.urandom(RedisBackend.VERSION_LENGTH // 2).hex()
+
+def create_backend(kind: str, url: str) -> StateBackend:
+    """Builds the backend named by STATE_BACKEND: "memory", "file" (url is a directory), "sqlite" (a path) or "redis" (a redis:// URL)."""
+    if kind == "memory":
+        return InProcessBackend()
+    if kind == "file":
+        return FileBackend(url)
+    if kind == "sqlite":
+        return SQLiteBackend(url)
+    if kind == "redis":
+        return RedisBackend(url)
+    raise ValueError(f"Unknown STATE_BACKEND '{kind}'. Use memory, file, sqlite or redis.")
@@ -1,9 +1,10 @@
 # main.py
 # This script runs the FastAPI server, exposing the game engine through API endpoints.
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List
+from typing import Dict, List, Optional
+import asyncio
 import uuid
 import os
 import traceback
@@ -16,6 +17,12 @@ import json
 from schemas import *
 from game_logic.engine import GameEngine
 from game_logic.state_manager import GameState
+from game_logic.game_store import GameStore
+from game_logic.state_backend import FileBackend
+from config import (
+    GAME_STORE_MAX_GAMES, GAME_STORE_MAX_BYTES, GAME_IDLE_TTL_SECONDS,
+    GAME_SPILL_DIR, GAME_SPILL_TTL_SECONDS, GAME_STORE_SWEEP_SECONDS,
+)
 
 # Load environment variables from a .env file if it exists
 load_dotenv()
@@ -29,12 +36,29 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-game_engine: GameEngine
-active_games: Dict[str, GameState] = {}
+game_engine: Optional[GameEngine] = None
+# Idle games are spilled to disk and loaded back on their next request
+spill_backend = FileBackend(GAME_SPILL_DIR)
+active_games = GameStore(
+    "game",
+    spill_backend,
+    serialize=GameState.to_dict,
+    deserialize=GameState.from_dict,
+    max_entries=GAME_STORE_MAX_GAMES,
+    max_bytes=GAME_STORE_MAX_BYTES,
+    idle_ttl=GAME_IDLE_TTL_SECONDS,
+    disk_ttl=GAME_SPILL_TTL_SECONDS,
+    sweep_interval=GAME_STORE_SWEEP_SECONDS,
+    # A game with a turn in flight is still referenced by that turn, so its changes would be lost
+    is_busy=lambda game_id, game_state: game_state.turns_in_flight > 0
+)
 
 # In-memory storage for user login tracking (in production, use a database)
 user_login_history = {}
 
+# How often a long-running engine call checks whether its client is still connected.
+DISCONNECT_POLL_SECONDS = 0.5
+
 @app.on_event("startup")
 async def startup_event():
     """Initializes the game engine on server startup."""
@@ -47,16 +71,33 @@ async def startup_event():
         sys.exit("Failed to initialize 0G Compute client.")
     print("Game Engine initialized successfully.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Startup may have bailed out before the engine was created
+    if game_engine is not None:
+        await game_engine.aclose()
+
+async def _unless_disconnected(http_request: Request, coro):
+    """Runs an engine call, cancelling it (and its bridge request) if the client goes away first."""
+    task = asyncio.ensure_future(coro)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if await http_request.is_disconnected():
+            task.cancel()
+            raise HTTPException(status_code=499, detail="Client closed the request.")
+
 
 @app.post("/game/new", response_model=NewGameResponse)
-async def create_new_game(request: NewGameRequest):
+async def create_new_game(request: NewGameRequest, http_request: Request):
     game_id = str(uuid.uuid4())
     try:
-        game_state = game_engine.start_new_game(
+        game_state = await _unless_disconnected(http_request, game_engine.start_new_game(
             game_id=game_id,
             num_inaccessible_locations=request.num_inaccessible_locations,
             difficulty=request.difficulty
-        )
+        ))
         active_games[game_id] = game_state
         
         initial_villagers = [
@@ -70,16 +111,20 @@ async def create_new_game(request: NewGameRequest):
             inaccessible_locations=game_state.inaccessible_locations,
             villagers=initial_villagers
         )
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to generate new game: {e}")
 
 @app.post("/game/{game_id}/interact", response_model=InteractResponse)
-async def interact(game_id: str, request: InteractRequest):
+async def interact(game_id: str, request: InteractRequest, http_request: Request):
     if game_id not in active_games:
         raise HTTPException(status_code=404, detail="Game not found")
     
     game_state = active_games[game_id]
+    # Keeps the game in memory until the turn is done (see is_busy below)
+    game_state.turns_in_flight += 1
     
     try:
         villager_index = int(request.villager_id.split('_')[1])
@@ -93,7 +138,9 @@ async def interact(game_id: str, request: InteractRequest):
         ])}
         player_input = request.player_prompt if request.player_prompt is not None else "I'd like to talk."
 
-        dialogue_data = game_engine.process_interaction_turn(game_state, villager_name, player_input, frustration)
+        dialogue_data = await _unless_disconnected(
+            http_request, game_engine.process_interaction_turn(game_state, villager_name, player_input, frustration)
+        )
         
         if not dialogue_data:
                 raise HTTPException(status_code=500, detail="LLM failed to generate valid dialogue.")
@@ -104,9 +151,13 @@ async def interact(game_id: str, request: InteractRequest):
             npc_dialogue=dialogue_data.get("npc_dialogue"),
             player_suggestions=dialogue_data.get("player_responses")
         )
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Interaction failed: {e}")
+    finally:
+        game_state.turns_in_flight -= 1
 
 @app.post("/game/{game_id}/guess", response_model=GuessResponse)
 async def guess(game_id: str, request: GuessRequest):
@@ -262,6 +313,11 @@ async def victory_chest(request: OpenChestRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to process victory reward: {e}")
 
+@app.get("/health/games")
+async def games_health():
+    """Resident count, size and evictions of the active game store"""
+    return active_games.health()
+
 @app.get("/ping")
 async def ping():
     """Health check endpoint"""